@@ -1,23 +1,89 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 
-# Instância do DB que será usada em todo o app
-db = SQLAlchemy()
+from .sharding import RoutingSession
 
+# Instância do DB que será usada em todo o app.
+# A sessão roteia as tabelas de ambiente para o shard correto (ver app/sharding.py).
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
-def create_app():
+
+def create_app(config=None):
+    """Cria a aplicação. `config` (dict) sobrescreve valores de Config (ex.: benchmarks).
+
+    Não executa DDL nem seed: o schema é criado/atualizado por `flask db upgrade`
+    (ou `python createdb.py`) e os dados de teste por `python init_db.py`.
+    """
     app = Flask(__name__, static_folder='static', template_folder='templates')
     app.config.from_object('app.config.Config')
+    if config:
+        app.config.update(config)
     db.init_app(app)
 
-    with app.app_context():
-        # registrar blueprints
-        from .controllers.auth import auth_bp
-        from .controllers.dashboard import dashboard_bp
-        from .controllers.api import api_bp
+    # roteador de bancos por ambiente (SHARDING_ENABLED)
+    from . import sharding
+    sharding.init_app(app)
+
+    # registrar blueprints (não precisam de app context para serem importados)
+    from .controllers.auth import auth_bp
+    from .controllers.dashboard import dashboard_bp
+    from .controllers.api import api_bp
+
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(dashboard_bp)
+    app.register_blueprint(api_bp)
+
+    # limite de requisições por (ambiente, usuário, grupo de rotas); registrado
+    # antes dos outros before_request para recusar cedo (RATE_LIMIT_*)
+    from . import limites
+    limites.init_app(app)
+
+    # cache de leituras com backend plugável + comando `flask cache` (CACHE_*)
+    from . import cache
+    cache.init_app(app)
+
+    # auditoria das escritas da API, gravada em lote por uma thread (AUDIT_*)
+    from . import auditoria
+    auditoria.init_app(app)
+
+    # fila de tarefas em segundo plano + comando `flask jobs`
+    from . import jobs
+    jobs.init_app(app)
+
+    # arquivamento periódico de entregas finalizadas (tarefa da fila de jobs)
+    from . import arquivamento
+    arquivamento.init_app(app)
+
+    # catálogo de preços por ambiente + comando `flask precos`
+    from . import precos
+    precos.init_app(app)
+
+    # previsão de ruptura de estoque (tarefa agendada + comando `flask previsao`)
+    from . import previsao
+    previsao.init_app(app)
+
+    # aquecimento do cache ao subir o worker + rota de prontidão /pronto (WARMUP_*)
+    from . import aquecimento
+    aquecimento.init_app(app)
+
+    # group commit opcional da entrada de pedidos (GROUP_COMMIT_ENABLED)
+    from . import group_commit
+    group_commit.init_app(app)
+
+    # versionamento de schema + comando `flask db`
+    from . import migrations
+    migrations.init_app(app)
+
+    # dados sintéticos em volume para testes de desempenho (`flask seed`)
+    from . import seed
+    seed.init_app(app)
+
+    # bundles JS/CSS com hash (static/dist) + helper asset_urls + comando `flask assets`
+    from . import assets
+    assets.init_app(app)
 
-        app.register_blueprint(auth_bp)
-        app.register_blueprint(dashboard_bp)
-        app.register_blueprint(api_bp)
+    # compressão gzip/brotli das respostas (COMPRESS_*)
+    from . import compressao
+    compressao.init_app(app)
 
-        return app
+    return app
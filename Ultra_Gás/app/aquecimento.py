@@ -0,0 +1,161 @@
+"""Aquecimento do worker (WARMUP_ENABLED) e rota de prontidão GET /pronto.
+
+Depois de um deploy ou da reciclagem de um worker, o cache de leituras e o
+cache de páginas do SQLite estão frios, e os primeiros requests de cada
+depósito (justamente na abertura do turno) pagam as consultas todas juntas.
+Com o aquecimento ligado, cada worker, logo após subir (serve.post_fork),
+roda em uma thread os mesmos cálculos das primeiras telas para cada ambiente
+ativo (com pedidos nos últimos WARMUP_DIAS_ATIVOS dias): cores dos temas em
+uso, pizza de estoque, cards de cada usuário, cards de estoque, financeiro e
+listas do dashboard. Os resultados vão para o cache (app/cache.py) e as
+consultas passam pelos índices quentes de entregas, trazendo as páginas deles
+para a memória.
+
+GET /pronto responde 503 enquanto o aquecimento roda e 200 quando termina
+(com o tempo gasto), para o balanceador só mandar tráfego a workers prontos.
+Com o aquecimento desligado responde 200 direto. Falhas em um ambiente são
+registradas no log e não impedem o worker de ficar pronto.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import date, timedelta
+
+from flask import jsonify
+
+from app import db
+from app.sharding import usar_shard
+
+log = logging.getLogger(__name__)
+
+
+class Aquecimento:
+    """Estado do aquecimento deste processo + thread que o executa."""
+
+    def __init__(self, app):
+        self.app = app
+        self.habilitado = app.config.get('WARMUP_ENABLED', False)
+        self.dias_ativos = app.config.get('WARMUP_DIAS_ATIVOS', 7)
+        self.max_ambientes = app.config.get('WARMUP_MAX_AMBIENTES', 100)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._pronto = threading.Event()
+        self.estado = 'pendente' if self.habilitado else 'desligado'
+        self.duracao_ms = None
+        self.ambientes = []
+        self.erros = 0
+
+    def iniciar(self):
+        """Dispara o aquecimento em uma thread (uma vez por processo)."""
+        if not self.habilitado:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # após o fork o estado herdado do processo pai não vale para este worker
+            self._pid = os.getpid()
+            self._pronto.clear()
+            self.estado = 'aquecendo'
+            threading.Thread(target=self._rodar, name='aquecimento', daemon=True).start()
+
+    def pronto(self):
+        return not self.habilitado or self._pronto.is_set()
+
+    def aguardar(self, timeout=None):
+        return self._pronto.wait(timeout) if self.habilitado else True
+
+    def _rodar(self):
+        inicio = time.perf_counter()
+        self.ambientes, self.erros = [], 0
+        try:
+            with self.app.app_context():
+                for env in self._ambientes_ativos():
+                    t0 = time.perf_counter()
+                    try:
+                        with usar_shard(env):
+                            aquecer_ambiente(env)
+                    except Exception:
+                        self.erros += 1
+                        log.exception('Falha ao aquecer o ambiente %s', env)
+                    finally:
+                        db.session.remove()
+                    self.ambientes.append({'ambiente': env, 'ms': round((time.perf_counter() - t0) * 1000, 1)})
+        except Exception:
+            self.erros += 1
+            log.exception('Falha no aquecimento')
+        self.duracao_ms = round((time.perf_counter() - inicio) * 1000, 1)
+        self.estado = 'pronto'
+        self._pronto.set()
+        log.info('worker %s aquecido em %.1f ms (%s ambiente(s), %s erro(s))',
+                 os.getpid(), self.duracao_ms, len(self.ambientes), self.erros)
+
+    def _ambientes_ativos(self):
+        """Ambientes cadastrados com pedidos recentes (EXISTS pelo índice de enviroment)."""
+        from app.models.entregas import Entrega
+        from app.sharding import ambientes_conhecidos
+
+        corte = (date.today() - timedelta(days=self.dias_ativos)).isoformat()
+        ativos = []
+        for env in ambientes_conhecidos():
+            with usar_shard(env):
+                recente = db.session.query(
+                    db.session.query(Entrega.id).filter(Entrega.enviroment == env, Entrega.data >= corte).exists()
+                ).scalar()
+            if recente:
+                ativos.append(env)
+                if len(ativos) >= self.max_ambientes:
+                    break
+        db.session.remove()
+        return ativos
+
+    def status(self):
+        return {
+            'pronto': self.pronto(),
+            'estado': self.estado,
+            'duracao_ms': self.duracao_ms,
+            'ambientes': self.ambientes,
+            'erros': self.erros,
+            'pid': os.getpid(),
+        }
+
+
+def aquecer_ambiente(env):
+    """Calcula (e guarda no cache) o que as primeiras telas do ambiente pedem."""
+    from app.controllers.api import dados_estoque, dados_financeiro, dados_temas
+    from app.controllers import dashboard
+    from app.models.users import User
+
+    usuarios = db.session.query(User.id, User.user_type, User.tema).filter(User.enviroment == env).all()
+    dados_temas(env)
+    for tema in {tema or 'root' for _, _, tema in usuarios} | {'root'}:
+        dashboard._dados_tema(env, tema)
+    dados_estoque(env)
+    dados_financeiro(env)
+    dashboard._dados_estoque_cards(env)
+    for user_id, user_type, _ in usuarios:
+        if user_type in ('admin', 'user'):
+            dashboard._dados_cards(env, user_id)
+    # listas sem cache: só trazem as páginas dos índices para a memória
+    dashboard._dados_entregas_pendentes(env)
+    dashboard._dados_pagamentos_pendentes(env)
+    dashboard._dados_clientes(env)
+
+
+def iniciar(app):
+    """Dispara o aquecimento deste processo (chamado pelo serve.py após o fork)."""
+    aquecimento = app.extensions.get('aquecimento')
+    if aquecimento is not None:
+        aquecimento.iniciar()
+
+
+def init_app(app):
+    aquecimento = Aquecimento(app)
+    app.extensions['aquecimento'] = aquecimento
+
+    @app.route('/pronto')
+    def pronto():
+        """Prontidão do worker: 503 enquanto aquece, 200 depois (ou com o aquecimento desligado)."""
+        # servidores que não chamam serve.post_fork começam a aquecer na primeira sonda
+        aquecimento.iniciar()
+        return jsonify(aquecimento.status()), 200 if aquecimento.pronto() else 503
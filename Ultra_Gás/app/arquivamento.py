@@ -0,0 +1,75 @@
+"""Arquivamento quente/frio de entregas finalizadas.
+
+Entregas entregues E pagas com data anterior a ARQUIVO_DIAS dias são movidas,
+em lotes, de `entregas` para `entregas_arquivo`. As consultas operacionais
+(pendentes, entrega atual, cards) continuam lendo só a tabela quente, que
+fica pequena; histórico e relatórios usam `uniao_com_arquivo` para ler as duas.
+
+A tarefa roda pela fila de jobs (app/jobs.py) a cada ARQUIVO_INTERVALO
+segundos e pode ser disparada manualmente com
+`flask jobs enqueue entregas.arquivar`.
+"""
+from datetime import date, timedelta
+
+from flask import current_app
+
+from app import db
+from app.jobs import agendar, tarefa
+from app.sharding import para_cada_ambiente
+
+
+@tarefa('entregas.arquivar')
+def arquivar_entregas(dias=None, lote=None):
+    """Move entregas finalizadas antigas para entregas_arquivo. Retorna quantas foram movidas.
+
+    Cada lote é copiado (INSERT ... SELECT) e removido da tabela quente na
+    mesma transação, então uma falha no meio nunca duplica nem perde pedidos.
+    """
+    if dias is None:
+        dias = current_app.config.get('ARQUIVO_DIAS', 90)
+    if lote is None:
+        lote = current_app.config.get('ARQUIVO_LOTE', 500)
+    corte = (date.today() - timedelta(days=int(dias))).isoformat()
+
+    total = 0
+    # Com sharding, cada ambiente tem sua própria tabela entregas
+    for _env in para_cada_ambiente():
+        total += _arquivar_lotes(corte, lote)
+    return total
+
+
+def _arquivar_lotes(corte, lote):
+    from app.models.entregas import ENTREGA_CAMPOS, Entrega, EntregaArquivo
+
+    total = 0
+    while True:
+        ids = [
+            r[0] for r in db.session.query(Entrega.id)
+            .filter(
+                Entrega.entregue.is_(True),
+                Entrega.pago.is_(True),
+                Entrega.data < corte
+            )
+            .order_by(Entrega.id)
+            .limit(lote)
+            .all()
+        ]
+        if not ids:
+            break
+
+        colunas = [getattr(Entrega, c) for c in ENTREGA_CAMPOS] + [Entrega.enviroment]
+        destino = [getattr(EntregaArquivo.__table__.c, c) for c in ENTREGA_CAMPOS] + [EntregaArquivo.__table__.c.enviroment]
+        db.session.execute(
+            db.insert(EntregaArquivo).from_select(destino, db.select(*colunas).where(Entrega.id.in_(ids)))
+        )
+        db.session.execute(db.delete(Entrega).where(Entrega.id.in_(ids)))
+        db.session.commit()
+        total += len(ids)
+        if len(ids) < lote:
+            break
+    return total
+
+
+def init_app(app):
+    """Agenda o arquivamento periódico na fila de jobs."""
+    agendar('entregas.arquivar', a_cada=app.config.get('ARQUIVO_INTERVALO', 24 * 60 * 60))
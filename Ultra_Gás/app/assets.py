@@ -0,0 +1,278 @@
+"""Pipeline de assets estáticos: bundles minificados, com hash no nome e pré-comprimidos.
+
+`flask assets build` junta os arquivos de cada bundle (BUNDLES), minifica,
+grava em static/dist/ como <nome>.<hash>.<ext> (o hash é do conteúdo), gera
+as variantes .gz e .br (esta só se o pacote `brotli` estiver instalado) e
+escreve static/dist/manifest.json.
+
+Nos templates use o helper `asset_urls('bundle')`:
+
+    {% for url in asset_urls('dashboard_admin.js') %}
+    <script src="{{ url }}"></script>
+    {% endfor %}
+
+Com o manifest presente ele devolve só a URL do bundle com hash; sem build
+(desenvolvimento) devolve as URLs dos arquivos originais, um por um.
+
+Os arquivos de static/dist/ são servidos com Cache-Control immutable (o nome
+muda quando o conteúdo muda) e na melhor codificação aceita pelo navegador.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+
+import click
+from flask import Blueprint, abort, current_app, request, send_from_directory, url_for
+from flask.cli import AppGroup
+
+try:  # compressão brotli é opcional
+    import brotli
+except ImportError:  # pragma: no cover - depende do ambiente
+    brotli = None
+
+# bundle -> arquivos de origem (relativos a static/), na ordem de inclusão
+BUNDLES = {
+    'theme.js': ['js/theme.js'],
+    'dashboard_admin.js': ['js/dashboardDynamic.js', 'js/clientes.js', 'js/pedidos.js', 'js/confirmarPagamento.js'],
+    'dashboard.js': ['js/dashboardDynamic.js', 'js/entregaAtual.js', 'js/entregasPendentes.js', 'js/historicoEntregas.js'],
+    'ambiente.js': ['js/dashboardDynamic.js', 'js/temaAmbiente.js'],
+    'index.js': ['js/modals.js'],
+    'dashboard.css': ['dashboardDynamic.css'],
+    'index.css': ['style.css'],
+}
+
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+CACHE_IMUTAVEL = 'public, max-age=31536000, immutable'
+
+
+# ---------------------------------------------------------------------------
+# Minificação (conservadora: só remove comentários e espaços supérfluos)
+# ---------------------------------------------------------------------------
+
+# Caracteres após os quais uma "/" inicia um regex literal (e não uma divisão)
+_ANTES_DE_REGEX = set('(,=:[!&|?{};+-*%<>~^')
+# ...e palavras-chave idem (`return /x/.test(s)`, `typeof /x/`)
+_PALAVRAS_ANTES_DE_REGEX = {'return', 'typeof', 'instanceof', 'in', 'of', 'new', 'delete', 'void',
+                            'throw', 'case', 'do', 'else', 'yield', 'await'}
+
+
+def _identificador(c):
+    return c.isalnum() or c in '_$'
+
+
+def minificar_js(codigo):
+    """Remove comentários, indentação e linhas vazias sem mexer em strings/regex.
+
+    As quebras de linha são mantidas para não depender de inserção automática
+    de ponto e vírgula. Os espaços só são mexidos no código: strings, template
+    literals (que podem ter várias linhas) e regex são copiados como estão.
+    """
+    saida = []
+    i, n = 0, len(codigo)
+    ultimo = ''  # último caractere significativo emitido
+    palavra = ''  # identificador/palavra-chave que termina em `ultimo`
+    inicio_linha = True  # nada emitido ainda na linha atual de saída
+    espaco = ''  # espaços entre tokens, emitidos só se vier código na mesma linha
+
+    def emitir(texto):
+        nonlocal inicio_linha, espaco
+        if espaco and not inicio_linha:
+            saida.append(espaco)
+        saida.append(texto)
+        espaco = ''
+        inicio_linha = False
+
+    def quebrar_linha():
+        nonlocal inicio_linha, espaco
+        if not inicio_linha:
+            saida.append('\n')
+        inicio_linha = True
+        espaco = ''
+
+    while i < n:
+        c = codigo[i]
+        if c in '"\'`':
+            j = i + 1
+            while j < n and codigo[j] != c:
+                j += 2 if codigo[j] == '\\' else 1
+            emitir(codigo[i:j + 1])
+            ultimo, palavra = c, ''
+            i = j + 1
+        elif c == '/' and codigo.startswith('//', i):
+            while i < n and codigo[i] != '\n':
+                i += 1
+        elif c == '/' and codigo.startswith('/*', i):
+            fim = codigo.find('*/', i + 2)
+            comentario = codigo[i:n if fim == -1 else fim + 2]
+            # o comentário vale como separador (quebra de linha, se tinha uma)
+            if '\n' in comentario:
+                quebrar_linha()
+            else:
+                espaco = espaco or ' '
+            i += len(comentario)
+        elif c == '/' and (ultimo in _ANTES_DE_REGEX or ultimo == '' or palavra in _PALAVRAS_ANTES_DE_REGEX):
+            j = i + 1
+            em_classe = False
+            while j < n and codigo[j] != '\n':
+                if codigo[j] == '\\':
+                    j += 2
+                    continue
+                if codigo[j] == '[':
+                    em_classe = True
+                elif codigo[j] == ']':
+                    em_classe = False
+                elif codigo[j] == '/' and not em_classe:
+                    break
+                j += 1
+            emitir(codigo[i:j + 1])
+            ultimo, palavra = '/', ''
+            i = j + 1
+        elif c == '\n':
+            quebrar_linha()
+            i += 1
+        elif c.isspace():
+            espaco += c
+            i += 1
+        else:
+            if _identificador(c):
+                palavra = palavra + c if _identificador(ultimo) and not espaco and not inicio_linha else c
+            else:
+                palavra = ''
+            emitir(c)
+            ultimo = c
+            i += 1
+    quebrar_linha()
+    return ''.join(saida)
+
+
+def minificar_css(codigo):
+    """Remove comentários e espaços em volta de { } ; , em CSS."""
+    codigo = re.sub(r'/\*.*?\*/', '', codigo, flags=re.S)
+    codigo = re.sub(r'\s+', ' ', codigo)
+    codigo = re.sub(r'\s*([{};,])\s*', r'\1', codigo)
+    return codigo.replace(';}', '}').strip() + '\n'
+
+
+# ---------------------------------------------------------------------------
+# Build
+# ---------------------------------------------------------------------------
+
+def _ler_bundle(static_folder, arquivos):
+    partes = []
+    for rel in arquivos:
+        with open(os.path.join(static_folder, rel), encoding='utf-8') as f:
+            partes.append(f.read())
+    return partes
+
+
+def build(static_folder, bundles=None):
+    """Gera os bundles em static/dist e retorna o manifest {bundle: caminho_relativo}."""
+    bundles = bundles or BUNDLES
+    destino = os.path.join(static_folder, DIST)
+    os.makedirs(destino, exist_ok=True)
+
+    manifest = {}
+    for nome, arquivos in bundles.items():
+        base, ext = os.path.splitext(nome)
+        partes = _ler_bundle(static_folder, arquivos)
+        if ext == '.js':
+            # ";" entre arquivos evita que um arquivo sem ponto e vírgula final "cole" no próximo
+            conteudo = ';\n'.join(minificar_js(p) for p in partes)
+        else:
+            conteudo = ''.join(minificar_css(p) for p in partes)
+        dados = conteudo.encode('utf-8')
+
+        digest = hashlib.sha256(dados).hexdigest()[:10]
+        arquivo = f'{base}.{digest}{ext}'
+        caminho = os.path.join(destino, arquivo)
+        with open(caminho, 'wb') as f:
+            f.write(dados)
+        with open(caminho + '.gz', 'wb') as f:
+            f.write(gzip.compress(dados, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(caminho + '.br', 'wb') as f:
+                f.write(brotli.compress(dados, quality=11))
+        manifest[nome] = f'{DIST}/{arquivo}'
+
+    with open(os.path.join(destino, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    # remove builds antigos que não estão mais no manifest
+    atuais = {os.path.basename(p) for p in manifest.values()}
+    for arquivo in os.listdir(destino):
+        raiz = arquivo[:-3] if arquivo.endswith(('.gz', '.br')) else arquivo
+        if arquivo != MANIFEST and raiz not in atuais:
+            os.remove(os.path.join(destino, arquivo))
+    return manifest
+
+
+def carregar_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST, MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+# ---------------------------------------------------------------------------
+# Integração com o Flask
+# ---------------------------------------------------------------------------
+
+def asset_urls(bundle):
+    """URLs a incluir no template para o bundle (hash em produção, arquivos originais sem build)."""
+    manifest = current_app.extensions.get('assets', {})
+    if bundle in manifest:
+        return [url_for('assets.dist', filename=manifest[bundle][len(DIST) + 1:])]
+    if bundle not in BUNDLES:
+        raise KeyError(f'Bundle desconhecido: {bundle}')
+    return [url_for('static', filename=rel) for rel in BUNDLES[bundle]]
+
+
+assets_bp = Blueprint('assets', __name__)
+
+
+@assets_bp.route('/static/dist/<path:filename>')
+def dist(filename):
+    """Serve um arquivo de static/dist escolhendo a variante pré-comprimida aceita pelo navegador."""
+    pasta = os.path.join(current_app.static_folder, DIST)
+    if filename == MANIFEST or filename.endswith(('.gz', '.br')):
+        abort(404)
+
+    aceitas = request.accept_encodings
+    for encoding, sufixo in (('br', '.br'), ('gzip', '.gz')):
+        if aceitas[encoding] and os.path.exists(os.path.join(pasta, filename + sufixo)):
+            resp = send_from_directory(pasta, filename + sufixo, max_age=31536000)
+            # mantém o mimetype do arquivo original (e não o de .gz/.br)
+            resp.mimetype = 'text/css' if filename.endswith('.css') else 'text/javascript'
+            resp.headers['Content-Encoding'] = encoding
+            break
+    else:
+        resp = send_from_directory(pasta, filename, max_age=31536000)
+    resp.headers['Cache-Control'] = CACHE_IMUTAVEL
+    resp.vary.add('Accept-Encoding')
+    return resp
+
+
+assets_cli = AppGroup('assets', help='Build dos assets estáticos (bundles com hash).')
+
+
+@assets_cli.command('build')
+def assets_build():
+    """Gera static/dist com os bundles minificados, com hash e pré-comprimidos."""
+    manifest = build(current_app.static_folder)
+    for nome, caminho in manifest.items():
+        tamanho = os.path.getsize(os.path.join(current_app.static_folder, caminho))
+        click.echo(f'{nome:<22} -> {caminho} ({tamanho} bytes)')
+    if brotli is None:
+        click.echo('Aviso: pacote brotli não instalado; apenas variantes .gz foram geradas.')
+
+
+def init_app(app):
+    """Carrega o manifest (se houver build), registra o helper Jinja, a rota e o CLI."""
+    app.extensions['assets'] = carregar_manifest(app.static_folder)
+    app.jinja_env.globals['asset_urls'] = asset_urls
+    app.register_blueprint(assets_bp)
+    app.cli.add_command(assets_cli)
@@ -0,0 +1,227 @@
+"""Auditoria das escritas da API com gravação em segundo plano (write-behind).
+
+Cada rota que altera dados em app/controllers/api.py chama `registrar(...)`
+depois do commit. Nesse momento o evento (quem, ambiente, entidade, estado
+antes e depois) só vai para um buffer circular em memória; o request não
+faz nenhuma escrita a mais. Uma thread escritora esvazia o buffer a cada
+AUDIT_FLUSH_INTERVAL segundos, ou antes ao juntar AUDIT_FLUSH_ROWS eventos,
+com um único INSERT em lote (executemany) na tabela audit_log. A tabela fica
+no banco principal, ou em um SQLite separado se AUDIT_SQLITE_PATH estiver
+definido (assim a auditoria não disputa o lock de escrita do banco do app).
+
+O buffer guarda no máximo AUDIT_BUFFER eventos por processo. Se o banco
+ficar indisponível tempo suficiente para enchê-lo, os eventos mais antigos são
+descartados (contados em `descartados`) em vez de segurar os requests. O
+restante é gravado na saída do processo (atexit e desligamento do serve.py).
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+from collections import deque
+from datetime import datetime
+
+import sqlalchemy as sa
+from flask import current_app, has_app_context, has_request_context, session
+
+from app import db
+from app.models.auditoria import AuditLog
+
+log = logging.getLogger(__name__)
+
+
+class Auditoria:
+    """Buffer circular de eventos + thread que os grava em lote."""
+
+    def __init__(self, app):
+        self.app = app
+        self.intervalo = app.config.get('AUDIT_FLUSH_INTERVAL', 2.0)
+        self.max_rows = app.config.get('AUDIT_FLUSH_ROWS', 500)
+        self.caminho = app.config.get('AUDIT_SQLITE_PATH')
+        if self.caminho and not os.path.isabs(self.caminho):
+            self.caminho = os.path.join(app.instance_path, self.caminho)
+        self._buffer = deque(maxlen=app.config.get('AUDIT_BUFFER', 10000))
+        self._lock = threading.Lock()
+        self._gravando = threading.Lock()
+        self._acordar = threading.Event()
+        self._thread = None
+        self._engine = None
+        # contadores simples para diagnóstico
+        self.gravados = 0
+        self.lotes = 0
+        self.descartados = 0
+        self.erros = 0
+
+    # -- request ------------------------------------------------------------
+
+    def adicionar(self, evento):
+        """Coloca o evento no buffer (O(1), sem I/O) e garante a thread escritora."""
+        with self._lock:
+            if len(self._buffer) == self._buffer.maxlen:
+                self.descartados += 1
+            self._buffer.append(evento)
+            cheio = len(self._buffer) >= self.max_rows
+        if cheio:
+            self._acordar.set()
+        self._garantir_thread()
+
+    def pendentes(self):
+        return len(self._buffer)
+
+    # -- thread escritora ---------------------------------------------------
+
+    def _garantir_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name='auditoria', daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        while True:
+            self._acordar.wait(self.intervalo)
+            self._acordar.clear()
+            try:
+                self.flush()
+            except Exception:  # pragma: no cover - proteção da thread
+                log.exception('Falha ao gravar eventos de auditoria')
+
+    def _engine_destino(self):
+        if self._engine is None:
+            if self.caminho:
+                os.makedirs(os.path.dirname(self.caminho), exist_ok=True)
+                engine = sa.create_engine(f'sqlite:///{self.caminho}')
+                AuditLog.__table__.create(engine, checkfirst=True)
+            else:
+                # banco principal (a tabela é criada pela migração 7)
+                with self.app.app_context():
+                    engine = db.engine
+            self._engine = engine
+        return self._engine
+
+    def flush(self):
+        """Grava tudo o que está no buffer em um INSERT em lote. Retorna o nº de eventos."""
+        with self._gravando:
+            with self._lock:
+                eventos = list(self._buffer)
+                self._buffer.clear()
+            if not eventos:
+                return 0
+            linhas = [_linha(evento) for evento in eventos]
+            try:
+                with self._engine_destino().begin() as conn:
+                    conn.execute(sa.insert(AuditLog.__table__), linhas)
+            except Exception:
+                # devolve ao início do buffer (sem passar do limite) para a próxima tentativa
+                with self._lock:
+                    livres = self._buffer.maxlen - len(self._buffer)
+                    self.descartados += max(0, len(eventos) - livres)
+                    self._buffer.extendleft(reversed(eventos[-livres:] if livres else []))
+                    self.erros += 1
+                raise
+            self.gravados += len(eventos)
+            self.lotes += 1
+            return len(eventos)
+
+    # -- consulta -----------------------------------------------------------
+
+    def consultar(self, env, antes_de=None, limite=50, **filtros):
+        """Eventos do ambiente, mais recentes primeiro, paginados por id (keyset).
+
+        Retorna (itens, proximo): `proximo` é o valor de antes_de da próxima
+        página, ou None se esta for a última.
+        """
+        t = AuditLog.__table__
+        consulta = sa.select(t).where(t.c.enviroment == env)
+        if antes_de is not None:
+            consulta = consulta.where(t.c.id < antes_de)
+        for campo, valor in filtros.items():
+            if valor is not None:
+                consulta = consulta.where(t.c[campo] == valor)
+        consulta = consulta.order_by(t.c.id.desc()).limit(limite + 1)
+        with self._engine_destino().connect() as conn:
+            linhas = conn.execute(consulta).mappings().all()
+        itens = [_serializar(linha) for linha in linhas[:limite]]
+        proximo = itens[-1]['id'] if len(linhas) > limite else None
+        return itens, proximo
+
+    def estatisticas(self):
+        return {
+            'pendentes': self.pendentes(),
+            'gravados': self.gravados,
+            'lotes': self.lotes,
+            'descartados': self.descartados,
+            'erros': self.erros,
+            'destino': self.caminho or 'principal',
+        }
+
+
+def _json(valor):
+    return None if valor is None else json.dumps(valor, ensure_ascii=False, default=str)
+
+
+def _linha(evento):
+    # a serialização acontece aqui, na thread escritora, e não no request
+    return {**evento, 'antes': _json(evento['antes']), 'depois': _json(evento['depois'])}
+
+
+def _serializar(linha):
+    return {
+        'id': linha['id'],
+        'criado_em': linha['criado_em'].isoformat() if linha['criado_em'] else None,
+        'user_id': linha['user_id'],
+        'user_name': linha['user_name'],
+        'entidade': linha['entidade'],
+        'entidade_id': linha['entidade_id'],
+        'acao': linha['acao'],
+        'antes': json.loads(linha['antes']) if linha['antes'] else None,
+        'depois': json.loads(linha['depois']) if linha['depois'] else None,
+    }
+
+
+def auditoria_atual():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('auditoria')
+
+
+def registrar(entidade, entidade_id, acao, antes=None, depois=None):
+    """Registra uma escrita já confirmada (chamar depois do commit).
+
+    `antes`/`depois` devem ser valores novos (ex.: to_dict()), pois são
+    serializados depois, na thread escritora. Usuário e ambiente vêm da sessão.
+    """
+    auditoria = auditoria_atual()
+    if auditoria is None:
+        return
+    com_sessao = has_request_context()
+    auditoria.adicionar({
+        'criado_em': datetime.utcnow(),
+        'enviroment': session.get('enviroment') if com_sessao else None,
+        'user_id': session.get('user_id') if com_sessao else None,
+        'user_name': session.get('user_name') if com_sessao else None,
+        'entidade': entidade,
+        'entidade_id': None if entidade_id is None else str(entidade_id),
+        'acao': acao,
+        'antes': antes,
+        'depois': depois,
+    })
+
+
+def init_app(app):
+    if not app.config.get('AUDIT_ENABLED', True):
+        return
+    auditoria = Auditoria(app)
+    app.extensions['auditoria'] = auditoria
+    # o servidor de desenvolvimento e os comandos flask saem normalmente; os
+    # workers do serve.py saem com os._exit e chamam flush() explicitamente
+    atexit.register(_flush_na_saida, auditoria)
+
+
+def _flush_na_saida(auditoria):
+    try:
+        auditoria.flush()
+    except Exception:  # pragma: no cover - saída do processo
+        log.exception('Falha ao gravar eventos de auditoria na saída')
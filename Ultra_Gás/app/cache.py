@@ -0,0 +1,593 @@
+"""Cache de leituras quentes com backends plugáveis e invalidação por ambiente.
+
+Uso nos controllers:
+
+    from app.cache import memoizar
+    dados = memoizar(f'financeiro:{env}', lambda: calcular(env), tags=[tag_ambiente(env)])
+
+Backends (CACHE_BACKEND):
+  - 'memoria':   LRU + TTL em um dict do próprio processo (rápido, mas cada
+                 worker tem o seu: uma escrita em um worker não invalida os outros);
+  - 'sqlite':    arquivo SQLite em instance/ (CACHE_SQLITE_PATH) compartilhado
+                 por todos os workers da máquina — padrão;
+  - 'memcached': cliente do protocolo texto do memcached (CACHE_MEMCACHED_SERVIDOR).
+                 `flask cache memcached-local` sobe um substituto local em Python
+                 para desenvolvimento e `flask cache verificar` testa o backend;
+  - 'nenhum':    desliga o cache (sempre calcula).
+
+Invalidação por tag: cada entrada guarda a versão das suas tags no momento do
+cálculo; `invalidar_tag` troca a versão e as entradas antigas passam a ser
+ignoradas (expiram por TTL/LRU). Toda escrita bem-sucedida na API/dashboard
+(POST/PUT/PATCH/DELETE com status < 400) invalida a tag do ambiente da sessão,
+e o TTL (CACHE_TTL) limita a idade de qualquer entrada.
+
+Os valores devem ser serializáveis em JSON e tratados como somente leitura.
+Falhas do backend nunca quebram o request: contam como erro e o valor é
+calculado direto.
+"""
+import hashlib
+import json
+import os
+import socket
+import socketserver
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from urllib.parse import quote
+
+import click
+from flask import current_app, has_app_context, request, session
+from flask.cli import AppGroup
+
+_AUSENTE = object()
+
+
+def tag_ambiente(env):
+    return f'env:{env}'
+
+
+# ---------------------------------------------------------------------------
+# Backends: get_many(chaves) -> {chave: valor}, set(chave, valor, ttl), delete, clear
+# ---------------------------------------------------------------------------
+
+class MemoriaLRU:
+    """LRU com TTL em memória (por processo)."""
+
+    nome = 'memoria'
+
+    def __init__(self, max_itens=2048):
+        self.max_itens = max_itens
+        self._dados = OrderedDict()   # chave -> (expira_em | None, valor)
+        self._lock = threading.Lock()
+
+    def get_many(self, chaves):
+        agora = time.monotonic()
+        encontrados = {}
+        with self._lock:
+            for chave in chaves:
+                item = self._dados.get(chave)
+                if item is None:
+                    continue
+                expira, valor = item
+                if expira is not None and expira <= agora:
+                    del self._dados[chave]
+                    continue
+                self._dados.move_to_end(chave)
+                encontrados[chave] = valor
+        return encontrados
+
+    def set(self, chave, valor, ttl=None):
+        expira = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._dados[chave] = (expira, valor)
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.max_itens:
+                self._dados.popitem(last=False)
+
+    def delete(self, chave):
+        with self._lock:
+            self._dados.pop(chave, None)
+
+    def clear(self):
+        with self._lock:
+            self._dados.clear()
+
+
+class SQLiteCache:
+    """Cache em um arquivo SQLite (WAL) compartilhado pelos processos da máquina."""
+
+    nome = 'sqlite'
+    # a cada N gravações remove as entradas expiradas
+    LIMPEZA_A_CADA = 500
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._local = threading.local()
+        self._gravacoes = 0
+        os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+        with self._conexao() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                ' chave TEXT PRIMARY KEY, valor TEXT NOT NULL, expira REAL)'
+            )
+
+    def _conexao(self):
+        # uma conexão por thread e por processo (nunca reaproveita a herdada de um fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.caminho, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get_many(self, chaves):
+        chaves = list(chaves)
+        if not chaves:
+            return {}
+        agora = time.time()
+        marcadores = ', '.join('?' * len(chaves))
+        rows = self._conexao().execute(
+            f'SELECT chave, valor, expira FROM cache WHERE chave IN ({marcadores})', chaves
+        ).fetchall()
+        return {chave: json.loads(valor) for chave, valor, expira in rows if expira is None or expira > agora}
+
+    def set(self, chave, valor, ttl=None):
+        conn = self._conexao()
+        conn.execute(
+            'INSERT OR REPLACE INTO cache (chave, valor, expira) VALUES (?, ?, ?)',
+            (chave, json.dumps(valor, separators=(',', ':')), time.time() + ttl if ttl else None),
+        )
+        self._gravacoes += 1
+        if self._gravacoes >= self.LIMPEZA_A_CADA:
+            self._gravacoes = 0
+            conn.execute('DELETE FROM cache WHERE expira IS NOT NULL AND expira <= ?', (time.time(),))
+
+    def delete(self, chave):
+        self._conexao().execute('DELETE FROM cache WHERE chave = ?', (chave,))
+
+    def clear(self):
+        self._conexao().execute('DELETE FROM cache')
+
+
+class MemcachedCache:
+    """Cliente mínimo do protocolo texto do memcached (get/set/delete/flush_all)."""
+
+    nome = 'memcached'
+    MAX_CHAVE = 250
+
+    def __init__(self, servidor='127.0.0.1:11211', timeout=1.0):
+        host, _, porta = servidor.rpartition(':')
+        self.endereco = (host or '127.0.0.1', int(porta))
+        self.timeout = timeout
+        self._local = threading.local()
+
+    # -- conexão ------------------------------------------------------------
+
+    def _socket(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is None or self._local.pid != os.getpid():
+            sock = socket.create_connection(self.endereco, timeout=self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._local.sock = sock
+            self._local.pid = os.getpid()
+            self._local.arquivo = sock.makefile('rb')
+        return sock
+
+    def _fechar(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            try:
+                self._local.arquivo.close()
+                sock.close()
+            except OSError:
+                pass
+        self._local.sock = None
+
+    def _comando(self, dados, ler):
+        try:
+            self._socket().sendall(dados)
+            return ler(self._local.arquivo)
+        except (OSError, ValueError):
+            self._fechar()
+            raise
+
+    def _chave(self, chave):
+        # memcached não aceita espaços/controle nem chaves longas
+        segura = quote(chave, safe=':/|._-')
+        if len(segura) > self.MAX_CHAVE:
+            segura = 'h:' + hashlib.sha1(chave.encode('utf-8')).hexdigest()
+        return segura
+
+    # -- operações ----------------------------------------------------------
+
+    def get_many(self, chaves):
+        chaves = list(chaves)
+        if not chaves:
+            return {}
+        mapa = {self._chave(c): c for c in chaves}
+
+        def ler(arquivo):
+            encontrados = {}
+            while True:
+                linha = arquivo.readline()
+                if not linha:
+                    raise ConnectionError('conexão fechada pelo memcached')
+                if linha == b'END\r\n':
+                    return encontrados
+                partes = linha.split()
+                if partes[0] != b'VALUE':
+                    raise ValueError(linha)
+                tamanho = int(partes[3])
+                dados = arquivo.read(tamanho + 2)[:-2]
+                encontrados[mapa[partes[1].decode('utf-8')]] = json.loads(dados)
+
+        return self._comando(('get ' + ' '.join(mapa) + '\r\n').encode('utf-8'), ler)
+
+    def set(self, chave, valor, ttl=None):
+        dados = json.dumps(valor, separators=(',', ':')).encode('utf-8')
+        cabecalho = f'set {self._chave(chave)} 0 {int(ttl or 0)} {len(dados)}\r\n'.encode('utf-8')
+        resposta = self._comando(cabecalho + dados + b'\r\n', lambda a: a.readline())
+        if resposta != b'STORED\r\n':
+            raise ValueError(resposta)
+
+    def delete(self, chave):
+        self._comando(f'delete {self._chave(chave)}\r\n'.encode('utf-8'), lambda a: a.readline())
+
+    def clear(self):
+        self._comando(b'flush_all\r\n', lambda a: a.readline())
+
+
+class SemCache:
+    """Backend nulo: nada é guardado."""
+
+    nome = 'nenhum'
+
+    def get_many(self, chaves):
+        return {}
+
+    def set(self, chave, valor, ttl=None):
+        pass
+
+    def delete(self, chave):
+        pass
+
+    def clear(self):
+        pass
+
+
+# ---------------------------------------------------------------------------
+# Fachada
+# ---------------------------------------------------------------------------
+
+class Cache:
+    """Leitura/escrita com TTL padrão, tags versionadas e contadores de acerto."""
+
+    def __init__(self, backend, ttl=30, prefixo='ug:'):
+        self.backend = backend
+        self.ttl = ttl
+        self.prefixo = prefixo
+        self._lock = threading.Lock()
+        self._contadores = {'hits': 0, 'misses': 0, 'sets': 0, 'invalidacoes': 0, 'erros': 0}
+
+    def _contar(self, nome):
+        with self._lock:
+            self._contadores[nome] += 1
+
+    def _chave_tag(self, tag):
+        return f'{self.prefixo}tag:{tag}'
+
+    def _ler(self, chave, tags):
+        """Lê a entrada e as versões atuais das tags (criando as que faltam).
+
+        Retorna (valor ou _AUSENTE, versoes). Erros do backend são propagados.
+        """
+        chave_real = self.prefixo + chave
+        chaves_tags = {tag: self._chave_tag(tag) for tag in tags}
+        encontrados = self.backend.get_many([chave_real, *chaves_tags.values()])
+        versoes = {}
+        for tag, chave_tag in chaves_tags.items():
+            versao = encontrados.get(chave_tag)
+            if versao is None:
+                versao = uuid.uuid4().hex
+                self.backend.set(chave_tag, versao)
+            versoes[tag] = versao
+        entrada = encontrados.get(chave_real)
+        if isinstance(entrada, dict) and entrada.get('tags') == versoes:
+            return entrada['valor'], versoes
+        return _AUSENTE, versoes
+
+    def _gravar(self, chave, valor, versoes, ttl):
+        try:
+            self.backend.set(self.prefixo + chave, {'valor': valor, 'tags': versoes}, ttl or self.ttl)
+            self._contar('sets')
+        except Exception:
+            self._contar('erros')
+
+    def memoizar(self, chave, calcular, ttl=None, tags=()):
+        """Retorna o valor em cache para `chave` ou calcula, guarda e retorna."""
+        try:
+            # versões das tags lidas ANTES do cálculo: se uma invalidação acontecer
+            # durante o cálculo, a entrada gravada já nasce desatualizada
+            valor, versoes = self._ler(chave, tags)
+        except Exception:
+            self._contar('erros')
+            return calcular()
+        if valor is not _AUSENTE:
+            self._contar('hits')
+            return valor
+
+        self._contar('misses')
+        valor = calcular()
+        self._gravar(chave, valor, versoes, ttl)
+        return valor
+
+    def get(self, chave, padrao=None, tags=()):
+        """Valor em cache para `chave` (válido para as tags) ou `padrao`."""
+        try:
+            valor, _ = self._ler(chave, tags)
+        except Exception:
+            self._contar('erros')
+            return padrao
+        self._contar('hits' if valor is not _AUSENTE else 'misses')
+        return padrao if valor is _AUSENTE else valor
+
+    def set(self, chave, valor, ttl=None, tags=()):
+        """Guarda um valor já calculado (ex.: por uma tarefa em lote) com as tags atuais."""
+        try:
+            _, versoes = self._ler(chave, tags)
+        except Exception:
+            self._contar('erros')
+            return
+        self._gravar(chave, valor, versoes, ttl)
+
+    def delete(self, chave):
+        try:
+            self.backend.delete(self.prefixo + chave)
+        except Exception:
+            self._contar('erros')
+
+    def invalidar_tag(self, tag):
+        try:
+            self.backend.set(self._chave_tag(tag), uuid.uuid4().hex)
+            self._contar('invalidacoes')
+        except Exception:
+            self._contar('erros')
+
+    def invalidar_ambiente(self, env):
+        self.invalidar_tag(tag_ambiente(env))
+
+    def clear(self):
+        self.backend.clear()
+
+    def estatisticas(self):
+        with self._lock:
+            dados = dict(self._contadores)
+        consultas = dados['hits'] + dados['misses']
+        dados['taxa_acerto'] = round(dados['hits'] / consultas, 4) if consultas else 0.0
+        dados['backend'] = self.backend.nome
+        return dados
+
+
+def criar_backend(config, instance_path):
+    tipo = config.get('CACHE_BACKEND', 'sqlite')
+    if tipo == 'memoria':
+        return MemoriaLRU(config.get('CACHE_MAX_ITENS', 2048))
+    if tipo == 'sqlite':
+        caminho = config.get('CACHE_SQLITE_PATH', 'cache.db')
+        if not os.path.isabs(caminho):
+            caminho = os.path.join(instance_path, caminho)
+        return SQLiteCache(caminho)
+    if tipo == 'memcached':
+        return MemcachedCache(config.get('CACHE_MEMCACHED_SERVIDOR', '127.0.0.1:11211'))
+    if tipo == 'nenhum':
+        return SemCache()
+    raise ValueError(f'CACHE_BACKEND desconhecido: {tipo}')
+
+
+# ---------------------------------------------------------------------------
+# Atalhos usados pelo app (degradam para cálculo direto sem cache configurado)
+# ---------------------------------------------------------------------------
+
+def cache_atual():
+    return current_app.extensions.get('cache') if has_app_context() else None
+
+
+def memoizar(chave, calcular, ttl=None, tags=()):
+    cache = cache_atual()
+    if cache is None:
+        return calcular()
+    return cache.memoizar(chave, calcular, ttl=ttl, tags=tags)
+
+
+def invalidar_tag(tag):
+    cache = cache_atual()
+    if cache is not None:
+        cache.invalidar_tag(tag)
+
+
+def invalidar_ambiente(env):
+    invalidar_tag(tag_ambiente(env))
+
+
+# ---------------------------------------------------------------------------
+# Substituto local do memcached (desenvolvimento / verificação)
+# ---------------------------------------------------------------------------
+
+class _MemcachedHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        dados = self.server.dados
+        lock = self.server.lock
+        while True:
+            linha = self.rfile.readline()
+            if not linha:
+                return
+            partes = linha.split()
+            if not partes:
+                continue
+            cmd = partes[0]
+            if cmd in (b'get', b'gets'):
+                agora = time.time()
+                saida = []
+                with lock:
+                    for chave in partes[1:]:
+                        item = dados.get(chave)
+                        if item is None or (item[0] and item[0] <= agora):
+                            dados.pop(chave, None)
+                            continue
+                        saida.append(b'VALUE %s %d %d\r\n%s\r\n' % (chave, item[1], len(item[2]), item[2]))
+                self.wfile.write(b''.join(saida) + b'END\r\n')
+            elif cmd == b'set' and len(partes) >= 5:
+                chave, flags, exptime, tamanho = partes[1], int(partes[2]), int(partes[3]), int(partes[4])
+                valor = self.rfile.read(tamanho + 2)[:-2]
+                expira = time.time() + exptime if exptime else 0
+                with lock:
+                    dados[chave] = (expira, flags, valor)
+                if b'noreply' not in partes[5:]:
+                    self.wfile.write(b'STORED\r\n')
+            elif cmd == b'delete' and len(partes) >= 2:
+                with lock:
+                    existia = dados.pop(partes[1], None) is not None
+                self.wfile.write(b'DELETED\r\n' if existia else b'NOT_FOUND\r\n')
+            elif cmd == b'flush_all':
+                with lock:
+                    dados.clear()
+                self.wfile.write(b'OK\r\n')
+            elif cmd == b'version':
+                self.wfile.write(b'VERSION ultra-gas-local\r\n')
+            elif cmd == b'quit':
+                return
+            else:
+                self.wfile.write(b'ERROR\r\n')
+
+
+class MemcachedLocal(socketserver.ThreadingTCPServer):
+    """Servidor em Python com o subconjunto do protocolo usado por MemcachedCache."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, endereco=('127.0.0.1', 11211)):
+        super().__init__(endereco, _MemcachedHandler)
+        self.dados = {}
+        self.lock = threading.Lock()
+
+
+# ---------------------------------------------------------------------------
+# Verificação e CLI
+# ---------------------------------------------------------------------------
+
+def verificar(cache):
+    """Exercita o backend (set/get, TTL, tags, delete). Retorna a lista de falhas."""
+    falhas = []
+    sufixo = uuid.uuid4().hex[:8]
+    env = f'verificacao-{sufixo}'
+    calculos = []
+
+    def calcular():
+        calculos.append(1)
+        return {'n': len(calculos), 'texto': 'ação ✓'}
+
+    chave = f'verificar:{env}:chave com espaço'
+    primeiro = cache.memoizar(chave, calcular, tags=[tag_ambiente(env)])
+    segundo = cache.memoizar(chave, calcular, tags=[tag_ambiente(env)])
+    if primeiro != segundo or len(calculos) != 1:
+        falhas.append('valor não ficou em cache')
+    cache.invalidar_ambiente(env)
+    terceiro = cache.memoizar(chave, calcular, tags=[tag_ambiente(env)])
+    if len(calculos) != 2 or terceiro['n'] != 2:
+        falhas.append('invalidação por tag não funcionou')
+    cache.delete(chave)
+    cache.memoizar(chave, calcular, tags=[tag_ambiente(env)])
+    if len(calculos) != 3:
+        falhas.append('delete não removeu a entrada')
+    cache.memoizar(f'verificar:{env}:ttl', calcular, ttl=1)
+    time.sleep(1.1)
+    cache.memoizar(f'verificar:{env}:ttl', calcular, ttl=1)
+    if len(calculos) != 5:
+        falhas.append('TTL não expirou a entrada')
+    return falhas
+
+
+cache_cli = AppGroup('cache', help='Cache de leituras (backends, estatísticas).')
+
+
+@cache_cli.command('stats')
+def cache_stats():
+    """Mostra backend e contadores deste processo."""
+    for chave, valor in current_app.extensions['cache'].estatisticas().items():
+        click.echo(f'{chave}: {valor}')
+
+
+@cache_cli.command('clear')
+def cache_clear():
+    """Esvazia o cache configurado."""
+    current_app.extensions['cache'].clear()
+    click.echo('cache esvaziado')
+
+
+@cache_cli.command('verificar')
+@click.option('--backend', type=click.Choice(['configurado', 'memoria', 'sqlite', 'memcached']), default='configurado')
+def cache_verificar(backend):
+    """Testa um backend; memcached sem servidor configurado usa o substituto local."""
+    servidor = None
+    if backend == 'configurado':
+        cache = current_app.extensions['cache']
+    elif backend == 'memcached' and current_app.config.get('CACHE_BACKEND') != 'memcached':
+        servidor = MemcachedLocal(('127.0.0.1', 0))
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        host, porta = servidor.server_address
+        cache = Cache(MemcachedCache(f'{host}:{porta}'))
+        click.echo(f'usando substituto local do memcached em {host}:{porta}')
+    else:
+        config = dict(current_app.config, CACHE_BACKEND=backend)
+        cache = Cache(criar_backend(config, current_app.instance_path))
+    try:
+        falhas = verificar(cache)
+    finally:
+        if servidor is not None:
+            servidor.shutdown()
+            servidor.server_close()
+    estat = cache.estatisticas()
+    click.echo(f"backend {estat['backend']}: hits={estat['hits']} misses={estat['misses']} erros={estat['erros']}")
+    if falhas:
+        raise click.ClickException('; '.join(falhas))
+    click.echo('ok')
+
+
+@cache_cli.command('memcached-local')
+@click.option('--host', default='127.0.0.1')
+@click.option('--port', default=11211, type=int)
+def cache_memcached_local(host, port):
+    """Sobe um substituto do memcached em Python (só para desenvolvimento)."""
+    servidor = MemcachedLocal((host, port))
+    click.echo(f'memcached local em {host}:{port} (Ctrl+C para sair)')
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+def init_app(app):
+    cache = Cache(
+        criar_backend(app.config, app.instance_path),
+        ttl=app.config.get('CACHE_TTL', 30),
+        prefixo=app.config.get('CACHE_PREFIXO', 'ug:'),
+    )
+    app.extensions['cache'] = cache
+    app.cli.add_command(cache_cli)
+
+    @app.after_request
+    def _invalidar_apos_escrita(resp):
+        # qualquer escrita bem-sucedida no ambiente invalida as leituras em cache dele
+        if request.method in ('POST', 'PUT', 'PATCH', 'DELETE') and resp.status_code < 400 \
+                and request.path.startswith(('/api/', '/dashboard/')):
+            env = session.get('enviroment')
+            if env:
+                cache.invalidar_ambiente(env)
+        return resp
@@ -0,0 +1,88 @@
+"""Compressão das respostas (gzip/brotli) conforme o Accept-Encoding.
+
+Registrada no create_app como um after_request. Comprime apenas respostas:
+  - com status 200 e corpo em memória (streams, como a exportação do histórico
+    e eventos SSE em text/event-stream, passam intactos);
+  - de um dos tipos em COMPRESS_MIMETYPES (JSON, HTML, CSS, JS...);
+  - com pelo menos COMPRESS_MIN_SIZE bytes (abaixo disso o ganho não paga a CPU);
+  - que ainda não tenham Content-Encoding (ex.: bundles pré-comprimidos de static/dist).
+
+Brotli é usado quando o cliente aceita e o pacote `brotli` está instalado;
+caso contrário gzip. O nível de cada um vem de COMPRESS_LEVEL / COMPRESS_BR_QUALITY.
+"""
+import gzip
+
+from flask import request
+
+try:  # brotli é opcional
+    import brotli
+except ImportError:  # pragma: no cover - depende do ambiente
+    brotli = None
+
+MIMETYPES_PADRAO = (
+    'application/json',
+    'text/html',
+    'text/css',
+    'text/plain',
+    'text/csv',
+    'text/javascript',
+    'application/javascript',
+)
+
+
+def escolher_encoding(aceitas, com_brotli=None):
+    """Escolhe 'br', 'gzip' ou None a partir do Accept-Encoding (werkzeug MIMEAccept)."""
+    if com_brotli is None:
+        com_brotli = brotli is not None
+    if com_brotli and aceitas['br']:
+        return 'br'
+    if aceitas['gzip']:
+        return 'gzip'
+    return None
+
+
+def comprimir(dados, encoding, nivel=6, qualidade_br=4):
+    """Comprime `dados` (bytes) com o encoding escolhido."""
+    if encoding == 'br':
+        return brotli.compress(dados, quality=qualidade_br)
+    return gzip.compress(dados, compresslevel=nivel, mtime=0)
+
+
+def _elegivel(resp, config):
+    if resp.status_code != 200 or resp.direct_passthrough or resp.is_streamed:
+        return False
+    if resp.mimetype == 'text/event-stream' or 'Content-Encoding' in resp.headers:
+        return False
+    return resp.mimetype in config.get('COMPRESS_MIMETYPES', MIMETYPES_PADRAO)
+
+
+def init_app(app):
+    if not app.config.get('COMPRESS_ENABLED', True):
+        return
+
+    @app.after_request
+    def comprimir_resposta(resp):
+        config = app.config
+        if not _elegivel(resp, config):
+            return resp
+        # a resposta varia com o Accept-Encoding mesmo quando sai sem compressão
+        resp.vary.add('Accept-Encoding')
+        if resp.content_length is not None and resp.content_length < config.get('COMPRESS_MIN_SIZE', 1024):
+            return resp
+
+        encoding = escolher_encoding(request.accept_encodings)
+        if encoding is None:
+            return resp
+        dados = resp.get_data()
+        if len(dados) < config.get('COMPRESS_MIN_SIZE', 1024):
+            return resp
+
+        resp.set_data(comprimir(
+            dados, encoding,
+            nivel=config.get('COMPRESS_LEVEL', 6),
+            qualidade_br=config.get('COMPRESS_BR_QUALITY', 4),
+        ))
+        resp.headers['Content-Encoding'] = encoding
+        # um ETag calculado sobre o corpo original não vale para o corpo comprimido
+        resp.headers.pop('ETag', None)
+        return resp
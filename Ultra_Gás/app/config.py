@@ -3,3 +3,123 @@ class Config:
     # Para protótipo usamos SQLite local. Se quiser MySQL, altere a URI.
     SQLALCHEMY_DATABASE_URI = 'sqlite:///app.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Sharding por ambiente (app/sharding.py): com SHARDING_ENABLED cada
+    # enviroment usa seu próprio banco; {shard} vira o nome normalizado do
+    # ambiente. users e jobs continuam em SQLALCHEMY_DATABASE_URI.
+    # Provisione os shards com `python createdb.py` antes de ligar.
+    SHARDING_ENABLED = False
+    SHARD_DATABASE_URI = 'sqlite:///shards/{shard}.db'
+    SHARD_ENGINE_OPTIONS = {}
+
+    # Tarefas em segundo plano (app/jobs.py). Com JOBS_IN_PROCESS o worker
+    # sobe junto com o servidor no primeiro request; para rodar separado use
+    # `flask --app run jobs work` e deixe JOBS_IN_PROCESS = False.
+    JOBS_IN_PROCESS = True
+    JOBS_WORKERS = 2
+    JOBS_POLL_INTERVAL = 2.0      # segundos entre buscas na fila
+    JOBS_MAX_TENTATIVAS = 3
+    JOBS_RETRY_BACKOFF = 5        # segundos; dobra a cada nova tentativa
+    JOBS_HEARTBEAT = 60           # segundos entre sinais de vida das tarefas em execução
+    JOBS_TRAVADO_APOS = 10 * 60   # sem sinal de vida por este tempo = processo morto, volta para a fila
+
+    # Exportação do histórico: linhas lidas do banco por lote (yield_per)
+    EXPORT_BATCH_SIZE = 1000
+
+    # Arquivamento (app/arquivamento.py): entregas entregues e pagas com mais de
+    # ARQUIVO_DIAS dias vão para entregas_arquivo, ARQUIVO_LOTE por transação.
+    ARQUIVO_DIAS = 90
+    ARQUIVO_LOTE = 500
+    ARQUIVO_INTERVALO = 24 * 60 * 60   # segundos entre execuções agendadas
+
+    # Group commit da entrada de pedidos (app/group_commit.py): pedidos que
+    # chegam juntos são gravados em uma única transação. Desligado por padrão.
+    GROUP_COMMIT_ENABLED = False
+    GROUP_COMMIT_MAX_ROWS = 50       # fecha o lote ao atingir N pedidos...
+    GROUP_COMMIT_MAX_WAIT_MS = 5     # ...ou após este tempo desde o 1º pedido
+    GROUP_COMMIT_TIMEOUT = 10        # segundos que o request espera pelo commit (depois responde 503)
+
+    # Reprecificação de pedidos em aberto (app/precos.py): pedidos por UPDATE em lote
+    PRECOS_LOTE = 1000
+
+    # Compressão das respostas (app/compressao.py): gzip, ou brotli se o pacote
+    # estiver instalado e o cliente aceitar. Respostas menores que
+    # COMPRESS_MIN_SIZE bytes e streams (exportação, SSE) não são comprimidos.
+    COMPRESS_ENABLED = True
+    COMPRESS_MIN_SIZE = 1024
+    COMPRESS_LEVEL = 6            # gzip: 1 (rápido) .. 9 (menor)
+    COMPRESS_BR_QUALITY = 4       # brotli: 0 .. 11
+
+    # Embute no HTML do dashboard os dados de /dashboard/bootstrap, evitando
+    # os fetches iniciais do front-end (o polling continua usando as rotas)
+    DASHBOARD_BOOTSTRAP_INLINE = True
+
+    # Servidor de produção (serve.py); os argumentos de linha de comando têm precedência
+    SERVER_BIND = '127.0.0.1:8000'       # host:porta ou unix:/caminho/do.sock
+    SERVER_WORKERS = 2                   # processos
+    SERVER_THREADS = 4                   # threads por processo
+    SERVER_PRELOAD = True                # cria o app no master antes do fork
+    SERVER_MAX_REQUESTS = 0              # recicla o worker após N requests (0 = nunca)
+    SERVER_MAX_REQUESTS_JITTER = 0       # + aleatório em [0, jitter] por worker
+    SERVER_GRACEFUL_TIMEOUT = 30         # segundos para terminar requests no desligamento/reload
+    SERVER_BACKLOG = 2048
+
+    # Limite de requisições (app/limites.py): token bucket por
+    # (enviroment, usuário, grupo). Valores por processo worker.
+    RATE_LIMIT_ENABLED = True
+    RATE_LIMITS = {
+        # grupo: (capacidade / rajada, fichas repostas por segundo)
+        'dashboard': (30, 2.0),    # polling do dashboard (cards, listas, página)
+        'pedidos': (20, 1.0),      # POST /api/pedidos
+        'leitura': (60, 5.0),      # demais GET da API
+        'escrita': (30, 2.0),      # demais escritas da API
+    }
+    # (método ou None, prefixo do caminho, grupo): vale a primeira regra que casar
+    RATE_LIMIT_ROTAS = [
+        ('POST', '/api/pedidos', 'pedidos'),
+        (None, '/dashboard', 'dashboard'),
+        ('GET', '/api/', 'leitura'),
+        (None, '/api/', 'escrita'),
+    ]
+
+    # Cache de leituras quentes (app/cache.py): cards, pizza de estoque,
+    # contagens financeiras, temas e tabela de preços. 'sqlite' é compartilhado
+    # pelos workers da máquina; 'memoria' é por processo; 'memcached' usa
+    # CACHE_MEMCACHED_SERVIDOR; 'nenhum' desliga. Escritas invalidam o ambiente.
+    CACHE_BACKEND = 'sqlite'
+    CACHE_TTL = 30                       # segundos (idade máxima de uma entrada)
+    CACHE_PREFIXO = 'ug:'
+    CACHE_MAX_ITENS = 2048               # 'memoria': entradas por processo (LRU)
+    CACHE_SQLITE_PATH = 'cache.db'       # 'sqlite': relativo à pasta instance/
+    CACHE_MEMCACHED_SERVIDOR = '127.0.0.1:11211'
+
+    # Previsão de ruptura de estoque (app/previsao.py, GET /api/estoque/previsao).
+    # NumPy é opcional: sem ele o mesmo cálculo roda em Python puro.
+    PREVISAO_JANELA_DIAS = 28            # dias de histórico de pedidos considerados
+    PREVISAO_ALPHA = 0.3                 # suavização exponencial (maior = reage mais rápido)
+    PREVISAO_PRAZO_REPOSICAO = 3         # dias entre pedir ao fornecedor e receber
+    PREVISAO_COBERTURA_DIAS = 14         # dias de consumo que a reposição deve cobrir
+    PREVISAO_HORIZONTE_DIAS = 365        # além disso não há ruptura prevista (consumo quase zero)
+    PREVISAO_INTERVALO = 60 * 60         # segundos entre recálculos agendados (todos os ambientes)
+    PREVISAO_ESTADO_TTL = 7 * 24 * 60 * 60   # consumo diário acumulado no cache
+
+    # Auditoria das escritas da API (app/auditoria.py, GET /api/auditoria): os
+    # eventos vão para um buffer em memória e uma thread os grava em lote na
+    # tabela audit_log, sem nenhuma escrita extra no request.
+    AUDIT_ENABLED = True
+    AUDIT_BUFFER = 10000                 # eventos em memória por processo (se encher, descarta os mais antigos)
+    AUDIT_FLUSH_INTERVAL = 2.0           # segundos entre gravações em lote
+    AUDIT_FLUSH_ROWS = 500               # ...ou antes, ao acumular N eventos
+    AUDIT_SQLITE_PATH = None             # None = banco principal; ou SQLite separado (relativo à pasta instance/)
+
+    # Aquecimento do worker (app/aquecimento.py): ao subir, cada worker calcula
+    # em segundo plano temas, estoque, cards e financeiro dos ambientes ativos,
+    # enchendo o cache antes do turno. GET /pronto responde 503 até terminar.
+    WARMUP_ENABLED = False
+    WARMUP_DIAS_ATIVOS = 7               # ambiente ativo = com pedidos nestes últimos dias
+    WARMUP_MAX_AMBIENTES = 100           # limite de ambientes aquecidos por worker
+
+    # Cadastro em lote de usuários (POST /api/users/bulk): os hashes de senha
+    # são gerados em paralelo em um pool de processos (app/senhas.py)
+    USERS_BULK_MAX = 1000                # linhas por requisição
+    SENHAS_PROCESSOS = 0                 # processos do pool (0 = um por CPU; 1 = sem pool)
@@ -1,4 +1,4 @@
-from flask import Blueprint, jsonify, request, session, abort
+from flask import Blueprint, jsonify, request, session, abort, current_app
 
 
 # IMPORTANTE - ISOLAMENTO POR AMBIENTE
@@ -31,26 +31,42 @@ def api_estoque():
     env = session.get('enviroment')
     if not session.get('user_id') or not env:
         return jsonify({'error': 'Usuário não autenticado ou ambiente não definido'}), 401
-    # Tenta buscar dados reais do banco
+    # Estoque apenas do mesmo enviroment do usuário (soma de todos os depósitos,
+    # ou só de um deles se ?deposito_id= for informado)
+    return jsonify(dados_estoque(env, deposito_id=request.args.get('deposito_id', type=int)))
+
+
+def _calcular_estoque(env, deposito_id=None):
+    """Payload real de /api/estoque, ou None se o ambiente não tem depósito."""
+    # Import dentro da função para evitar problemas de import circular na inicialização
+    # e para só tentar acessar o DB quando este endpoint for chamado.
+    from app.models.estoque import Estoque
+    estoque = Estoque.do_ambiente(env, deposito_id=deposito_id)
+    if not estoque:
+        return None
+    # Capacidade vem da tabela depositos (soma das capacidades consideradas).
+    return {
+        "summary": {"statusText": f"Estoque: {estoque.total()} / {estoque.capacidade} itens ({estoque.percent()}%)"},
+        "pie": estoque.to_pie()
+    }
+
+
+def dados_estoque(env, deposito_id=None):
+    """Monta o payload de /api/estoque (também usado por /dashboard/bootstrap)."""
+    from app.cache import memoizar, tag_ambiente
+
+    # Tenta buscar dados reais do banco (via cache; falhas não são guardadas)
     try:
-        # Import dentro do bloco para evitar problemas de import circular na inicialização
-        # e para só tentar acessar o DB quando este endpoint for chamado.
-        from app.models.estoque import Estoque, DEFAULT_CAPACITY
-        # Estoque apenas do mesmo enviroment do usuário
-        estoque = Estoque.query.filter_by(enviroment=env).first()
-        if estoque:
-            # Usa DEFAULT_CAPACITY (definido em app/models/estoque.py) para compor a mensagem.
-            data = {
-                "summary": {"statusText": f"Estoque: {estoque.total()} / {DEFAULT_CAPACITY} itens ({estoque.percent(DEFAULT_CAPACITY)}%)"},
-                "pie": estoque.to_pie()
-            }
-            return jsonify(data)
+        dados = memoizar(f'estoque:{env}:{deposito_id}', lambda: _calcular_estoque(env, deposito_id),
+                         tags=[tag_ambiente(env)])
+        if dados:
+            return dados
     except Exception:
         # se houver qualquer problema com o DB, cai no mock abaixo
         pass
 
     # Fallback mock
-    data = {
+    return {
         "summary": {"statusText": "Mock: estoque equilibrado — itens com baixa quantidade: 3"},
         "pie": {
             "p45": 20,
@@ -61,7 +77,31 @@ def api_estoque():
             "agua": 15
         }
     }
-    return jsonify(data)
+
+
+@api_bp.route('/estoque/previsao', methods=['GET'])
+def api_estoque_previsao():
+    """Previsão de ruptura por produto do ambiente (ver app/previsao.py).
+
+    Estrutura retornada:
+    {
+      "gerado_em": "...", "metodo": "numpy" | "python", "janela_dias": 28, "capacidade_livre": 40,
+      "produtos": [ { "produto": "p13", "saldo": 13, "reservado": 2, "consumo_diario": 1.4,
+                      "dias_ate_acabar": 7.9, "ruptura_prevista": "yyyy-mm-dd",
+                      "sugestao_reposicao": 13, "status": "ok" | "repor" | "ruptura" }, ... ]
+    }
+    """
+    env = session.get('enviroment')
+    if not session.get('user_id') or not env:
+        return jsonify({'error': 'Usuário não autenticado ou ambiente não definido'}), 401
+    try:
+        from app.previsao import previsao_do_ambiente
+        dados = previsao_do_ambiente(env)
+        if dados is None:
+            return jsonify({'error': 'Estoque não configurado para este ambiente'}), 404
+        return jsonify(dados)
+    except Exception as e:
+        return jsonify({'error': 'Falha ao calcular previsão', 'detail': str(e)}), 500
 
 
 @api_bp.route('/pedidos', methods=['POST'])
@@ -116,14 +156,29 @@ def api_pedidos():
     if metodo and metodo not in allowed:
         return jsonify({'error': 'metodo_pagamento inválido'}), 400
 
+    # preço calculado no servidor a partir do catálogo do ambiente
+    # (o valor enviado pelo front-end é ignorado)
+    from app.models.entregas import parse_produtos
+    from app.precos import calcular_total, tabela_de_precos
+
+    itens = parse_produtos(produto)
+    if not itens:
+        return jsonify({'error': 'Nenhum produto válido informado'}), 400
+
     # grava no banco
+    from app.group_commit import TempoEsgotado
+
     try:
         from app import db
+        from app.auditoria import registrar
         from app.models.entregas import Entrega
 
-        preco = data.get('preco') or ''
+        total, sem_preco = calcular_total(itens, tabela_de_precos(env))
+        if sem_preco:
+            return jsonify({'error': f'Produto sem preço cadastrado: {", ".join(sorted(sem_preco))}'}), 400
+        preco = str(total)
 
-        entrega = Entrega(
+        campos = dict(
             endereco=endereco,
             destinatario=destinatario,
             produto=produto,
@@ -131,13 +186,33 @@ def api_pedidos():
             encarregado='',   # inicia vazio
             entregue=False,   # inicia não entregue
             pago=False,        # inicia não pago
-            preco=preco,       # valor calculado pelo front-end
+            preco=preco,       # valor calculado pelo catálogo de preços
             enviroment=env,    # isola a entrega no ambiente do criador
         )
+
+        # Group commit (opcional): o pedido entra no lote da thread escritora e
+        # este request espera o commit do lote antes de responder.
+        writer = current_app.extensions.get('group_commit')
+        if writer is not None:
+            gravada = writer.gravar(env, campos)
+            registrar('entrega', gravada['id'], 'criar', depois=gravada)
+            return jsonify({'ok': True, 'entrega': gravada}), 201
+
+        entrega = Entrega(**campos)
         db.session.add(entrega)
         db.session.commit()
 
-        return jsonify({'ok': True, 'entrega': entrega.to_dict()}), 201
+        gravada = entrega.to_dict()
+        registrar('entrega', entrega.id, 'criar', depois=gravada)
+        return jsonify({'ok': True, 'entrega': gravada}), 201
+    except TempoEsgotado as e:
+        # 503 em vez de 500: com status 'nao_gravado' o cliente pode repetir o
+        # pedido; com 'desconhecido' deve consultar os pendentes antes, ou duplica
+        status = 'desconhecido' if e.indeterminado else 'nao_gravado'
+        resp = jsonify({'error': 'Tempo esgotado ao gravar entrega', 'status': status, 'detail': str(e)})
+        if not e.indeterminado:
+            resp.headers['Retry-After'] = '1'
+        return resp, 503
     except Exception as e:
         try:
             db.session.rollback()
@@ -153,33 +228,46 @@ def api_financeiro():
     Conta quantas entregas (entregue=True) foram realizadas por cada método de pagamento.
     Estrutura retornada compatível com Chart.js (labels + datasets).
     """
-    from sqlalchemy import func
-
     # Apenas usuários autenticados podem acessar dados financeiros
     env = session.get('enviroment')
     if not session.get('user_id') or not env:
         return jsonify({'error': 'Usuário não autenticado ou ambiente não definido'}), 401
-    try:
-        from app import db
-        from app.models.entregas import Entrega
+    return jsonify(dados_financeiro(env))
 
-        # Métodos conhecidos e ordem fixa
-        metodos_ordem = ["a_prazo", "pix", "cartao", "dinheiro"]
-        counts_map = {m: 0 for m in metodos_ordem}
 
-        resultados = db.session.query(Entrega.metodo_pagamento, func.count(Entrega.id)) \
-            .filter(
-                Entrega.metodo_pagamento.isnot(None),
-                Entrega.entregue.is_(True),
-                Entrega.enviroment == env
-            ) \
-            .group_by(Entrega.metodo_pagamento).all()
+def _contar_metodos_pagamento(env):
+    """{metodo: quantidade} das entregas realizadas do ambiente (quente + arquivo)."""
+    from sqlalchemy import func
+    from app import db
+    from app.models.entregas import uniao_com_arquivo
+
+    # Métodos conhecidos e ordem fixa
+    counts_map = {m: 0 for m in ["a_prazo", "pix", "cartao", "dinheiro"]}
 
-        for metodo, qtd in resultados:
-            if metodo in counts_map:
-                counts_map[metodo] = qtd
+    # Entregas realizadas ficam na tabela quente ou no arquivo
+    entregues = uniao_com_arquivo(['id', 'metodo_pagamento'], lambda m: [
+        m.metodo_pagamento.isnot(None),
+        m.entregue.is_(True),
+        m.enviroment == env
+    ])
+    resultados = db.session.query(entregues.c.metodo_pagamento, func.count(entregues.c.id)) \
+        .group_by(entregues.c.metodo_pagamento).all()
 
-        data = {
+    for metodo, qtd in resultados:
+        if metodo in counts_map:
+            counts_map[metodo] = qtd
+    return counts_map
+
+
+def dados_financeiro(env):
+    """Monta o payload de /api/financeiro (também usado por /dashboard/bootstrap)."""
+    from app.cache import memoizar, tag_ambiente
+
+    try:
+        counts_map = memoizar(f'financeiro:{env}', lambda: _contar_metodos_pagamento(env),
+                              tags=[tag_ambiente(env)])
+
+        return {
             "labels": ["A prazo", "Pix", "Cartão", "Dinheiro"],
             "datasets": [
                 {
@@ -188,10 +276,9 @@ def api_financeiro():
                 }
             ]
         }
-        return jsonify(data)
     except Exception:
         # Fallback simples se ocorrer erro com o DB
-        data = {
+        return {
             "labels": ["A prazo", "Pix", "Cartão", "Dinheiro"],
             "datasets": [
                 {
@@ -201,7 +288,272 @@ def api_financeiro():
             ],
             "summary": {"status": "Falha ao acessar entregas; retornando zeros."}
         }
-        return jsonify(data)
+
+
+# Faixas de atraso (dias desde a data do pedido) do relatório de aging: (chave, de, até)
+AGING_FAIXAS = [('0_7', 0, 7), ('8_30', 8, 30), ('31_60', 31, 60), ('60_mais', 61, None)]
+
+
+@api_bp.route('/financeiro/aging', methods=['GET'])
+def api_financeiro_aging():
+    """Aging das vendas a prazo entregues e não pagas, por cliente e por entregador (admin).
+
+    Parâmetros: ?limite=10 (quantos maiores devedores retornar, máx. 100).
+    Estrutura retornada (valores em reais inteiros, como Entrega.preco):
+    {
+      "data_base": "yyyy-mm-dd",
+      "faixas": ["0_7", "8_30", "31_60", "60_mais"],
+      "totais": {"0_7": v, "8_30": v, "31_60": v, "60_mais": v, "total": v, "pedidos": n},
+      "maiores_devedores": [ {"cliente": "...", <faixas>, "total": v, "pedidos": n, "mais_antigo": "yyyy-mm-dd"}, ... ],
+      "por_entregador": [ {"encarregado_id": 2, "nome": "...", <faixas>, "total": v, "pedidos": n}, ... ]
+    }
+    """
+    env = session.get('enviroment')
+    if not session.get('user_id') or not env:
+        return jsonify({'error': 'Usuário não autenticado ou ambiente não definido'}), 401
+    if session.get('user_type') != 'admin':
+        return jsonify({'error': 'Apenas administradores podem ver contas a receber'}), 403
+    limite = max(1, min(request.args.get('limite', 10, type=int), 100))
+
+    try:
+        from datetime import date
+        from app.cache import memoizar, tag_ambiente
+
+        hoje = date.today()
+        return jsonify(memoizar(f'aging:{env}:{hoje.isoformat()}:{limite}', lambda: dados_aging(env, hoje, limite),
+                                tags=[tag_ambiente(env)]))
+    except Exception as e:
+        return jsonify({'error': 'Falha ao calcular aging', 'detail': str(e)}), 500
+
+
+def dados_aging(env, hoje, limite=10):
+    """Calcula o aging com um único GROUP BY (cliente, entregador) e faixas por CASE.
+
+    Entregadores sem usuário (encarregado_id NULL, só o nome) são agrupados pelo nome.
+
+    Pedidos não pagos nunca são arquivados, então basta a tabela quente; o filtro
+    (enviroment, pago, metodo_pagamento) usa o índice ix_entregas_env_pago_metodo_data
+    e só as contas em aberto são lidas, por maior que seja o histórico. A idade
+    é comparada com datas de corte calculadas aqui (data é texto ISO yyyy-mm-dd).
+    """
+    from datetime import timedelta
+    from sqlalchemy import case, func
+    from app import db
+    from app.models.entregas import Entrega
+
+    valor = func.coalesce(db.cast(Entrega.preco, db.Integer), 0)
+    somas = []
+    for chave, de, ate in AGING_FAIXAS:
+        condicoes = [Entrega.data <= (hoje - timedelta(days=de)).isoformat()]
+        if ate is not None:
+            condicoes.append(Entrega.data >= (hoje - timedelta(days=ate)).isoformat())
+        somas.append(func.sum(case((db.and_(*condicoes), valor), else_=0)).label(chave))
+
+    linhas = db.session.query(
+        Entrega.destinatario,
+        Entrega.encarregado_id,
+        Entrega.encarregado,
+        func.count(Entrega.id),
+        func.min(Entrega.data),
+        *somas
+    ).filter(
+        Entrega.enviroment == env,
+        Entrega.pago.is_(False),
+        Entrega.metodo_pagamento == 'a_prazo',
+        Entrega.entregue.is_(True)
+    ).group_by(Entrega.destinatario, Entrega.encarregado_id, Entrega.encarregado).all()
+
+    faixas = [chave for chave, _, _ in AGING_FAIXAS]
+
+    def vazio():
+        return dict({f: 0 for f in faixas}, total=0, pedidos=0)
+
+    totais = vazio()
+    clientes = {}
+    entregadores = {}
+    for destinatario, encarregado_id, encarregado, pedidos, mais_antigo, *valores in linhas:
+        cliente = clientes.setdefault(destinatario, dict(vazio(), cliente=destinatario, mais_antigo=mais_antigo))
+        entregador = entregadores.setdefault(
+            encarregado_id if encarregado_id is not None else encarregado,
+            dict(vazio(), encarregado_id=encarregado_id, nome=encarregado or '')
+        )
+        for destino in (totais, cliente, entregador):
+            for f, v in zip(faixas, valores):
+                destino[f] += int(v or 0)
+                destino['total'] += int(v or 0)
+            destino['pedidos'] += pedidos
+        if mais_antigo and (not cliente['mais_antigo'] or mais_antigo < cliente['mais_antigo']):
+            cliente['mais_antigo'] = mais_antigo
+
+    def por_total(item):
+        return (-item['total'], item.get('mais_antigo') or '')
+
+    return {
+        'data_base': hoje.isoformat(),
+        'faixas': faixas,
+        'totais': totais,
+        'maiores_devedores': sorted(clientes.values(), key=por_total)[:limite],
+        'por_entregador': sorted(entregadores.values(), key=por_total),
+    }
+
+
+@api_bp.route('/limites', methods=['GET'])
+def api_limites():
+    """Contadores do limite de requisições deste processo para o ambiente do admin.
+
+    Retorna { "pid": 123, "grupos": { "dashboard": {"permitidos": n, "bloqueados": n}, ... } }.
+    """
+    import os
+
+    # Apenas administradores; só enxergam os contadores do próprio ambiente
+    env = session.get('enviroment')
+    if not session.get('user_id') or not env:
+        return jsonify({'error': 'Usuário não autenticado ou ambiente não definido'}), 401
+    if session.get('user_type') != 'admin':
+        return jsonify({'error': 'Apenas administradores podem ver os limites'}), 403
+
+    limitador = current_app.extensions.get('limites')
+    if limitador is None:
+        return jsonify({'pid': os.getpid(), 'habilitado': False, 'grupos': {}})
+    return jsonify({'pid': os.getpid(), 'habilitado': True, 'grupos': limitador.contadores(env)})
+
+
+@api_bp.route('/cache', methods=['GET'])
+def api_cache():
+    """Backend e contadores do cache de leituras deste processo (admin).
+
+    Retorna { "pid": 123, "backend": "sqlite", "hits": n, "misses": n, "taxa_acerto": 0.9, ... }.
+    """
+    import os
+
+    if not session.get('user_id') or not session.get('enviroment'):
+        return jsonify({'error': 'Usuário não autenticado ou ambiente não definido'}), 401
+    if session.get('user_type') != 'admin':
+        return jsonify({'error': 'Apenas administradores podem ver o cache'}), 403
+
+    cache = current_app.extensions.get('cache')
+    if cache is None:
+        return jsonify({'pid': os.getpid(), 'backend': None})
+    return jsonify({'pid': os.getpid(), **cache.estatisticas()})
+
+
+@api_bp.route('/auditoria', methods=['GET'])
+def api_auditoria():
+    """Eventos de auditoria do ambiente, mais recentes primeiro (admin).
+
+    Parâmetros: ?limite=50 (máx. 200), ?antes_de=<id> (próxima página) e os
+    filtros opcionais ?entidade=, ?entidade_id=, ?acao=, ?user_id=.
+    Estrutura retornada:
+    {
+      "itens": [ {"id", "criado_em", "user_id", "user_name", "entidade", "entidade_id",
+                  "acao", "antes", "depois"}, ... ],
+      "proximo": <id para ?antes_de=> | null,
+      "pendentes": n   # eventos deste processo ainda não gravados (aparecem em até AUDIT_FLUSH_INTERVAL s)
+    }
+    """
+    env = session.get('enviroment')
+    if not session.get('user_id') or not env:
+        return jsonify({'error': 'Usuário não autenticado ou ambiente não definido'}), 401
+    if session.get('user_type') != 'admin':
+        return jsonify({'error': 'Apenas administradores podem ver a auditoria'}), 403
+
+    auditoria = current_app.extensions.get('auditoria')
+    if auditoria is None:
+        return jsonify({'error': 'Auditoria desabilitada'}), 404
+    limite = max(1, min(request.args.get('limite', 50, type=int), 200))
+
+    try:
+        itens, proximo = auditoria.consultar(
+            env,
+            antes_de=request.args.get('antes_de', type=int),
+            limite=limite,
+            entidade=request.args.get('entidade') or None,
+            entidade_id=request.args.get('entidade_id') or None,
+            acao=request.args.get('acao') or None,
+            user_id=request.args.get('user_id', type=int),
+        )
+        return jsonify({'itens': itens, 'proximo': proximo, 'pendentes': auditoria.pendentes()})
+    except Exception as e:
+        return jsonify({'error': 'Falha ao consultar auditoria', 'detail': str(e)}), 500
+
+
+@api_bp.route('/precos', methods=['GET'])
+def api_precos_list():
+    """Retorna o catálogo de preços do ambiente: { "precos": { "p45": 400, ... } }."""
+    env = session.get('enviroment')
+    if not session.get('user_id') or not env:
+        return jsonify({'error': 'Usuário não autenticado ou ambiente não definido'}), 401
+
+    try:
+        from app.precos import tabela_de_precos
+        return jsonify({'precos': tabela_de_precos(env)})
+    except Exception as e:
+        return jsonify({'error': 'Falha ao buscar preços', 'detail': str(e)}), 500
+
+
+@api_bp.route('/precos', methods=['PUT'])
+def api_precos_update():
+    """Cria ou atualiza preços do catálogo do ambiente (apenas admin).
+
+    Espera JSON: { "precos": { "p45": 410, "agua": 12 } }
+    Invalida o cache do ambiente e agenda a reprecificação dos pedidos em aberto.
+    """
+    env = session.get('enviroment')
+    if not session.get('user_id') or not env:
+        return jsonify({'error': 'Usuário não autenticado ou ambiente não definido'}), 401
+    if session.get('user_type') != 'admin':
+        return jsonify({'error': 'Apenas administradores podem alterar preços'}), 403
+
+    try:
+        data = request.get_json(force=True) or {}
+    except Exception:
+        return jsonify({'error': 'JSON inválido'}), 400
+
+    precos = data.get('precos')
+    if not isinstance(precos, dict) or not precos:
+        return jsonify({'error': 'Campo precos é obrigatório'}), 400
+    novos = {}
+    for produto, valor in precos.items():
+        produto = str(produto or '').strip().lower()
+        if not produto or isinstance(valor, bool) or not isinstance(valor, int) or valor < 0:
+            return jsonify({'error': f'Preço inválido para {produto or "(vazio)"}'}), 400
+        novos[produto] = valor
+
+    try:
+        from app import db
+        from app.auditoria import registrar
+        from app.jobs import enfileirar
+        from app.models.precos import Preco
+        from app.precos import PRECOS_PADRAO, invalidar
+
+        atuais = {p.produto: p for p in Preco.query.filter_by(enviroment=env).all()}
+        # valores vigentes antes da alteração (o padrão, se o ambiente ainda não tem catálogo próprio)
+        antes = {
+            produto: atuais[produto].valor if produto in atuais else (None if atuais else PRECOS_PADRAO.get(produto))
+            for produto in novos
+        }
+        if not atuais:
+            # primeiro ajuste do ambiente: materializa os preços padrão antes de sobrescrever
+            for produto, valor in PRECOS_PADRAO.items():
+                if produto not in novos:
+                    db.session.add(Preco(produto=produto, valor=valor, enviroment=env))
+        for produto, valor in novos.items():
+            if produto in atuais:
+                atuais[produto].valor = valor
+            else:
+                db.session.add(Preco(produto=produto, valor=valor, enviroment=env))
+
+        enfileirar('precos.recalcular', {'env': env}, enviroment=env)
+        db.session.commit()
+        invalidar(env)
+        registrar('precos', env, 'atualizar', antes=antes, depois=novos)
+        return jsonify({'ok': True, 'precos': novos})
+    except Exception as e:
+        try:
+            db.session.rollback()
+        except Exception:
+            pass
+        return jsonify({'error': 'Falha ao salvar preços', 'detail': str(e)}), 500
 
 
 @api_bp.route('/clientes', methods=['POST'])
@@ -229,6 +581,7 @@ def api_clientes_create():
 
     try:
         from app import db
+        from app.auditoria import registrar
         from app.models.clientes import Cliente
 
         # enviroment herdado do usuário que está cadastrando o cliente (já validado acima)
@@ -236,7 +589,9 @@ def api_clientes_create():
         db.session.add(cliente)
         db.session.commit()
 
-        return jsonify({'ok': True, 'cliente': cliente.to_dict()}), 201
+        gravado = cliente.to_dict()
+        registrar('cliente', cliente.id, 'criar', depois=gravado)
+        return jsonify({'ok': True, 'cliente': gravado}), 201
     except Exception as e:
         try:
             db.session.rollback()
@@ -245,22 +600,90 @@ def api_clientes_create():
         return jsonify({'error': 'Falha ao criar cliente', 'detail': str(e)}), 500
 
 
+# CONCORRÊNCIA NAS AÇÕES SOBRE ENTREGAS (retirar / confirm / pagar)
+# -------------------------------------------------
+# Entrega e EstoqueItem têm coluna `versao` (version_id_col): cada UPDATE é um
+# compare-and-swap "WHERE id = ? AND versao = ?" que incrementa a versão.
+# Contrato com o cliente:
+#   - opcionalmente envie a versão que o usuário viu: {"versao": n} no corpo
+#     JSON ou o header If-Match: n (o valor vem de entrega.versao nas listas);
+#   - 409 com "conflito": "versao_divergente" -> a entrega mudou desde que foi
+#     exibida; mostre o estado em "entrega" e só repita se ainda fizer sentido;
+#   - 409 com "conflito": "alteracao_concorrente" -> outra requisição gravou a
+#     mesma linha (ou o mesmo saldo de estoque) durante esta; a ação não foi
+#     aplicada e pode ser repetida com "versao": "versao_atual".
+# Nenhum lock pessimista é usado: leituras não bloqueiam e só quem perde a
+# corrida refaz a ação.
+
+
+def _versao_esperada():
+    """Versão enviada pelo cliente (If-Match ou JSON "versao"); None se não enviada.
+
+    Levanta ValueError se o valor não for um inteiro.
+    """
+    valor = request.headers.get('If-Match')
+    if valor is not None:
+        valor = valor.strip().removeprefix('W/').strip('"')
+    else:
+        data = request.get_json(silent=True)
+        valor = data.get('versao') if isinstance(data, dict) else None
+    if valor is None or valor == '':
+        return None
+    return int(valor)
+
+
+def _conflito_entrega(entrega_id, motivo):
+    """Resposta 409 com o estado atual da entrega (após desfazer a transação)."""
+    from app import db
+    from app.models.entregas import Entrega
+
+    db.session.rollback()
+    atual = db.session.get(Entrega, entrega_id)
+    mensagens = {
+        'versao_divergente': 'A entrega foi alterada desde que foi exibida',
+        'alteracao_concorrente': 'A entrega ou o estoque foi alterado por outra requisição; tente novamente',
+    }
+    return jsonify({
+        'error': mensagens[motivo],
+        'conflito': motivo,
+        'versao_atual': atual.versao if atual else None,
+        'entrega': atual.to_dict() if atual else None,
+    }), 409
+
+
 @api_bp.route('/entregas/<int:entrega_id>/confirm', methods=['POST'])
 def api_entrega_confirm(entrega_id):
-    """Marca uma entrega como entregue (entregue=True). Retorna registro atualizado."""
+    """Marca uma entrega como entregue (entregue=True). Retorna registro atualizado.
+
+    Aceita a versão esperada (ver contrato acima); conflitos retornam 409.
+    """
+    from sqlalchemy.orm.exc import StaleDataError
+
     # Requer usuário autenticado para confirmar entregas
     if not session.get('user_id'):
         return jsonify({'error': 'Usuário não autenticado'}), 401
+    try:
+        versao = _versao_esperada()
+    except ValueError:
+        return jsonify({'error': 'versao inválida'}), 400
 
     try:
         from app import db
+        from app.auditoria import registrar
         from app.models.entregas import Entrega
         entrega = Entrega.query.get(entrega_id)
         if not entrega:
             return jsonify({'error': 'Entrega não encontrada'}), 404
+        if versao is not None and versao != entrega.versao:
+            return _conflito_entrega(entrega_id, 'versao_divergente')
+        antes = entrega.to_dict()
         entrega.entregue = True
         db.session.commit()
-        return jsonify({'ok': True, 'entrega': entrega.to_dict()})
+        depois = entrega.to_dict()
+        registrar('entrega', entrega_id, 'confirmar', antes=antes, depois=depois)
+        return jsonify({'ok': True, 'entrega': depois})
+    except StaleDataError:
+        return _conflito_entrega(entrega_id, 'alteracao_concorrente')
     except Exception as e:
         try:
             db.session.rollback()
@@ -276,103 +699,95 @@ def api_entrega_retirar(entrega_id):
     Momento da baixa de estoque: quando o usuário "retira" o pedido para entrega.
 
     Regras:
-      - Requer sessão com user_name.
-      - Se entrega já tiver encarregado diferente, retorna 409.
-      - Se encarregado estiver vazio ou igual ao usuário, tenta atribuir e baixar estoque.
+      - Requer sessão com user_id e user_name.
+      - Se entrega já estiver atribuída a outro usuário (encarregado_id diferente,
+        ou só um nome de encarregado sem usuário), retorna 409.
+      - Se estiver livre ou atribuída ao próprio usuário, tenta atribuir e baixar estoque.
       - Campo produto da entrega é uma string no formato "agua:2, p45:1".
+      - Aceita a versão esperada (ver contrato acima). A entrega e os saldos do
+        estoque são gravados com compare-and-swap; conflitos retornam 409.
     """
+    from sqlalchemy.orm.exc import StaleDataError
 
-    def _parse_produtos(produto_str):
-        """Converte a string de produtos em um dicionário de quantidades.
-
-        Exemplo de entrada: "agua:2, p45:1" -> {"agua": 2, "p45": 1}
-        Ignora partes vazias e quantidades inválidas (<=0).
-        """
-        result = {}
-        if not produto_str:
-            return result
-        for part in produto_str.split(','):
-            part = part.strip()
-            if not part:
-                continue
-            if ':' not in part:
-                continue
-            tipo, qtd_str = part.split(':', 1)
-            tipo = (tipo or '').strip().lower()
-            qtd_str = (qtd_str or '').strip()
-            if not tipo or not qtd_str:
-                continue
-            try:
-                qtd = int(qtd_str)
-            except ValueError:
-                continue
-            if qtd <= 0:
-                continue
-            # acumula se houver repetição do mesmo tipo
-            result[tipo] = result.get(tipo, 0) + qtd
-        return result
-
+    user_id = session.get('user_id')
     user_name = session.get('user_name')
     env = session.get('enviroment')
-    if not user_name or not env:
+    if not user_id or not user_name or not env:
         return jsonify({'error': 'Usuário não autenticado ou ambiente não definido'}), 401
+    try:
+        versao = _versao_esperada()
+    except ValueError:
+        return jsonify({'error': 'versao inválida'}), 400
     try:
         from app import db
+        from app.auditoria import registrar
         from app.models.entregas import Entrega
-        from app.models.estoque import Estoque
+        from app.models.entregas import parse_produtos
+        from app.models.estoque import Deposito
 
         entrega = Entrega.query.get(entrega_id)
         if not entrega:
             return jsonify({'error': 'Entrega não encontrada'}), 404
+        if versao is not None and versao != entrega.versao:
+            return _conflito_entrega(entrega_id, 'versao_divergente')
 
         # Se já atribuída a outro usuário, não permite retirar
-        if entrega.encarregado and entrega.encarregado != user_name:
-            return jsonify({'error': 'Entrega já atribuída', 'encarregado': entrega.encarregado}), 409
-
-        # Carrega registro de estoque APENAS do mesmo enviroment do usuário
-        estoque = Estoque.query.filter_by(enviroment=env).first()
-        if not estoque:
+        propria = entrega.encarregado_id == user_id
+        if not propria and (entrega.encarregado_id is not None or entrega.encarregado):
+            return jsonify({'error': 'Entrega já atribuída', 'conflito': 'ja_atribuida',
+                            'encarregado': entrega.encarregado}), 409
+
+        # Depósito APENAS do mesmo enviroment do usuário (padrão ou ?deposito_id=)
+        deposito_id = request.args.get('deposito_id', type=int)
+        if deposito_id is not None:
+            deposito = Deposito.query.filter_by(id=deposito_id, enviroment=env).first()
+        else:
+            deposito = Deposito.padrao_do_ambiente(env)
+        if not deposito:
             return jsonify({'error': 'Estoque não configurado para este ambiente'}), 500
 
         # Se a entrega já estiver atribuída ao mesmo usuário, não baixa estoque de novo
-        if entrega.encarregado == user_name:
+        if propria:
             return jsonify({'ok': True, 'entrega': entrega.to_dict(), 'warning': 'Entrega já atribuída a este usuário. Nenhuma nova baixa de estoque executada.'})
 
-        itens = _parse_produtos(entrega.produto)
+        itens = parse_produtos(entrega.produto)
 
-        # Mapeia chaves de produto para campos do modelo Estoque
-        campo_map = {
-            'p45': 'p45',
-            'p20': 'p20',
-            'p13': 'p13',
-            'p8': 'p8',
-            'p5': 'p5',
-            'agua': 'agua',
-        }
+        # Saldos do depósito para os produtos do pedido, em uma única query indexada.
+        # Produtos fora do catálogo não aparecem no resultado e são ignorados na baixa.
+        saldos = deposito.itens_por_codigo(itens.keys())
 
         # Validação de estoque suficiente
         for tipo, qtd in itens.items():
-            campo = campo_map.get(tipo)
-            if not campo:
-                # Produto desconhecido, ignora na baixa mas avisa
+            if tipo not in saldos:
                 continue
-            atual = getattr(estoque, campo) or 0
+            item = saldos[tipo]
+            atual = item.quantidade if item else 0
             if atual < qtd:
                 return jsonify({'error': f'Estoque insuficiente para {tipo}. Disponível: {atual}, necessário: {qtd}'}), 400
 
         # Aplica baixa
+        antes = entrega.to_dict()
+        saldos_antes, saldos_depois = {}, {}
         for tipo, qtd in itens.items():
-            campo = campo_map.get(tipo)
-            if not campo:
+            item = saldos.get(tipo)
+            if item is None:
                 continue
-            atual = getattr(estoque, campo) or 0
-            setattr(estoque, campo, atual - qtd)
+            saldos_antes[tipo] = item.quantidade
+            item.quantidade = item.quantidade - qtd
+            saldos_depois[tipo] = item.quantidade
 
         # Atribui entrega ao usuário
+        entrega.encarregado_id = user_id
         entrega.encarregado = user_name
 
         db.session.commit()
-        return jsonify({'ok': True, 'entrega': entrega.to_dict()})
+        depois = entrega.to_dict()
+        registrar('entrega', entrega_id, 'retirar', antes=antes, depois=depois)
+        if saldos_antes:
+            registrar('estoque', deposito.id, 'baixa', antes=saldos_antes, depois=saldos_depois)
+        return jsonify({'ok': True, 'entrega': depois})
+    except StaleDataError:
+        return _conflito_entrega(entrega_id, 'alteracao_concorrente')
     except Exception as e:
         try:
             db.session.rollback()
@@ -383,22 +798,39 @@ def api_entrega_retirar(entrega_id):
 
 @api_bp.route('/entregas/<int:entrega_id>/pagar', methods=['POST'])
 def api_entrega_pagar(entrega_id):
-    """Marca uma entrega como paga (pago=True) somente se já estiver entregue."""
+    """Marca uma entrega como paga (pago=True) somente se já estiver entregue.
+
+    Aceita a versão esperada (ver contrato acima); conflitos retornam 409.
+    """
+    from sqlalchemy.orm.exc import StaleDataError
+
     # Requer usuário autenticado para registrar pagamento
     if not session.get('user_id'):
         return jsonify({'error': 'Usuário não autenticado'}), 401
+    try:
+        versao = _versao_esperada()
+    except ValueError:
+        return jsonify({'error': 'versao inválida'}), 400
 
     try:
         from app import db
+        from app.auditoria import registrar
         from app.models.entregas import Entrega
         entrega = Entrega.query.get(entrega_id)
         if not entrega:
             return jsonify({'error': 'Entrega não encontrada'}), 404
+        if versao is not None and versao != entrega.versao:
+            return _conflito_entrega(entrega_id, 'versao_divergente')
         if not entrega.entregue:
             return jsonify({'error': 'Entrega ainda não marcada como entregue'}), 400
+        antes = entrega.to_dict()
         entrega.pago = True
         db.session.commit()
-        return jsonify({'ok': True, 'entrega': entrega.to_dict()})
+        depois = entrega.to_dict()
+        registrar('entrega', entrega_id, 'pagar', antes=antes, depois=depois)
+        return jsonify({'ok': True, 'entrega': depois})
+    except StaleDataError:
+        return _conflito_entrega(entrega_id, 'alteracao_concorrente')
     except Exception as e:
         try:
             db.session.rollback()
@@ -407,6 +839,56 @@ def api_entrega_pagar(entrega_id):
         return jsonify({'error': 'Falha ao marcar pagamento', 'detail': str(e)}), 500
 
 
+@api_bp.route('/entregadores/carga', methods=['GET'])
+def api_carga_entregadores():
+    """Carga de trabalho por entregador do ambiente (admin).
+
+    Retorna { "entregadores": [ {"encarregado_id", "nome", "em_aberto", "entregues"}, ... ] },
+    com todos os usuários entregadores do ambiente (inclusive os sem entregas),
+    ordenado por em_aberto decrescente. "entregues" conta só a tabela quente
+    (as entregas arquivadas não entram).
+    """
+    env = session.get('enviroment')
+    if not session.get('user_id') or not env:
+        return jsonify({'error': 'Usuário não autenticado ou ambiente não definido'}), 401
+    if session.get('user_type') != 'admin':
+        return jsonify({'error': 'Apenas administradores podem ver a carga dos entregadores'}), 403
+
+    try:
+        from sqlalchemy import case, func
+        from app import db
+        from app.models.entregas import Entrega
+        from app.models.users import User
+
+        # Uma única consulta agregada, resolvida pelo índice
+        # (enviroment, encarregado_id, entregue) sem ler a tabela
+        contagens = db.session.query(
+            Entrega.encarregado_id,
+            func.sum(case((Entrega.entregue.is_(False), 1), else_=0)),
+            func.sum(case((Entrega.entregue.is_(True), 1), else_=0)),
+        ).filter(
+            Entrega.enviroment == env,
+            Entrega.encarregado_id.isnot(None)
+        ).group_by(Entrega.encarregado_id).all()
+        por_id = {encarregado_id: (int(abertas or 0), int(entregues or 0)) for encarregado_id, abertas, entregues in contagens}
+
+        # Nomes vêm de users (banco principal), apenas do mesmo enviroment
+        usuarios = db.session.query(User.id, User.name).filter(
+            User.enviroment == env,
+            db.or_(User.user_type == 'user', User.id.in_(list(por_id)))
+        ).all()
+
+        entregadores = [
+            {'encarregado_id': user_id, 'nome': nome,
+             'em_aberto': por_id.get(user_id, (0, 0))[0], 'entregues': por_id.get(user_id, (0, 0))[1]}
+            for user_id, nome in usuarios
+        ]
+        entregadores.sort(key=lambda e: (-e['em_aberto'], e['nome']))
+        return jsonify({'entregadores': entregadores})
+    except Exception as e:
+        return jsonify({'error': 'Falha ao calcular carga dos entregadores', 'detail': str(e)}), 500
+
+
 @api_bp.route('/themes', methods=['GET'])
 def api_list_themes():
     """Lista as variáveis de cor agrupadas por tema.
@@ -428,31 +910,39 @@ def api_list_themes():
         return jsonify({'error': 'Usuário não autenticado'}), 401
 
     try:
-        from app.models.color import Color
+        # Ambiente do usuário logado
+        return jsonify(dados_temas(session.get('enviroment')))
+    except Exception as e:
+        return jsonify({'error': 'Falha ao buscar temas', 'detail': str(e)}), 500
 
-        temas = {}
 
-        # Ambiente do usuário logado
-        env = session.get('enviroment')
+def dados_temas(env):
+    """Monta o payload de /api/themes (também usado por /dashboard/bootstrap)."""
+    from app.cache import memoizar, tag_ambiente
+
+    return memoizar(f'temas:{env}', lambda: _carregar_temas(env), tags=[tag_ambiente(env)])
 
-        # 1) tenta buscar cores específicas do ambiente
-        cores = []
-        if env:
-            cores = Color.query.filter_by(enviroment=env).all()
 
-        # 2) se não encontrou cores específicas, usa cores globais (enviroment NULL)
-        if not cores:
-            cores = Color.query.filter(Color.enviroment.is_(None)).all()
+def _carregar_temas(env):
+    from app.models.color import Color
 
-        for c in cores:
-            tema = c.tema or 'root'
-            if tema not in temas:
-                temas[tema] = {}
-            temas[tema][c.nome_variavel] = c.valor_atual or c.valor_padrao
+    temas = {}
 
-        return jsonify(temas)
-    except Exception as e:
-        return jsonify({'error': 'Falha ao buscar temas', 'detail': str(e)}), 500
+    # 1) tenta buscar cores específicas do ambiente
+    cores = []
+    if env:
+        cores = Color.query.filter_by(enviroment=env).all()
+
+    # 2) se não encontrou cores específicas, usa cores globais (enviroment NULL)
+    if not cores:
+        cores = Color.query.filter(Color.enviroment.is_(None)).all()
+
+    for c in cores:
+        tema = c.tema or 'root'
+        if tema not in temas:
+            temas[tema] = {}
+        temas[tema][c.nome_variavel] = c.valor_atual or c.valor_padrao
+    return temas
 
 
 @api_bp.route('/themes/<tema>/apply', methods=['POST'])
@@ -487,9 +977,20 @@ def api_create_custom_theme():
          ...
       }
     }
-    Remove entradas anteriores com mesmo (enviroment, tema) e recria.
+    O tema passa a ter exatamente as cores enviadas, mas só o que mudou é
+    gravado: variáveis novas ou com valor diferente vão em um único upsert
+    em lote (INSERT ... ON CONFLICT pelo índice único (enviroment, tema,
+    nome_variavel)) e só as variáveis que deixaram de vir são apagadas, na
+    mesma transação; leitores nunca veem o tema vazio.
+    Retorna 201 com o que mudou:
+    {
+      "ok": true, "tema": "nome_tema",
+      "alteracoes": { "adicionadas": {"cor-x": "#..."}, "alteradas": {"cor-y": {"de": "#...", "para": "#..."}},
+                      "removidas": ["cor-z"], "inalteradas": 4 }
+    }
     """
     from app import db
+    from app.auditoria import registrar
     from app.models.color import Color
 
     # Requer usuário autenticado e ambiente definido na sessão
@@ -513,30 +1014,53 @@ def api_create_custom_theme():
     if not isinstance(cores, dict) or not cores:
         return jsonify({'error': 'Campo cores é obrigatório'}), 400
 
+    # Cores enviadas (valores vazios são ignorados, como variáveis ausentes)
+    novas = {str(nome_var): str(valor) for nome_var, valor in cores.items() if valor}
+    if not novas:
+        return jsonify({'error': 'Nenhuma cor válida informada'}), 400
+
     try:
-        # Remove qualquer tema anterior com mesmo nome para este ambiente
-        Color.query.filter_by(enviroment=env, tema=tema).delete()
+        # Estado atual do tema: {nome_variavel: (valor_padrao, valor_atual)}
+        atuais = {
+            nome: (valor_padrao, valor_atual)
+            for nome, valor_padrao, valor_atual in db.session.query(
+                Color.nome_variavel, Color.valor_padrao, Color.valor_atual
+            ).filter_by(enviroment=env, tema=tema)
+        }
 
-        # Cria novas entradas para cada variável de cor
-        novos = []
-        for nome_var, valor in cores.items():
-            if not valor:
-                continue
-            novos.append(
-                Color(
-                    nome_variavel=nome_var,
-                    valor_padrao=str(valor),
-                    tema=tema,
-                    enviroment=env,
-                )
-            )
-
-        if not novos:
-            return jsonify({'error': 'Nenhuma cor válida informada'}), 400
-
-        db.session.add_all(novos)
+        # Diff: o tema gravado fica com valor_padrao = valor enviado e sem valor_atual
+        adicionadas = {nome: valor for nome, valor in novas.items() if nome not in atuais}
+        alteradas = {
+            nome: {'de': atuais[nome][1] or atuais[nome][0], 'para': valor}
+            for nome, valor in novas.items()
+            if nome in atuais and atuais[nome] != (valor, None)
+        }
+        removidas = sorted(set(atuais) - set(novas))
+
+        gravar = [
+            {'nome_variavel': nome, 'valor_padrao': novas[nome], 'tema': tema, 'enviroment': env}
+            for nome in list(adicionadas) + list(alteradas)
+        ]
+        if gravar:
+            _upsert_cores(gravar)
+        if removidas:
+            db.session.query(Color).filter(
+                Color.enviroment == env,
+                Color.tema == tema,
+                Color.nome_variavel.in_(removidas)
+            ).delete(synchronize_session=False)
         db.session.commit()
-        return jsonify({'ok': True, 'tema': tema}), 201
+
+        if gravar or removidas:
+            registrar('tema', tema, 'atualizar' if atuais else 'criar',
+                      antes={nome: atual or padrao for nome, (padrao, atual) in atuais.items()} or None,
+                      depois=novas)
+        return jsonify({'ok': True, 'tema': tema, 'alteracoes': {
+            'adicionadas': adicionadas,
+            'alteradas': alteradas,
+            'removidas': removidas,
+            'inalteradas': len(novas) - len(adicionadas) - len(alteradas),
+        }}), 201
     except Exception as e:
         try:
             db.session.rollback()
@@ -545,6 +1069,29 @@ def api_create_custom_theme():
         return jsonify({'error': 'Falha ao salvar tema', 'detail': str(e)}), 500
 
 
+def _upsert_cores(linhas):
+    """INSERT ... ON CONFLICT (enviroment, tema, nome_variavel) DO UPDATE, em lote.
+
+    No conflito o valor enviado vira o valor_padrao e o valor_atual é limpo
+    (descricao e id da linha são mantidos).
+    """
+    from sqlalchemy.dialects import mysql, postgresql, sqlite
+    from app import db
+    from app.models.color import Color
+
+    dialeto = db.session.get_bind(mapper=Color).dialect.name
+    if dialeto == 'mysql':
+        stmt = mysql.insert(Color.__table__)
+        stmt = stmt.on_duplicate_key_update(valor_padrao=stmt.inserted.valor_padrao, valor_atual=None)
+    else:
+        stmt = (postgresql if dialeto == 'postgresql' else sqlite).insert(Color.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['enviroment', 'tema', 'nome_variavel'],
+            set_={'valor_padrao': stmt.excluded.valor_padrao, 'valor_atual': None},
+        )
+    db.session.execute(stmt, linhas)
+
+
 @api_bp.route('/themes/list-names', methods=['GET'])
 def api_list_theme_names():
     """Lista apenas os nomes de tema disponíveis para o ambiente do usuário."""
@@ -580,6 +1127,7 @@ def api_apply_theme_to_env():
     Atualiza User.tema de todos os usuários com User.enviroment == env atual.
     """
     from app import db
+    from app.auditoria import registrar
     from app.models.users import User
 
     # Requer usuário autenticado e ambiente definido
@@ -600,8 +1148,11 @@ def api_apply_theme_to_env():
         return jsonify({'error': 'Campo tema é obrigatório'}), 400
 
     try:
+        antes = {str(user_id): tema_anterior for user_id, tema_anterior in
+                 db.session.query(User.id, User.tema).filter(User.enviroment == env)}
         db.session.query(User).filter(User.enviroment == env).update({User.tema: tema})
         db.session.commit()
+        registrar('ambiente', env, 'aplicar_tema', antes=antes, depois={user_id: tema for user_id in antes})
         # Também salva na sessão do usuário atual
         session['current_theme'] = tema
         return jsonify({'ok': True, 'tema': tema})
@@ -616,21 +1167,25 @@ def api_apply_theme_to_env():
 @api_bp.route('/current-theme', methods=['GET'])
 def api_current_theme():
     """Retorna o tema atual do usuário (coluna User.tema), com fallback para 'root'."""
+    return jsonify({'tema': tema_atual()})
+
+
+def tema_atual():
+    """Nome do tema do usuário logado (ou o salvo na sessão / 'root')."""
     from app.models.users import User
 
     user_id = session.get('user_id')
     if not user_id:
         # se não logado, usa tema salvo na sessão (se houver) ou root
-        tema = session.get('current_theme') or 'root'
-        return jsonify({'tema': tema})
+        return session.get('current_theme') or 'root'
 
     try:
         user = User.query.get(user_id)
         if not user:
-            return jsonify({'tema': 'root'})
-        return jsonify({'tema': user.tema or 'root'})
+            return 'root'
+        return user.tema or 'root'
     except Exception:
-        return jsonify({'tema': 'root'})
+        return 'root'
 
 
 @api_bp.route('/users', methods=['POST'])
@@ -650,6 +1205,7 @@ def api_create_user():
     """
     from werkzeug.security import generate_password_hash
     from app import db
+    from app.auditoria import registrar
     from app.models.users import User
 
     # Requer usuário autenticado
@@ -675,15 +1231,6 @@ def api_create_user():
     if User.query.filter_by(email=email).first():
         return jsonify({'error': 'E-mail já cadastrado'}), 400
 
-    # Tema do novo usuário: herda do criador, com fallback
-    creator = User.query.get(creator_id)
-    tema_inicial = 'root'
-    if creator and creator.tema:
-        tema_inicial = creator.tema
-    else:
-        # fallback: se sessão tiver tema atual, usa-o
-        tema_inicial = session.get('current_theme') or 'root'
-
     try:
         novo = User(
             name=name,
@@ -691,22 +1238,168 @@ def api_create_user():
             password=generate_password_hash(password),
             enviroment=env,
             user_type=user_type,
-            tema=tema_inicial,
+            tema=_tema_inicial(creator_id),
         )
         db.session.add(novo)
         db.session.commit()
 
-        return jsonify({'ok': True, 'user': {
-            'id': novo.id,
-            'name': novo.name,
-            'email': novo.email,
-            'enviroment': novo.enviroment,
-            'user_type': novo.user_type,
-            'tema': novo.tema,
-        }}), 201
+        criado = _usuario_dict(novo)
+        registrar('usuario', novo.id, 'criar', depois=criado)
+        return jsonify({'ok': True, 'user': criado}), 201
     except Exception as e:
         try:
             db.session.rollback()
         except Exception:
             pass
         return jsonify({'error': 'Falha ao criar usuário', 'detail': str(e)}), 500
+
+
+def _tema_inicial(creator_id):
+    """Tema de um usuário novo: herda do criador, com fallback para o da sessão / 'root'."""
+    from app.models.users import User
+
+    creator = User.query.get(creator_id)
+    if creator and creator.tema:
+        return creator.tema
+    # fallback: se sessão tiver tema atual, usa-o
+    return session.get('current_theme') or 'root'
+
+
+def _usuario_dict(user):
+    # sem a senha (nem o hash): o mesmo dict vai para a resposta e para a auditoria
+    return {
+        'id': user.id,
+        'name': user.name,
+        'email': user.email,
+        'enviroment': user.enviroment,
+        'user_type': user.user_type,
+        'tema': user.tema,
+    }
+
+
+@api_bp.route('/users/bulk', methods=['POST'])
+def api_create_users_bulk():
+    """Cria vários usuários de uma vez no ambiente do criador (cadastro de um depósito novo).
+
+    Aceita JSON { "usuarios": [ {name, email, password, user_type}, ... ] } (ou a
+    lista direto), ou CSV com cabeçalho name,email,password,user_type, enviado
+    como corpo text/csv ou no campo de arquivo "arquivo" (multipart).
+
+    Cada linha é validada como em POST /api/users; os e-mails já cadastrados
+    são verificados em uma única consulta (IN), os hashes de senha são gerados
+    em paralelo (app/senhas.py) e todos os válidos são gravados em uma só
+    transação. Linhas inválidas não impedem as demais.
+    Retorna 201 se ao menos um usuário foi criado (400 se nenhum):
+    {
+      "criados": n, "erros": n,
+      "resultados": [ {"linha": 1, "email": "...", "ok": true, "user": {...}},
+                      {"linha": 2, "email": "...", "ok": false, "error": "..."}, ... ]
+    }
+    """
+    import csv
+    import io
+    from sqlalchemy.exc import IntegrityError
+    from app import db
+    from app.auditoria import registrar
+    from app.models.users import User
+    from app.senhas import gerar_hashes
+
+    creator_id = session.get('user_id')
+    env = session.get('enviroment')
+    if not creator_id or not env:
+        return jsonify({'error': 'Usuário não autenticado ou ambiente não definido'}), 401
+
+    # Leitura das linhas (JSON ou CSV)
+    arquivo = request.files.get('arquivo')
+    if arquivo is not None or request.mimetype in ('text/csv', 'application/csv'):
+        try:
+            texto = (arquivo.read() if arquivo is not None else request.get_data()).decode('utf-8-sig')
+            linhas = list(csv.DictReader(io.StringIO(texto)))
+        except (UnicodeDecodeError, csv.Error):
+            return jsonify({'error': 'CSV inválido'}), 400
+    else:
+        try:
+            data = request.get_json(force=True)
+        except Exception:
+            return jsonify({'error': 'JSON inválido'}), 400
+        linhas = data.get('usuarios') if isinstance(data, dict) else data
+        if not isinstance(linhas, list):
+            return jsonify({'error': 'Campo usuarios é obrigatório'}), 400
+
+    if not linhas:
+        return jsonify({'error': 'Nenhum usuário informado'}), 400
+    maximo = current_app.config.get('USERS_BULK_MAX', 1000)
+    if len(linhas) > maximo:
+        return jsonify({'error': f'Máximo de {maximo} usuários por requisição'}), 400
+
+    # Validação linha a linha (mesmas regras de POST /api/users)
+    resultados = []
+    validos = {}   # email -> índice em resultados
+    for numero, linha in enumerate(linhas, start=1):
+        linha = linha if isinstance(linha, dict) else {}
+        name = str(linha.get('name') or '').strip()
+        email = str(linha.get('email') or '').strip().lower()
+        password = str(linha.get('password') or '').strip()
+        user_type = str(linha.get('user_type') or '').strip()
+        resultado = {'linha': numero, 'email': email or None, 'ok': False}
+        resultados.append(resultado)
+        if not name or not email or not password or user_type not in ('admin', 'user'):
+            resultado['error'] = 'Campos obrigatórios inválidos'
+        elif email in validos:
+            resultado['error'] = f'E-mail repetido na linha {resultados[validos[email]]["linha"]}'
+        else:
+            validos[email] = len(resultados) - 1
+            resultado['_campos'] = (name, password, user_type)
+
+    def descartar_existentes():
+        # e-mails já cadastrados, em uma única consulta
+        for (email,) in db.session.query(User.email).filter(User.email.in_(list(validos))):
+            resultado = resultados[validos.pop(email)]
+            resultado.pop('_campos')
+            resultado['error'] = 'E-mail já cadastrado'
+
+    try:
+        if validos:
+            descartar_existentes()
+        novos = []
+        if validos:
+            tema = _tema_inicial(creator_id)
+            pendentes = [resultados[i] for i in validos.values()]
+            hashes = gerar_hashes([r['_campos'][1] for r in pendentes])
+            for _ in range(2):
+                novos = [
+                    User(name=r['_campos'][0], email=r['email'], password=hash_, enviroment=env,
+                         user_type=r['_campos'][2], tema=tema)
+                    for r, hash_ in zip(pendentes, hashes) if r['email'] in validos
+                ]
+                db.session.add_all(novos)
+                try:
+                    db.session.commit()
+                    break
+                except IntegrityError:
+                    # e-mail cadastrado por outra requisição entre a consulta e o commit:
+                    # refaz a verificação e tenta gravar os restantes mais uma vez
+                    db.session.rollback()
+                    descartar_existentes()
+            else:
+                raise RuntimeError('Conflito de e-mails ao gravar o lote')
+
+        for user in novos:
+            resultado = resultados[validos[user.email]]
+            resultado.pop('_campos')
+            resultado['ok'] = True
+            resultado['user'] = _usuario_dict(user)
+            registrar('usuario', user.id, 'criar', depois=resultado['user'])
+    except Exception as e:
+        try:
+            db.session.rollback()
+        except Exception:
+            pass
+        return jsonify({'error': 'Falha ao criar usuários', 'detail': str(e)}), 500
+
+    criados = len(novos)
+    return jsonify({
+        'criados': criados,
+        'erros': len(resultados) - criados,
+        'resultados': resultados,
+    }), 201 if criados else 400
@@ -1,8 +1,12 @@
-from flask import Blueprint, render_template, session, redirect, url_for, jsonify, abort
+from flask import (
+    Blueprint, render_template, session, redirect, url_for, jsonify, abort,
+    request, Response, current_app, stream_with_context,
+)
 from app import db
+from app.cache import memoizar, tag_ambiente
 from app.models.estoque import Estoque
 from app.models.clientes import Cliente
-from app.models.entregas import Entrega
+from app.models.entregas import Entrega, EntregaArquivo, ENTREGA_CAMPOS, uniao_com_arquivo
 from app.models.color import Color
 from app.models.users import User
 
@@ -15,11 +19,10 @@ from app.models.users import User
 #   - nunca retornar dados de outros ambientes.
 # Ao criar novas rotas de dashboard, siga este padrão.
 
-# Nota: o limite máximo do estoque (capacidade) está definido em
-# `app/models/estoque.py` como DEFAULT_CAPACITY (atualmente 250).
-# A constraint no banco (ck_estoque_total_max) também impõe que a soma dos
-# campos p45+p20+p13+p8+p5+agua não ultrapasse esse limite. Se quiser alterar
-# a capacidade, atualize DEFAULT_CAPACITY e ajuste a constraint no modelo/banco.
+# Nota: o estoque é guardado em formato longo (depositos x produtos, tabela
+# estoque_itens). A capacidade de cada depósito fica em Deposito.capacidade
+# (valor inicial DEFAULT_CAPACITY em `app/models/estoque.py`); para alterá-la
+# basta atualizar a linha do depósito, sem migração de schema.
 
 
 dashboard_bp = Blueprint('dashboard', __name__, url_prefix='/dashboard')
@@ -60,6 +63,18 @@ def _get_theme_vars():
         if user and user.tema:
             tema = user.tema
 
+    result = dict(defaults)
+    result.update(_dados_tema(env, tema))
+    return result
+
+
+def _dados_tema(env, tema):
+    """Cores do tema no ambiente, via cache (também usado pelo aquecimento)."""
+    return memoizar(f'theme_vars:{env}:{tema}', lambda: _cores_do_tema(env, tema), tags=[tag_ambiente(env)])
+
+
+def _cores_do_tema(env, tema):
+    """{nome_variavel: valor} do tema no ambiente, com fallback global e root."""
     # 1) tenta buscar cores específicas do ambiente + tema do usuário
     cores = []
     if env:
@@ -73,7 +88,7 @@ def _get_theme_vars():
     if not cores:
         cores = Color.query.filter(Color.enviroment.is_(None), Color.tema == 'root').all()
 
-    result = dict(defaults)
+    result = {}
     for c in cores:
         valor = c.valor_atual or c.valor_padrao
         if not valor:
@@ -94,17 +109,72 @@ def show_dashboard():
     user_name = session.get('user_name', 'Usuário')
     theme_vars = _get_theme_vars()
 
+    # Dados da primeira pintura embutidos no HTML (ver /dashboard/bootstrap):
+    # o front-end não precisa de nenhum fetch extra para montar a tela
+    bootstrap = None
+    env = session.get('enviroment')
+    if env and current_app.config.get('DASHBOARD_BOOTSTRAP_INLINE', True):
+        bootstrap = _dados_bootstrap(user_type, env, session.get('user_id'), session.get('user_name'))
+
     if user_type == 'admin':
-        return render_template('dashboard_admin.html', user_name=user_name, theme_vars=theme_vars)
+        return render_template('dashboard_admin.html', user_name=user_name, theme_vars=theme_vars, bootstrap=bootstrap)
     elif user_type == 'ambiente':
-        return render_template('ambienteUserSettings.html', user_name=user_name, theme_vars=theme_vars)
+        return render_template('ambienteUserSettings.html', user_name=user_name, theme_vars=theme_vars, bootstrap=bootstrap)
     else:
-        return render_template('dashboard.html', user_name=user_name, theme_vars=theme_vars)
+        return render_template('dashboard.html', user_name=user_name, theme_vars=theme_vars, bootstrap=bootstrap)
+
+
+@dashboard_bp.route('/bootstrap', methods=['GET'])
+def get_bootstrap():
+    """Retorna, em um único request, todos os dados que o dashboard busca ao abrir.
+
+    As chaves dependem do tipo de usuário e têm o mesmo conteúdo das rotas
+    individuais (que continuam valendo para o polling):
+      - todos: tema (/api/current-theme), temas (/api/themes)
+      - admin: cards, estoque_cards, estoque (/api/estoque), financeiro
+        (/api/financeiro), clientes, pagamentos_pendentes
+      - entregador: cards, entrega_atual, entregas_pendentes, historico
+    """
+    user_type = session.get('user_type')
+    env = session.get('enviroment')
+    if not session.get('user_id') or not user_type or not env:
+        return abort(401)
+    return jsonify(_dados_bootstrap(user_type, env, session.get('user_id'), session.get('user_name')))
+
+
+def _dados_bootstrap(user_type, env, user_id, user_name):
+    """Calcula as partes do bootstrap com a identidade já lida da sessão.
+
+    Todas as queries rodam na mesma sessão do SQLAlchemy (uma conexão por request).
+    """
+    from app.controllers.api import dados_estoque, dados_financeiro, dados_temas, tema_atual
+
+    dados = {'tema': {'tema': tema_atual()}}
+    try:
+        dados['temas'] = dados_temas(env)
+    except Exception:
+        # sem temas o front-end busca /api/themes normalmente
+        pass
+
+    if user_type == 'admin':
+        dados['cards'] = _dados_cards(env, user_id)
+        dados['estoque_cards'] = _dados_estoque_cards(env)
+        dados['estoque'] = dados_estoque(env)
+        dados['financeiro'] = dados_financeiro(env)
+        dados['clientes'] = _dados_clientes(env)
+        dados['pagamentos_pendentes'] = _dados_pagamentos_pendentes(env)
+    elif user_type != 'ambiente':
+        dados['cards'] = _dados_cards(env, user_id)
+        if user_name:
+            dados['entrega_atual'] = _dados_entrega_atual(env, user_id, user_name)
+        dados['entregas_pendentes'] = _dados_entregas_pendentes(env)
+        dados['historico'] = _dados_historico(env)
+    return dados
 
 
 @dashboard_bp.route('/entrega-atual', methods=['GET'])
 def get_entrega_atual():
-    """Retorna lista de entregas atribuídas ao usuário logado (encarregado == nome) e ainda não entregues.
+    """Retorna lista de entregas atribuídas ao usuário logado (encarregado_id == user_id) e ainda não entregues.
 
     Se não houver sessão ou nenhuma entrega, retorna fallback com um exemplo.
     """
@@ -114,16 +184,21 @@ def get_entrega_atual():
     env = session.get('enviroment')
     if not user_id or not user_name or not env:
         return abort(401)
+    return jsonify(_dados_entrega_atual(env, user_id, user_name))
+
+
+def _dados_entrega_atual(env, user_id, user_name):
     try:
+        # índice (enviroment, encarregado_id, entregue)
         entregas = Entrega.query.filter(
-            Entrega.encarregado == user_name,
-            Entrega.entregue.is_(False),
-            Entrega.enviroment == env
+            Entrega.enviroment == env,
+            Entrega.encarregado_id == user_id,
+            Entrega.entregue.is_(False)
         ).all()
-        return jsonify([e.to_dict() for e in entregas])
+        return [e.to_dict() for e in entregas]
     except Exception:
         # Fallback: um exemplo com preco
-        return jsonify([
+        return [
             {
                 'id': 999,
                 'endereco': 'Rua Exemplo, 100',
@@ -135,7 +210,7 @@ def get_entrega_atual():
                 'pago': False,
                 'preco': '210'
             }
-        ])
+        ]
 
 
 @dashboard_bp.route('/entregas-pendentes', methods=['GET'])
@@ -148,22 +223,24 @@ def get_entregas_pendentes():
     env = session.get('enviroment')
     if not session.get('user_id') or not env:
         return abort(401)
+    return jsonify(_dados_entregas_pendentes(env))
+
 
+def _dados_entregas_pendentes(env):
     try:
-        # pendentes: encarregado vazio e entregue == False, apenas do mesmo enviroment
+        # pendentes: sem encarregado e entregue == False, apenas do mesmo enviroment
         entregas = Entrega.query.filter(
-            Entrega.encarregado == '',
+            Entrega.enviroment == env,
+            Entrega.encarregado_id.is_(None),
             Entrega.entregue.is_(False),
-            Entrega.enviroment == env
+            Entrega.encarregado == ''
         ).all()
-        result = [e.to_dict() for e in entregas]
-        return jsonify(result)
+        return [e.to_dict() for e in entregas]
     except Exception:
         # Fallback inclui todos os campos, inclusive preco
-        entregas = [
+        return [
             {"endereco": "Rua São João, 340", "destinatario": "Fernanda", "produto": "agua:2, p45:1", "metodo_pagamento": "dinheiro", "encarregado": "", "entregue": False, "pago": False, "preco": "420"}
         ]
-        return jsonify(entregas)
 
 
 @dashboard_bp.route('/historico-entregas', methods=['GET'])
@@ -176,20 +253,118 @@ def get_historico_entregas():
     env = session.get('enviroment')
     if not session.get('user_id') or not env:
         return abort(401)
+    return jsonify(_dados_historico(env))
+
 
+def _dados_historico(env):
     try:
         # histórico: entregue True e pago True, apenas do mesmo enviroment
-        historico_db = Entrega.query.filter(
-            Entrega.entregue.is_(True),
-            Entrega.pago.is_(True),
-            Entrega.enviroment == env
-        ).all()
-        return jsonify([e.to_dict() for e in historico_db])
+        # (lê a tabela quente e o arquivo de entregas antigas)
+        historico = uniao_com_arquivo(ENTREGA_CAMPOS, lambda m: [
+            m.entregue.is_(True),
+            m.pago.is_(True),
+            m.enviroment == env
+        ])
+        rows = db.session.execute(db.select(historico).order_by(historico.c.data, historico.c.id)).mappings()
+        return [dict(r) for r in rows]
     except Exception:
-        historico = [
+        return [
             {"endereco": "Rua das Flores, 123", "destinatario": "João", "produto": "p13:1", "metodo_pagamento": "pix", "encarregado": "Carlos", "entregue": True, "pago": True, "preco": "130"}
         ]
-        return jsonify(historico)
+
+
+# Colunas exportadas do histórico (ordem das colunas na planilha)
+_EXPORT_COLUNAS = [
+    ('id', 'ID'),
+    ('data', 'Data'),
+    ('destinatario', 'Destinatário'),
+    ('endereco', 'Endereço'),
+    ('produto', 'Produto'),
+    ('metodo_pagamento', 'Método de pagamento'),
+    ('encarregado', 'Encarregado'),
+    ('preco', 'Preço'),
+]
+
+
+def _data_iso_valida(valor):
+    """Retorna True se o valor estiver no formato yyyy-mm-dd."""
+    from datetime import date
+    try:
+        date.fromisoformat(valor)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+@dashboard_bp.route('/historico-entregas/export', methods=['GET'])
+def export_historico_entregas():
+    """Exporta o histórico de entregas (entregue e pago) em CSV ou XLSX, via streaming.
+
+    Parâmetros (query string):
+      - format: 'csv' (padrão) ou 'xlsx'
+      - from / to: datas yyyy-mm-dd (inclusivas) aplicadas sobre Entrega.data
+
+    As linhas são lidas em lotes (yield_per) e escritas incrementalmente na
+    resposta, então a memória fica constante e o download começa na hora.
+    """
+    from app.exportacao import gerar_csv, gerar_xlsx
+
+    # Apenas administradores autenticados podem exportar o histórico
+    env = session.get('enviroment')
+    if not session.get('user_id') or not env:
+        return abort(401)
+    if session.get('user_type') != 'admin':
+        return abort(403)
+
+    formato = (request.args.get('format') or 'csv').lower()
+    if formato not in ('csv', 'xlsx'):
+        return jsonify({'error': 'format deve ser csv ou xlsx'}), 400
+    data_de = request.args.get('from') or None
+    data_ate = request.args.get('to') or None
+    for valor in (data_de, data_ate):
+        if valor is not None and not _data_iso_valida(valor):
+            return jsonify({'error': 'Datas devem estar no formato yyyy-mm-dd'}), 400
+
+    def filtro(m):
+        condicoes = [m.entregue.is_(True), m.pago.is_(True), m.enviroment == env]
+        # data é ISO (yyyy-mm-dd), então comparação de string respeita a ordem
+        if data_de:
+            condicoes.append(m.data >= data_de)
+        if data_ate:
+            condicoes.append(m.data <= data_ate)
+        return condicoes
+
+    # Seleciona só as colunas exportadas (tuplas, sem montar objetos ORM),
+    # da tabela quente e do arquivo
+    campos = [campo for campo, _ in _EXPORT_COLUNAS]
+    historico = uniao_com_arquivo(campos, filtro)
+    stmt = db.select(*[historico.c[campo] for campo in campos]).order_by(historico.c.data, historico.c.id)
+
+    lote = current_app.config.get('EXPORT_BATCH_SIZE', 1000)
+
+    def linhas():
+        for row in db.session.execute(stmt.execution_options(yield_per=lote)):
+            row = list(row)
+            # preço é gravado como string; exporta como número quando possível
+            try:
+                row[-1] = int(row[-1])
+            except (TypeError, ValueError):
+                pass
+            yield row
+
+    titulos = [titulo for _, titulo in _EXPORT_COLUNAS]
+    sufixo = f"_{data_de or 'inicio'}_{data_ate or 'hoje'}"
+    if formato == 'xlsx':
+        corpo = gerar_xlsx(titulos, linhas(), nome_planilha='Histórico')
+        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    else:
+        corpo = gerar_csv(titulos, linhas())
+        mimetype = 'text/csv'   # o werkzeug acrescenta '; charset=utf-8'
+
+    resp = Response(stream_with_context(corpo), mimetype=mimetype)
+    resp.headers['Content-Disposition'] = f'attachment; filename="historico_entregas{sufixo}.{formato}"'
+    resp.headers['Cache-Control'] = 'no-store'
+    return resp
 
 
 @dashboard_bp.route('/clientes', methods=['GET'])
@@ -202,15 +377,16 @@ def get_clientes():
     env = session.get('enviroment')
     if not session.get('user_id') or not env:
         return abort(401)
+    return jsonify(_dados_clientes(env))
 
+
+def _dados_clientes(env):
     try:
         clientes = Cliente.query.filter_by(enviroment=env).all()
-        result = [c.to_dict() for c in clientes]
-        return jsonify(result)
+        return [c.to_dict() for c in clientes]
     except Exception:
         # Se houver qualquer erro com o DB, usar fallback simples
-        fallback = [{"endereco": "Rua das Flores, 123"}]
-        return jsonify(fallback)
+        return [{"endereco": "Rua das Flores, 123"}]
 
 
 @dashboard_bp.route('/cards', methods=['GET'])
@@ -223,93 +399,80 @@ def get_dashboard_cards():
             - entregadores_em_rota_num: quantidade de encarregados distintos com entregas em aberto
             - status_estoque_percent_num: número (percentual) calculado a partir de Estoque
     """
-    from datetime import date
-
     # Protege endpoint: requer usuário autenticado
     user_id = session.get('user_id')
     user_type = session.get('user_type')
     env = session.get('enviroment')
     if not user_id or not user_type or not env:
         return abort(401)
+    return jsonify(_dados_cards(env, user_id))
 
-    # Valores default em caso de erro
-    pedidos_pendentes = 0
-    vendas_hoje = 0
-    entregadores_rota = 0
-    status_percent = 0
 
-    # Calcula percent do estoque
+def _dados_cards(env, user_id):
+    from datetime import date
+
+    # via cache; uma falha (ex.: banco travado) devolve zeros sem ser guardada
     try:
-        estoque = Estoque.query.filter_by(enviroment=env).first()
-        if estoque:
-            status_percent = estoque.percent()
+        hoje_str = date.today().isoformat()
+        return memoizar(f'cards:{env}:{user_id}:{hoje_str}', lambda: _calcular_cards(env, user_id, hoje_str),
+                        tags=[tag_ambiente(env)])
     except Exception:
-        status_percent = 0
+        db.session.rollback()
+        return {
+            "pedidos_pendentes_num": 0,
+            "vendas_do_dia_num": 0,
+            "entregadores_em_rota_num": 0,
+            "status_estoque_percent_num": 0,
+            "entregas_atual_usuario_num": 0,
+            "entregas_concluidas_usuario_num": 0
+        }
 
-    hoje_str = date.today().isoformat()
 
-    try:
-        # Pedidos pendentes (admin e entregador): entregas ainda não atribuídas (sem encarregado) e não entregues
-        pedidos_pendentes = Entrega.query.filter(
-            Entrega.encarregado == '',
-            Entrega.entregue.is_(False),
-            Entrega.enviroment == env
-        ).count()
+def _calcular_cards(env, user_id, hoje_str):
+    """Duas queries: o percentual do estoque e um agregado sobre as entregas do ambiente."""
+    from sqlalchemy import and_, case, false, func
 
-        # Vendas do dia (admin): quantidade de entregas criadas hoje
-        vendas_hoje = Entrega.query.filter(
-            Entrega.data == hoje_str,
-            Entrega.enviroment == env
-        ).count()
-
-        # Entregadores em rota (admin): quantidade de encarregados distintos com entregas em aberto
-        entregadores_rota = (
-            db.session.query(Entrega.encarregado)
-            .filter(
-                Entrega.encarregado != '',
-                Entrega.entregue.is_(False),
-                Entrega.enviroment == env
-            )
-            .distinct()
-            .count()
-        )
+    status_percent = Estoque.percent_do_ambiente(env)
 
-        # Métricas por usuário logado (dashboard do entregador)
-        user_name = session.get('user_name')
-        if user_name:
-            # Entrega atual: entregas atribuídas ao usuário e não entregues
-            entregas_atual_usuario = Entrega.query.filter(
-                Entrega.encarregado == user_name,
-                Entrega.entregue.is_(False),
-                Entrega.enviroment == env
-            ).count()
-
-            # Entregas concluídas: atribuídas ao usuário e marcadas como entregues
-            entregas_concluidas_usuario = Entrega.query.filter(
-                Entrega.encarregado == user_name,
-                Entrega.entregue.is_(True),
-                Entrega.enviroment == env
-            ).count()
-        else:
-            entregas_atual_usuario = 0
-            entregas_concluidas_usuario = 0
-    except Exception:
-        # Em caso de erro com a tabela de entregas, mantém zeros
-        pedidos_pendentes = pedidos_pendentes or 0
-        vendas_hoje = vendas_hoje or 0
-        entregadores_rota = entregadores_rota or 0
-        entregas_atual_usuario = 0
-        entregas_concluidas_usuario = 0
-
-    data = {
+    aberta = Entrega.entregue.is_(False)
+    # sem usuário as métricas pessoais ficam em zero (e não "encarregado_id IS NULL")
+    do_usuario = (Entrega.encarregado_id == user_id) if user_id else false()
+    # Entregas concluídas já arquivadas (as da tabela quente entram no agregado)
+    arquivadas = (
+        db.select(func.count())
+        .select_from(EntregaArquivo)
+        .where(
+            EntregaArquivo.enviroment == env,
+            (EntregaArquivo.encarregado_id == user_id) if user_id else false(),
+            EntregaArquivo.entregue.is_(True)
+        )
+        .scalar_subquery()
+    )
+    (pedidos_pendentes, vendas_hoje, entregadores_rota,
+     entregas_atual_usuario, concluidas_quentes, concluidas_arquivadas) = db.session.execute(
+        db.select(
+            # Pedidos pendentes (admin e entregador): não atribuídos (sem encarregado) e não entregues
+            func.count(case((and_(Entrega.encarregado_id.is_(None), aberta, Entrega.encarregado == ''), 1))),
+            # Vendas do dia (admin): entregas criadas hoje
+            func.count(case((Entrega.data == hoje_str, 1))),
+            # Entregadores em rota (admin): encarregados distintos com entregas em aberto
+            func.count(func.distinct(case((and_(Entrega.encarregado_id.isnot(None), aberta), Entrega.encarregado_id)))),
+            # Entrega atual (entregador): atribuídas ao usuário e não entregues
+            func.count(case((and_(do_usuario, aberta), 1))),
+            # Entregas concluídas (entregador): atribuídas ao usuário e entregues
+            func.count(case((and_(do_usuario, Entrega.entregue.is_(True)), 1))),
+            arquivadas,
+        ).where(Entrega.enviroment == env)
+    ).one()
+
+    return {
         "pedidos_pendentes_num": int(pedidos_pendentes or 0),
         "vendas_do_dia_num": int(vendas_hoje or 0),
         "entregadores_em_rota_num": int(entregadores_rota or 0),
         "status_estoque_percent_num": int(status_percent or 0),
         "entregas_atual_usuario_num": int(entregas_atual_usuario or 0),
-        "entregas_concluidas_usuario_num": int(entregas_concluidas_usuario or 0)
+        "entregas_concluidas_usuario_num": int((concluidas_quentes or 0) + (concluidas_arquivadas or 0))
     }
-    return jsonify(data)
 
 
 @dashboard_bp.route('/estoque-cards', methods=['GET'])
@@ -324,58 +487,17 @@ def get_estoque_cards():
     env = session.get('enviroment')
     if not session.get('user_id') or not env:
         return abort(401)
+    return jsonify(_dados_estoque_cards(env))
 
-    # Calcula valores reais a partir da tabela Entrega.
-    try:
-        from datetime import date
-        hoje_str = date.today().isoformat()  # yyyy-mm-dd
 
-        # Vendas do dia: todas as entregas criadas hoje (independente de pago/entregue), apenas do mesmo enviroment
-        vendas_hoje = Entrega.query.filter(
-            Entrega.data == hoje_str,
-            Entrega.enviroment == env
-        ).all()
-        vendas_total = 0
-        for e in vendas_hoje:
-            try:
-                vendas_total += int(e.preco or 0)
-            except ValueError:
-                # ignora preços inválidos
-                pass
-
-        # Total recebido: entregas pagas (pago=True)
-        recebidas = Entrega.query.filter(
-            Entrega.pago.is_(True),
-            Entrega.enviroment == env
-        ).all()
-        recebidos_total = 0
-        for e in recebidas:
-            try:
-                recebidos_total += int(e.preco or 0)
-            except ValueError:
-                # Ignora valores não numéricos
-                pass
-
-        # Total pendente: entregas já entregues mas não pagas (entregue=True, pago=False) Versão antiga
-        # Total pendente: pedido realizado, mas ainda não pago (pago=False) Versão atual
-        pendentes = Entrega.query.filter(
-            Entrega.pago.is_(False),
-            Entrega.enviroment == env
-        ).all()
-        pendentes_total = 0
-        for e in pendentes:
-            try:
-                pendentes_total += int(e.preco or 0)
-            except ValueError:
-                pass
+def _dados_estoque_cards(env):
+    from datetime import date
 
-        data = {
-            "vendas_do_dia_num": vendas_total,
-            "pagamentos": {
-                "recebidos_num": recebidos_total,
-                "pendentes_num": pendentes_total
-            }
-        }
+    # Calcula valores reais a partir da tabela Entrega (via cache; falhas não são guardadas).
+    try:
+        hoje_str = date.today().isoformat()  # yyyy-mm-dd
+        data = memoizar(f'estoque_cards:{env}:{hoje_str}', lambda: _calcular_estoque_cards(env, hoje_str),
+                        tags=[tag_ambiente(env)])
     except Exception:
         # Fallback para não quebrar o dashboard se ocorrer erro inesperado
         data = {
@@ -385,7 +507,56 @@ def get_estoque_cards():
                 "pendentes_num": 0
             }
         }
-    return jsonify(data)
+    return data
+
+
+def _calcular_estoque_cards(env, hoje_str):
+    # Vendas do dia: todas as entregas criadas hoje (independente de pago/entregue), apenas do mesmo enviroment
+    vendas_hoje = Entrega.query.filter(
+        Entrega.data == hoje_str,
+        Entrega.enviroment == env
+    ).all()
+    vendas_total = 0
+    for e in vendas_hoje:
+        try:
+            vendas_total += int(e.preco or 0)
+        except ValueError:
+            # ignora preços inválidos
+            pass
+
+    # Total recebido: entregas pagas (pago=True), inclusive as arquivadas
+    recebidas = uniao_com_arquivo(['preco'], lambda m: [
+        m.pago.is_(True),
+        m.enviroment == env
+    ])
+    recebidos_total = 0
+    for (preco,) in db.session.execute(db.select(recebidas.c.preco)):
+        try:
+            recebidos_total += int(preco or 0)
+        except ValueError:
+            # Ignora valores não numéricos
+            pass
+
+    # Total pendente: entregas já entregues mas não pagas (entregue=True, pago=False) Versão antiga
+    # Total pendente: pedido realizado, mas ainda não pago (pago=False) Versão atual
+    pendentes = Entrega.query.filter(
+        Entrega.pago.is_(False),
+        Entrega.enviroment == env
+    ).all()
+    pendentes_total = 0
+    for e in pendentes:
+        try:
+            pendentes_total += int(e.preco or 0)
+        except ValueError:
+            pass
+
+    return {
+        "vendas_do_dia_num": vendas_total,
+        "pagamentos": {
+            "recebidos_num": recebidos_total,
+            "pendentes_num": pendentes_total
+        }
+    }
 
 
 @dashboard_bp.route('/pagamentos-pendentes', methods=['GET'])
@@ -395,17 +566,20 @@ def get_pagamentos_pendentes():
     env = session.get('enviroment')
     if not session.get('user_id') or not env:
         return abort(401)
+    return jsonify(_dados_pagamentos_pendentes(env))
 
+
+def _dados_pagamentos_pendentes(env):
     try:
         pendentes = Entrega.query.filter(
             Entrega.entregue.is_(True),
             Entrega.pago.is_(False),
             Entrega.enviroment == env
         ).all()
-        return jsonify([e.to_dict() for e in pendentes])
+        return [e.to_dict() for e in pendentes]
     except Exception:
         # Fallback com exemplo
-        return jsonify([
+        return [
             {
                 'id': 1001,
                 'endereco': 'Rua Exemplo Pagamento, 50',
@@ -417,4 +591,4 @@ def get_pagamentos_pendentes():
                 'pago': False,
                 'preco': '200'
             }
-        ])
+        ]
@@ -0,0 +1,141 @@
+"""Geradores de exportação CSV/XLSX em memória constante.
+
+Os dois geradores recebem um iterável de linhas (tuplas) — tipicamente um
+resultado de query com `yield_per` — e produzem blocos de bytes à medida que
+as linhas são lidas, sem materializar a planilha inteira. Assim o download
+começa imediatamente e a memória não cresce com o número de pedidos.
+
+O XLSX é montado diretamente com `zipfile` em modo streaming (sem seek,
+usando data descriptors), com células inline, então não depende de
+bibliotecas externas.
+"""
+import csv
+import io
+import zipfile
+from xml.sax.saxutils import escape
+
+# Tamanho aproximado de cada bloco enviado ao cliente
+CHUNK_BYTES = 64 * 1024
+
+
+class _BufferStream:
+    """Arquivo somente-escrita que acumula bytes até o gerador drenar o buffer."""
+
+    def __init__(self):
+        self._buf = bytearray()
+
+    def write(self, data):
+        self._buf += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def __len__(self):
+        return len(self._buf)
+
+    def drenar(self):
+        data = bytes(self._buf)
+        self._buf.clear()
+        return data
+
+
+# Textos começando com estes caracteres viram fórmula no Excel/LibreOffice
+# (injeção de fórmulas via endereço ou destinatário digitado pelo cliente)
+_INICIO_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _celula_csv(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, str) and valor.startswith(_INICIO_FORMULA):
+        # o apóstrofo faz a planilha tratar a célula como texto
+        return "'" + valor
+    return valor
+
+
+def gerar_csv(colunas, linhas):
+    """Gera o CSV (UTF-8 com BOM, para abrir direto no Excel) em blocos de bytes."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    buf.write('\ufeff')
+    writer.writerow(colunas)
+    for linha in linhas:
+        writer.writerow([_celula_csv(v) for v in linha])
+        if buf.tell() >= CHUNK_BYTES:
+            yield buf.getvalue().encode('utf-8')
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode('utf-8')
+
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+
+def _workbook(nome_planilha):
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        f'<sheets><sheet name="{escape(nome_planilha)}" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    )
+
+
+def _celula(valor):
+    if valor is None or valor == '':
+        return '<c/>'
+    if isinstance(valor, bool):
+        return f'<c t="b"><v>{int(valor)}</v></c>'
+    if isinstance(valor, (int, float)):
+        return f'<c><v>{valor}</v></c>'
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(str(valor))}</t></is></c>'
+
+
+def _linha_xml(valores):
+    return '<row>' + ''.join(_celula(v) for v in valores) + '</row>'
+
+
+def gerar_xlsx(colunas, linhas, nome_planilha='Planilha1'):
+    """Gera um arquivo XLSX (uma planilha) em blocos de bytes."""
+    out = _BufferStream()
+    with zipfile.ZipFile(out, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        zf.writestr('_rels/.rels', _RELS)
+        zf.writestr('xl/workbook.xml', _workbook(nome_planilha))
+        zf.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        yield out.drenar()
+
+        with zf.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(_linha_xml(colunas).encode('utf-8'))
+            for linha in linhas:
+                sheet.write(_linha_xml(linha).encode('utf-8'))
+                if len(out) >= CHUNK_BYTES:
+                    yield out.drenar()
+            sheet.write(b'</sheetData></worksheet>')
+    yield out.drenar()
@@ -0,0 +1,152 @@
+"""Group commit opcional para a entrada de pedidos (GROUP_COMMIT_ENABLED).
+
+No modo normal cada POST /api/pedidos faz seu próprio commit (um fsync por
+pedido). Com o group commit ligado, o handler coloca o pedido em uma fila em
+memória e espera; uma thread escritora junta os pedidos que chegarem em até
+GROUP_COMMIT_MAX_WAIT_MS milissegundos (ou GROUP_COMMIT_MAX_ROWS pedidos) e
+grava todos em UMA transação. Cada request só responde depois do commit do
+seu lote, então o 201 continua significando "gravado em disco".
+
+Se o lote falhar, os pedidos são regravados um a um para que um pedido
+inválido não derrube os demais do mesmo lote.
+
+Se o commit não sair em GROUP_COMMIT_TIMEOUT segundos, o request desiste com
+TempoEsgotado: o pedido que ainda estava na fila é cancelado (a escritora
+pula pedidos cancelados) e com certeza não será gravado; se a escritora já o
+tinha pegado, o resultado é desconhecido (ver api_pedidos).
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FuturoTimeout
+
+from app import db
+from app.sharding import usar_shard
+
+
+class TempoEsgotado(Exception):
+    """O commit do lote não saiu a tempo.
+
+    `indeterminado` é False quando o pedido foi retirado da fila (não será
+    gravado) e True quando a escritora já o estava gravando.
+    """
+
+    def __init__(self, mensagem, indeterminado):
+        super().__init__(mensagem)
+        self.indeterminado = indeterminado
+
+
+class GroupCommitWriter:
+    """Fila de pedidos + thread escritora que grava em lotes."""
+
+    def __init__(self, app):
+        self.app = app
+        self.max_rows = app.config.get('GROUP_COMMIT_MAX_ROWS', 50)
+        self.max_wait = app.config.get('GROUP_COMMIT_MAX_WAIT_MS', 5) / 1000.0
+        self.timeout = app.config.get('GROUP_COMMIT_TIMEOUT', 10)
+        self._fila = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        # contadores simples para diagnóstico/benchmark
+        self.lotes = 0
+        self.linhas = 0
+
+    def _garantir_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name='group-commit', daemon=True)
+                self._thread.start()
+
+    def gravar(self, env, campos):
+        """Enfileira uma Entrega (campos do modelo) e bloqueia até o commit do lote.
+
+        Retorna o to_dict() da entrega gravada ou relança o erro da gravação;
+        levanta TempoEsgotado se o commit não sair em GROUP_COMMIT_TIMEOUT.
+        """
+        self._garantir_thread()
+        futuro = Future()
+        self._fila.put((env, campos, futuro))
+        try:
+            return futuro.result(timeout=self.timeout)
+        except FuturoTimeout:
+            if futuro.cancel():
+                raise TempoEsgotado('Pedido não gravado: a fila de gravação não andou a tempo', indeterminado=False)
+            if futuro.done():
+                return futuro.result()
+            raise TempoEsgotado('Pedido em gravação além do tempo limite', indeterminado=True)
+
+    def _coletar_lote(self):
+        lote = [self._fila.get()]
+        limite = time.monotonic() + self.max_wait
+        while len(lote) < self.max_rows:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                lote.append(self._fila.get(timeout=restante))
+            except queue.Empty:
+                break
+        return lote
+
+    def _loop(self):
+        while True:
+            # pedidos cancelados por timeout saem do lote; os demais passam a
+            # "em execução" e não podem mais ser cancelados
+            lote = [item for item in self._coletar_lote() if item[2].set_running_or_notify_cancel()]
+            if not lote:
+                continue
+            # Com sharding, cada ambiente grava no seu próprio banco
+            por_ambiente = {}
+            for item in lote:
+                por_ambiente.setdefault(item[0], []).append(item)
+            for env, itens in por_ambiente.items():
+                with self.app.app_context():
+                    try:
+                        with usar_shard(env):
+                            self._gravar_lote(itens)
+                    except Exception as e:  # pragma: no cover - proteção da thread
+                        for _, _, futuro in itens:
+                            if not futuro.done():
+                                futuro.set_exception(e)
+                    finally:
+                        db.session.remove()
+
+    def _gravar_lote(self, itens):
+        from app.models.entregas import Entrega
+
+        entregas = [Entrega(**campos) for _, campos, _ in itens]
+        try:
+            db.session.add_all(entregas)
+            db.session.flush()
+            # Serializa antes do commit (ids já atribuídos) para não recarregar cada linha depois
+            resultados = [e.to_dict() for e in entregas]
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            # Isola o(s) pedido(s) com problema gravando individualmente
+            for _, campos, futuro in itens:
+                try:
+                    entrega = Entrega(**campos)
+                    db.session.add(entrega)
+                    db.session.flush()
+                    resultado = entrega.to_dict()
+                    db.session.commit()
+                    futuro.set_result(resultado)
+                except Exception as e:
+                    db.session.rollback()
+                    futuro.set_exception(e)
+            self.lotes += 1
+            self.linhas += len(itens)
+            return
+
+        self.lotes += 1
+        self.linhas += len(itens)
+        for resultado, (_, _, futuro) in zip(resultados, itens):
+            futuro.set_result(resultado)
+
+
+def init_app(app):
+    if app.config.get('GROUP_COMMIT_ENABLED'):
+        app.extensions['group_commit'] = GroupCommitWriter(app)
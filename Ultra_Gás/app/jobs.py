@@ -0,0 +1,405 @@
+"""Execução de tarefas em segundo plano (fila durável em SQLite + pool de threads).
+
+Uso típico dentro de um handler:
+
+    from app.jobs import enfileirar
+    entrega.pago = True
+    enfileirar('financeiro.recalcular', {'env': env}, enviroment=env)
+    db.session.commit()   # a tarefa é gravada na MESMA transação do handler
+
+A tarefa só fica visível para o worker depois do commit (se o handler fizer
+rollback ela é descartada junto) e o worker é acordado logo após o commit,
+então o handler responde imediatamente.
+
+Tarefas são funções registradas com @tarefa('nome') que recebem o payload
+como argumentos nomeados. Tarefas periódicas são registradas com
+agendar('nome', a_cada=segundos).
+
+Enquanto uma tarefa roda, o runner que a executa renova `atualizado_em` a
+cada JOBS_HEARTBEAT segundos; só tarefas 'executando' sem esse sinal de vida
+há JOBS_TRAVADO_APOS segundos (processo morto no meio) voltam para a fila.
+"""
+import json
+import logging
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import event, literal, select
+
+from app import db
+from app.sharding import usar_shard
+
+log = logging.getLogger(__name__)
+
+# nome -> função da tarefa
+_TAREFAS = {}
+# nome -> intervalo em segundos das tarefas periódicas
+_PERIODICAS = {}
+
+
+def tarefa(nome):
+    """Decorator que registra uma função como tarefa executável pelo worker."""
+    def decorator(func):
+        _TAREFAS[nome] = func
+        return func
+    return decorator
+
+
+def agendar(nome, a_cada):
+    """Registra a tarefa `nome` para ser enfileirada automaticamente a cada `a_cada` segundos."""
+    _PERIODICAS[nome] = int(a_cada)
+
+
+def enfileirar(nome, payload=None, atraso=0, max_tentativas=None, enviroment=None):
+    """Adiciona uma tarefa à fila na sessão atual (sem commit).
+
+    O commit do próprio handler torna a tarefa durável; logo em seguida o
+    worker em processo é acordado. `atraso` (segundos) agenda a execução.
+    """
+    from app.models.jobs import Job
+
+    if nome not in _TAREFAS:
+        raise ValueError(f'Tarefa não registrada: {nome}')
+    if max_tentativas is None:
+        max_tentativas = current_app.config.get('JOBS_MAX_TENTATIVAS', 3)
+    job = Job(
+        nome=nome,
+        payload=json.dumps(payload or {}),
+        max_tentativas=max_tentativas,
+        executar_em=datetime.utcnow() + timedelta(seconds=atraso),
+        enviroment=enviroment,
+    )
+    db.session.add(job)
+    db.session.info['jobs_enfileirados'] = True
+    return job
+
+
+class JobRunner:
+    """Worker em processo: uma thread de polling + pool de threads executoras."""
+
+    def __init__(self, app):
+        self.app = app
+        self.workers = app.config.get('JOBS_WORKERS', 2)
+        self.intervalo = app.config.get('JOBS_POLL_INTERVAL', 2.0)
+        self.backoff = app.config.get('JOBS_RETRY_BACKOFF', 5)
+        self.heartbeat = app.config.get('JOBS_HEARTBEAT', 60)
+        self.travado_apos = app.config.get('JOBS_TRAVADO_APOS', 10 * 60)
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._thread = None
+        self._pool = None
+        self._proximas = {}
+        self._lock = threading.Lock()
+        # ids das tarefas em execução neste processo (recebem o heartbeat)
+        self._em_execucao = set()
+        self._proximo_heartbeat = None
+
+    @property
+    def ativo(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def iniciar(self):
+        """Inicia a thread de polling (idempotente)."""
+        with self._lock:
+            if self.ativo:
+                return
+            self._parar.clear()
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='jobs')
+            self._thread = threading.Thread(target=self._loop, name='jobs-poller', daemon=True)
+            self._thread.start()
+
+    def parar(self, aguardar=True):
+        self._parar.set()
+        self._acordar.set()
+        if self._thread is not None and aguardar:
+            self._thread.join()
+        if self._pool is not None:
+            self._pool.shutdown(wait=aguardar)
+        self._thread = None
+
+    def acordar(self):
+        self._acordar.set()
+
+    def _loop(self):
+        while not self._parar.is_set():
+            try:
+                with self.app.app_context():
+                    self._sinal_de_vida()
+                    self._enfileirar_periodicas()
+                    ids = reservar_prontos(limite=self.workers)
+                    db.session.remove()
+                # entram no heartbeat já ao serem reservadas (podem esperar na fila do pool)
+                with self._lock:
+                    self._em_execucao.update(ids)
+                for job_id in ids:
+                    self._pool.submit(self._executar, job_id)
+            except Exception:
+                log.exception('Falha no loop de tarefas')
+                ids = []
+            # Se reservou um lote cheio, provavelmente há mais tarefas: não espera
+            if len(ids) < self.workers:
+                self._acordar.wait(self.intervalo)
+                self._acordar.clear()
+
+    def _executar(self, job_id):
+        with self.app.app_context():
+            try:
+                executar(job_id, backoff=self.backoff)
+            finally:
+                db.session.remove()
+                with self._lock:
+                    self._em_execucao.discard(job_id)
+
+    def _sinal_de_vida(self):
+        """A cada JOBS_HEARTBEAT: renova as tarefas em execução aqui e recupera as travadas."""
+        from app.models.jobs import Job
+
+        agora = datetime.utcnow()
+        if self._proximo_heartbeat is not None and agora < self._proximo_heartbeat:
+            return
+        self._proximo_heartbeat = agora + timedelta(seconds=self.heartbeat)
+        with self._lock:
+            ids = list(self._em_execucao)
+        if ids:
+            Job.query.filter(Job.id.in_(ids), Job.status == 'executando') \
+                .update({Job.atualizado_em: agora}, synchronize_session=False)
+            db.session.commit()
+        try:
+            recuperar_travados(segundos=self.travado_apos)
+        except Exception:
+            log.exception('Falha ao recuperar tarefas travadas')
+
+    def _enfileirar_periodicas(self):
+        from app.models.jobs import Job
+
+        agora = datetime.utcnow()
+        max_tentativas = current_app.config.get('JOBS_MAX_TENTATIVAS', 3)
+        for nome, intervalo in _PERIODICAS.items():
+            proxima = self._proximas.get(nome)
+            if proxima is not None and agora < proxima:
+                continue
+            self._proximas[nome] = agora + timedelta(seconds=intervalo)
+            # INSERT ... SELECT ... WHERE NOT EXISTS: a verificação e a inserção são
+            # uma só instrução, então workers subindo juntos não duplicam a tarefa
+            ativa = select(Job.id).where(Job.nome == nome, Job.status.in_(('pendente', 'executando'))).exists()
+            linha = select(
+                literal(nome), literal('{}'), literal('pendente'), literal(0), literal(max_tentativas),
+                literal(agora), literal(agora), literal(agora),
+            ).where(~ativa)
+            db.session.execute(db.insert(Job).from_select(
+                ['nome', 'payload', 'status', 'tentativas', 'max_tentativas', 'executar_em', 'criado_em', 'atualizado_em'],
+                linha,
+            ))
+            db.session.commit()
+
+
+def reservar_prontos(limite=10):
+    """Reserva até `limite` tarefas prontas (pendente -> executando) e retorna seus ids.
+
+    A troca de status usa UPDATE condicional por id, então dois workers
+    (threads ou processos) nunca executam a mesma tarefa.
+    """
+    from app.models.jobs import Job
+
+    agora = datetime.utcnow()
+    candidatos = [
+        r[0] for r in db.session.query(Job.id)
+        .filter(Job.status == 'pendente', Job.executar_em <= agora)
+        .order_by(Job.executar_em, Job.id)
+        .limit(limite)
+        .all()
+    ]
+    reservados = []
+    for job_id in candidatos:
+        n = Job.query.filter(Job.id == job_id, Job.status == 'pendente') \
+            .update({Job.status: 'executando', Job.atualizado_em: agora}, synchronize_session=False)
+        if n:
+            reservados.append(job_id)
+    db.session.commit()
+    return reservados
+
+
+def executar(job_id, backoff=5):
+    """Executa uma tarefa já reservada, aplicando retry com backoff exponencial em caso de erro."""
+    from app.models.jobs import Job
+
+    job = db.session.get(Job, job_id)
+    if job is None:
+        return
+    func = _TAREFAS.get(job.nome)
+    # Tarefas enfileiradas com enviroment rodam roteadas para o shard do ambiente
+    contexto = usar_shard(job.enviroment) if job.enviroment else nullcontext()
+    try:
+        if func is None:
+            raise LookupError(f'Tarefa não registrada: {job.nome}')
+        with contexto:
+            func(**json.loads(job.payload or '{}'))
+            db.session.commit()
+        job = db.session.get(Job, job_id)
+        job.status = 'concluido'
+        job.erro = None
+        job.tentativas += 1
+        db.session.commit()
+    except Exception as e:
+        log.exception('Tarefa %s falhou', job_id)
+        try:
+            db.session.rollback()
+        except Exception:
+            pass
+        job = db.session.get(Job, job_id)
+        job.tentativas += 1
+        job.erro = repr(e)
+        if job.tentativas < job.max_tentativas and func is not None:
+            job.status = 'pendente'
+            job.executar_em = datetime.utcnow() + timedelta(seconds=backoff * (2 ** (job.tentativas - 1)))
+        else:
+            job.status = 'falhou'
+        db.session.commit()
+
+
+def recuperar_travados(segundos=10 * 60):
+    """Devolve para a fila tarefas 'executando' sem sinal de vida há `segundos` (processo morto no meio).
+
+    Tarefas em execução têm `atualizado_em` renovado pelo heartbeat do runner,
+    então uma tarefa longa de um worker vivo nunca é reexecutada.
+    """
+    from app.models.jobs import Job
+
+    limite = datetime.utcnow() - timedelta(seconds=segundos)
+    n = Job.query.filter(Job.status == 'executando', Job.atualizado_em < limite) \
+        .update({Job.status: 'pendente'}, synchronize_session=False)
+    db.session.commit()
+    return n
+
+
+@tarefa('jobs.limpar')
+def limpar_concluidos(dias=7):
+    """Remove tarefas concluídas há mais de `dias` dias."""
+    from app.models.jobs import Job
+
+    limite = datetime.utcnow() - timedelta(days=dias)
+    Job.query.filter(Job.status == 'concluido', Job.atualizado_em < limite).delete(synchronize_session=False)
+
+
+agendar('jobs.limpar', a_cada=24 * 60 * 60)
+
+
+def _acordar_apos_commit(session):
+    if not session.info.pop('jobs_enfileirados', False):
+        return
+    try:
+        runner = current_app.extensions.get('jobs')
+    except RuntimeError:
+        return
+    if runner is not None and runner.ativo:
+        runner.acordar()
+
+
+def init_app(app):
+    """Registra o runner em app.extensions['jobs'] e o comando `flask jobs`.
+
+    Com JOBS_IN_PROCESS=True o worker é iniciado no primeiro request do processo,
+    assim scripts (createdb.py, init_db.py) e comandos CLI não sobem threads.
+    """
+    from app.models import jobs as _modelos  # noqa: F401  (registra a tabela jobs)
+
+    runner = JobRunner(app)
+    app.extensions['jobs'] = runner
+    app.cli.add_command(jobs_cli)
+
+    if not event.contains(db.session, 'after_commit', _acordar_apos_commit):
+        event.listen(db.session, 'after_commit', _acordar_apos_commit)
+
+    if app.config.get('JOBS_IN_PROCESS'):
+        @app.before_request
+        def _iniciar_jobs():
+            if not runner.ativo:
+                runner.iniciar()
+
+
+jobs_cli = AppGroup('jobs', help='Inspeciona e executa a fila de tarefas em segundo plano.')
+
+
+@jobs_cli.command('list')
+@click.option('--status', default=None, help="Filtra por status (pendente, executando, concluido, falhou).")
+@click.option('--limite', default=50, show_default=True)
+def jobs_list(status, limite):
+    """Lista as tarefas mais recentes."""
+    from app.models.jobs import Job
+
+    q = Job.query
+    if status:
+        q = q.filter(Job.status == status)
+    for job in q.order_by(Job.id.desc()).limit(limite).all():
+        click.echo(f'{job.id:>6}  {job.status:<10} {job.nome:<30} tentativas={job.tentativas}/{job.max_tentativas}  executar_em={job.executar_em:%Y-%m-%d %H:%M:%S}')
+
+
+@jobs_cli.command('stats')
+def jobs_stats():
+    """Mostra a quantidade de tarefas por status."""
+    from sqlalchemy import func
+    from app.models.jobs import Job
+
+    for status, qtd in db.session.query(Job.status, func.count(Job.id)).group_by(Job.status).all():
+        click.echo(f'{status:<10} {qtd}')
+
+
+@jobs_cli.command('show')
+@click.argument('job_id', type=int)
+def jobs_show(job_id):
+    """Mostra os detalhes de uma tarefa."""
+    from app.models.jobs import Job
+
+    job = db.session.get(Job, job_id)
+    if job is None:
+        raise click.ClickException('Tarefa não encontrada')
+    click.echo(json.dumps(job.to_dict(), indent=2, ensure_ascii=False))
+
+
+@jobs_cli.command('retry')
+@click.argument('job_id', type=int)
+def jobs_retry(job_id):
+    """Recoloca uma tarefa que falhou na fila, zerando as tentativas."""
+    from app.models.jobs import Job
+
+    job = db.session.get(Job, job_id)
+    if job is None:
+        raise click.ClickException('Tarefa não encontrada')
+    job.status = 'pendente'
+    job.tentativas = 0
+    job.executar_em = datetime.utcnow()
+    db.session.commit()
+    click.echo(f'Tarefa {job_id} reenfileirada')
+
+
+@jobs_cli.command('enqueue')
+@click.argument('nome')
+@click.option('--payload', default='{}', help='Argumentos da tarefa em JSON.')
+def jobs_enqueue(nome, payload):
+    """Enfileira manualmente uma tarefa registrada."""
+    try:
+        job = enfileirar(nome, json.loads(payload))
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    db.session.commit()
+    click.echo(f'Tarefa {job.id} enfileirada')
+
+
+@jobs_cli.command('work')
+def jobs_work():
+    """Roda o worker em primeiro plano (Ctrl+C para sair)."""
+    runner = current_app.extensions['jobs']
+    runner.iniciar()
+    click.echo(f'Worker de tarefas rodando com {runner.workers} thread(s). Ctrl+C para sair.')
+    try:
+        while runner.ativo:
+            runner._thread.join(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        runner.parar()
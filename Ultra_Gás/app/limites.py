@@ -0,0 +1,144 @@
+"""Limite de requisições por (ambiente, usuário, grupo de rotas) com token bucket.
+
+Cada combinação (enviroment, user_id, grupo) tem um balde com `capacidade`
+fichas que se reabastece a `por_segundo` fichas por segundo; cada request
+gasta uma ficha. Balde vazio -> 429 com Retry-After, sem tocar no banco.
+Assim um tablet preso em um loop de refresh esgota só o próprio balde e
+não ocupa os workers que atendem os outros ambientes.
+
+Configuração (Config):
+  - RATE_LIMIT_ENABLED: liga/desliga;
+  - RATE_LIMITS: {grupo: (capacidade, por_segundo)};
+  - RATE_LIMIT_ROTAS: [(metodo ou None, prefixo do caminho, grupo)], a
+    primeira regra que casar define o grupo. Rotas sem regra (login,
+    arquivos estáticos) e requests sem sessão não são limitados.
+
+Os baldes ficam em memória, por processo: com N workers o limite efetivo de
+um usuário é até N vezes o configurado. Os contadores (permitidos e
+bloqueados por ambiente e grupo) podem ser lidos em GET /api/limites.
+"""
+import math
+import threading
+import time
+from collections import defaultdict
+
+from flask import jsonify, request, session
+
+
+class TokenBucket:
+    """Balde de fichas simples (não é thread-safe; o Limitador serializa o acesso)."""
+
+    __slots__ = ('capacidade', 'por_segundo', 'fichas', 'atualizado')
+
+    def __init__(self, capacidade, por_segundo, agora):
+        self.capacidade = capacidade
+        self.por_segundo = por_segundo
+        self.fichas = float(capacidade)
+        self.atualizado = agora
+
+    def _reabastecer(self, agora):
+        if agora > self.atualizado:
+            self.fichas = min(self.capacidade, self.fichas + (agora - self.atualizado) * self.por_segundo)
+            self.atualizado = agora
+
+    def consumir(self, agora, custo=1):
+        """Tenta gastar `custo` fichas. Retorna (permitido, segundos_ate_ter_fichas)."""
+        self._reabastecer(agora)
+        if self.fichas >= custo:
+            self.fichas -= custo
+            return True, 0.0
+        if self.por_segundo <= 0:
+            return False, math.inf
+        return False, (custo - self.fichas) / self.por_segundo
+
+    def cheio(self, agora):
+        self._reabastecer(agora)
+        return self.fichas >= self.capacidade
+
+
+class Limitador:
+    """Guarda os baldes e os contadores de um processo."""
+
+    # a cada N consultas remove os baldes já cheios (equivalentes a não existir)
+    LIMPEZA_A_CADA = 10000
+
+    def __init__(self, limites, rotas, relogio=time.monotonic):
+        self.limites = dict(limites)
+        self.rotas = list(rotas)
+        self.relogio = relogio
+        self._baldes = {}
+        self._lock = threading.Lock()
+        self._consultas = 0
+        # (enviroment, grupo) -> {'permitidos': n, 'bloqueados': n}
+        self._contadores = defaultdict(lambda: {'permitidos': 0, 'bloqueados': 0})
+
+    def grupo_de(self, metodo, caminho):
+        for metodo_regra, prefixo, grupo in self.rotas:
+            if (metodo_regra is None or metodo_regra == metodo) and caminho.startswith(prefixo):
+                return grupo
+        return None
+
+    def verificar(self, env, user_id, grupo):
+        """Consome uma ficha do balde. Retorna (permitido, retry_after_segundos)."""
+        limite = self.limites.get(grupo)
+        if limite is None:
+            return True, 0.0
+        agora = self.relogio()
+        chave = (env, user_id, grupo)
+        with self._lock:
+            balde = self._baldes.get(chave)
+            if balde is None:
+                balde = self._baldes[chave] = TokenBucket(limite[0], limite[1], agora)
+            permitido, espera = balde.consumir(agora)
+            self._contadores[(env, grupo)]['permitidos' if permitido else 'bloqueados'] += 1
+            self._consultas += 1
+            if self._consultas >= self.LIMPEZA_A_CADA:
+                self._consultas = 0
+                self._limpar(agora)
+        return permitido, espera
+
+    def _limpar(self, agora):
+        for chave in [c for c, b in self._baldes.items() if b.cheio(agora)]:
+            del self._baldes[chave]
+
+    def contadores(self, env=None):
+        """{grupo: {'permitidos', 'bloqueados'}} do ambiente (ou {env: {grupo: ...}} se env=None)."""
+        with self._lock:
+            itens = [(e, g, dict(c)) for (e, g), c in self._contadores.items()]
+        if env is not None:
+            return {g: c for e, g, c in itens if e == env}
+        resultado = defaultdict(dict)
+        for e, g, c in itens:
+            resultado[e][g] = c
+        return dict(resultado)
+
+
+def init_app(app):
+    if not app.config.get('RATE_LIMIT_ENABLED', True):
+        return
+    limitador = Limitador(app.config.get('RATE_LIMITS', {}), app.config.get('RATE_LIMIT_ROTAS', []))
+    app.extensions['limites'] = limitador
+
+    @app.before_request
+    def _aplicar_limite():
+        # o grupo vem antes da sessão: ler a sessão marca a resposta com
+        # Vary: Cookie, o que tiraria /static do cache compartilhado
+        grupo = limitador.grupo_de(request.method, request.path)
+        if grupo is None:
+            return None
+        user_id = session.get('user_id')
+        env = session.get('enviroment')
+        if not user_id or not env:
+            return None
+        permitido, espera = limitador.verificar(env, user_id, grupo)
+        if permitido:
+            return None
+        retry_after = max(1, math.ceil(espera)) if math.isfinite(espera) else 60
+        resp = jsonify({
+            'error': 'Muitas requisições; tente novamente em instantes',
+            'grupo': grupo,
+            'retry_after': retry_after,
+        })
+        resp.status_code = 429
+        resp.headers['Retry-After'] = str(retry_after)
+        return resp
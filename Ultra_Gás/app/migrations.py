@@ -0,0 +1,311 @@
+"""Versionamento de schema com migrações ordenadas.
+
+Cada banco (o principal e, com sharding, o de cada ambiente) guarda na
+tabela `schema_version` as migrações já aplicadas. `flask db upgrade`
+aplica, em ordem e uma única vez, as que faltarem; o create_app não faz
+nenhum DDL nem seed, então subir um worker não toca no schema.
+
+Para criar uma migração nova, acrescente uma função com @migracao usando
+o próximo número. Ela recebe a conexão (já em transação) e `principal`
+(True no banco principal, False nos shards de ambiente). Como a versão 1
+cria as tabelas a partir dos modelos atuais, migrações que alteram tabelas
+existentes devem ser idempotentes (ex.: usar `_adicionar_coluna`).
+"""
+from datetime import datetime
+
+import click
+import sqlalchemy as sa
+from flask import current_app
+from flask.cli import AppGroup
+
+from app import db
+
+# (versao, descricao, funcao)
+MIGRACOES = []
+
+_schema_version = sa.Table(
+    'schema_version', sa.MetaData(),
+    sa.Column('versao', sa.Integer, primary_key=True),
+    sa.Column('descricao', sa.String(255), nullable=False),
+    sa.Column('aplicada_em', sa.DateTime, nullable=False),
+)
+
+
+def migracao(versao, descricao):
+    """Registra uma função de migração com o número de versão informado."""
+    def decorator(func):
+        MIGRACOES.append((versao, descricao, func))
+        MIGRACOES.sort(key=lambda m: m[0])
+        return func
+    return decorator
+
+
+def _tabelas(principal):
+    """Tabelas dos modelos que pertencem a este banco (shards não guardam as globais)."""
+    return [t for t in db.metadata.sorted_tables if principal or not t.info.get('global')]
+
+
+def _colunas(conn, tabela):
+    return {c['name'] for c in sa.inspect(conn).get_columns(tabela)}
+
+
+def _adicionar_coluna(conn, tabela, definicao):
+    """ALTER TABLE ... ADD COLUMN apenas se a coluna ainda não existir."""
+    nome = definicao.split()[0]
+    if tabela in sa.inspect(conn).get_table_names() and nome not in _colunas(conn, tabela):
+        conn.execute(sa.text(f'ALTER TABLE {tabela} ADD COLUMN {definicao}'))
+
+
+def _criar_indice(conn, nome, tabela, colunas, unico=False):
+    """CREATE INDEX IF NOT EXISTS (a tabela precisa existir)."""
+    if tabela in sa.inspect(conn).get_table_names():
+        conn.execute(sa.text(
+            f'CREATE {"UNIQUE " if unico else ""}INDEX IF NOT EXISTS {nome} ON {tabela} ({", ".join(colunas)})'
+        ))
+
+
+def versao_atual(conn):
+    if not sa.inspect(conn).has_table('schema_version'):
+        return 0
+    return conn.execute(sa.select(sa.func.max(_schema_version.c.versao))).scalar() or 0
+
+
+def upgrade(engine, principal=True):
+    """Aplica no banco do `engine` as migrações pendentes. Retorna as versões aplicadas."""
+    aplicadas = []
+    with engine.begin() as conn:
+        _schema_version.create(conn, checkfirst=True)
+        atual = versao_atual(conn)
+    for versao, descricao, func in MIGRACOES:
+        if versao <= atual:
+            continue
+        # Uma transação por migração: se falhar, as anteriores ficam registradas
+        with engine.begin() as conn:
+            func(conn, principal)
+            conn.execute(_schema_version.insert().values(
+                versao=versao, descricao=descricao, aplicada_em=datetime.utcnow()
+            ))
+        aplicadas.append(versao)
+    return aplicadas
+
+
+def upgrade_todos(shards=None):
+    """Atualiza o banco principal e, com sharding, o de cada ambiente.
+
+    Retorna [(nome_do_banco, versoes_aplicadas), ...]. Requer app context.
+    """
+    from app.sharding import ambientes_conhecidos
+
+    resultado = [('principal', upgrade(db.engine, principal=True))]
+    router = current_app.extensions.get('shards')
+    if router is not None and router.habilitado:
+        for env in (shards or ambientes_conhecidos()):
+            resultado.append((env, upgrade(router.engine_para(env), principal=False)))
+    return resultado
+
+
+# ---------------------------------------------------------------------------
+# Migrações
+# ---------------------------------------------------------------------------
+
+@migracao(1, 'schema inicial (tabelas dos modelos)')
+def _m001_schema_inicial(conn, principal):
+    db.metadata.create_all(conn, tables=_tabelas(principal))
+
+
+@migracao(2, 'catálogo de produtos padrão')
+def _m002_produtos_padrao(conn, principal):
+    from app.models.estoque import PRODUTOS_PADRAO, Produto
+
+    existentes = {r[0] for r in conn.execute(sa.select(Produto.codigo))}
+    novos = [
+        {'codigo': codigo, 'descricao': descricao, 'ordem': ordem}
+        for ordem, (codigo, descricao) in enumerate(PRODUTOS_PADRAO)
+        if codigo not in existentes
+    ]
+    if novos:
+        conn.execute(sa.insert(Produto.__table__), novos)
+
+
+@migracao(3, 'estoque largo (p45..agua) -> depositos + estoque_itens')
+def _m003_estoque_legado(conn, principal):
+    """Migra a antiga tabela `estoque` e a renomeia para `estoque_legado`."""
+    from app.models.estoque import DEFAULT_CAPACITY, Deposito, EstoqueItem, Produto
+
+    if not principal or not sa.inspect(conn).has_table('estoque'):
+        return
+    produtos = {codigo: pid for pid, codigo in conn.execute(sa.select(Produto.id, Produto.codigo))}
+    codigos = [c for c in produtos if c in _colunas(conn, 'estoque')]
+
+    linhas = conn.execute(sa.text(f"SELECT enviroment, {', '.join(codigos)} FROM estoque")).mappings().all()
+    depositos = Deposito.__table__
+    itens = EstoqueItem.__table__
+    for linha in linhas:
+        env = linha['enviroment']
+        if not env:
+            continue
+        deposito_id = conn.execute(
+            sa.select(depositos.c.id).where(depositos.c.enviroment == env).order_by(depositos.c.id).limit(1)
+        ).scalar()
+        if deposito_id is None:
+            deposito_id = conn.execute(depositos.insert().values(
+                nome='Principal', capacidade=DEFAULT_CAPACITY, enviroment=env
+            )).inserted_primary_key[0]
+        existentes = {r[0] for r in conn.execute(sa.select(itens.c.produto_id).where(itens.c.deposito_id == deposito_id))}
+        novos = [
+            {'deposito_id': deposito_id, 'produto_id': produtos[c], 'quantidade': int(linha[c] or 0)}
+            for c in codigos if produtos[c] not in existentes
+        ]
+        if novos:
+            conn.execute(itens.insert(), novos)
+    conn.execute(sa.text('ALTER TABLE estoque RENAME TO estoque_legado'))
+
+
+@migracao(4, 'entregas.encarregado_id (FK users) preenchido a partir do nome')
+def _m004_encarregado_id(conn, principal):
+    """Liga as entregas ao usuário pelo id; o nome continua em `encarregado` para exibição.
+
+    Só preenche quando o nome identifica um único usuário do ambiente; nomes
+    ambíguos ou sem usuário (ex.: equipes) ficam com encarregado_id NULL.
+    """
+    from app.models.users import User
+
+    for tabela in ('entregas', 'entregas_arquivo'):
+        _adicionar_coluna(conn, tabela, 'encarregado_id INTEGER REFERENCES users(id)')
+        _criar_indice(conn, f'ix_{tabela}_env_encarregado_entregue', tabela,
+                      ['enviroment', 'encarregado_id', 'entregue'])
+
+    # users fica no banco principal; os shards leem de lá
+    consulta = sa.select(User.id, User.name, User.enviroment)
+    if principal:
+        usuarios = conn.execute(consulta).all()
+    else:
+        with db.engine.connect() as principal_conn:
+            usuarios = principal_conn.execute(consulta).all()
+
+    por_nome = {}
+    for user_id, nome, env in usuarios:
+        por_nome.setdefault((env, nome), []).append(user_id)
+    pares = [
+        {'u_id': ids[0], 'u_env': env, 'u_nome': nome}
+        for (env, nome), ids in por_nome.items() if len(ids) == 1
+    ]
+    if not pares:
+        return
+    for tabela in ('entregas', 'entregas_arquivo'):
+        if not sa.inspect(conn).has_table(tabela):
+            continue
+        conn.execute(sa.text(
+            f'UPDATE {tabela} SET encarregado_id = :u_id '
+            'WHERE enviroment = :u_env AND encarregado = :u_nome AND encarregado_id IS NULL'
+        ), pares)
+
+
+@migracao(5, 'coluna versao (concorrência otimista) em entregas e estoque_itens')
+def _m005_versao(conn, principal):
+    for tabela in ('entregas', 'estoque_itens'):
+        _adicionar_coluna(conn, tabela, 'versao INTEGER NOT NULL DEFAULT 1')
+
+
+@migracao(6, 'índice de contas a receber em entregas (enviroment, pago, metodo_pagamento, data)')
+def _m006_indice_receber(conn, principal):
+    _criar_indice(conn, 'ix_entregas_env_pago_metodo_data', 'entregas',
+                  ['enviroment', 'pago', 'metodo_pagamento', 'data'])
+
+
+@migracao(7, 'tabela audit_log (auditoria das escritas da API)')
+def _m007_audit_log(conn, principal):
+    from app.models.auditoria import AuditLog
+
+    if principal:
+        AuditLog.__table__.create(conn, checkfirst=True)
+
+
+@migracao(8, 'índice único em cores (enviroment, tema, nome_variavel)')
+def _m008_cores_unicas(conn, principal):
+    """Remove variáveis repetidas de um mesmo tema (fica a mais recente) e cria o índice único."""
+    if not sa.inspect(conn).has_table('cores'):
+        return
+    conn.execute(sa.text(
+        'DELETE FROM cores WHERE id NOT IN '
+        '(SELECT MAX(id) FROM cores GROUP BY enviroment, tema, nome_variavel)'
+    ))
+    _criar_indice(conn, 'ix_cores_env_tema_variavel', 'cores', ['enviroment', 'tema', 'nome_variavel'], unico=True)
+
+
+@migracao(9, 'entregas com AUTOINCREMENT (ids arquivados não são reaproveitados)')
+def _m009_entregas_autoincrement(conn, principal):
+    """No SQLite, recria entregas com AUTOINCREMENT e inicia a sequência pelo maior id das duas tabelas.
+
+    Sem AUTOINCREMENT o SQLite dá ao INSERT o max(id)+1 da própria tabela:
+    depois que as entregas de maior id são arquivadas, esses ids voltam a ser
+    usados e o arquivamento seguinte falha com UNIQUE em entregas_arquivo.id.
+    Entregas que já receberam um id repetido ganham um id novo. Nos outros
+    bancos (sequência/AUTO_INCREMENT) os ids nunca são reaproveitados.
+    """
+    from app.models.entregas import Entrega
+
+    tabelas = sa.inspect(conn).get_table_names()
+    if conn.dialect.name != 'sqlite' or 'entregas' not in tabelas:
+        return
+    ddl = conn.execute(sa.text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'entregas'")).scalar()
+    if 'AUTOINCREMENT' not in ddl.upper():
+        colunas = ', '.join(c for c in Entrega.__table__.c.keys() if c in _colunas(conn, 'entregas'))
+        # os índices acompanham a tabela renomeada e os nomes conflitariam com os da nova
+        for indice in sa.inspect(conn).get_indexes('entregas'):
+            conn.execute(sa.text(f'DROP INDEX IF EXISTS {indice["name"]}'))
+        conn.execute(sa.text('ALTER TABLE entregas RENAME TO entregas_sem_autoincrement'))
+        Entrega.__table__.create(conn)
+        conn.execute(sa.text(f'INSERT INTO entregas ({colunas}) SELECT {colunas} FROM entregas_sem_autoincrement'))
+        conn.execute(sa.text('DROP TABLE entregas_sem_autoincrement'))
+
+    maior = conn.execute(sa.text('SELECT MAX(id) FROM entregas')).scalar() or 0
+    repetidos = []
+    if 'entregas_arquivo' in tabelas:
+        maior = max(maior, conn.execute(sa.text('SELECT MAX(id) FROM entregas_arquivo')).scalar() or 0)
+        repetidos = conn.execute(sa.text(
+            'SELECT id FROM entregas WHERE id IN (SELECT id FROM entregas_arquivo) ORDER BY id'
+        )).scalars().all()
+    for antigo in repetidos:
+        maior += 1
+        conn.execute(sa.text('UPDATE entregas SET id = :novo WHERE id = :antigo'), {'novo': maior, 'antigo': antigo})
+    conn.execute(sa.text("DELETE FROM sqlite_sequence WHERE name = 'entregas'"))
+    conn.execute(sa.text("INSERT INTO sqlite_sequence (name, seq) VALUES ('entregas', :seq)"), {'seq': maior})
+
+
+# ---------------------------------------------------------------------------
+# CLI: flask db ...
+# ---------------------------------------------------------------------------
+
+db_cli = AppGroup('db', help='Versionamento de schema (migrações).')
+
+
+@db_cli.command('upgrade')
+@click.option('--shard', 'shards', multiple=True, help='Ambiente a atualizar (padrão: todos os cadastrados).')
+def db_upgrade(shards):
+    """Aplica as migrações pendentes no banco principal e nos shards."""
+    for nome, versoes in upgrade_todos(list(shards) or None):
+        if versoes:
+            click.echo(f'{nome}: aplicadas as versões {", ".join(map(str, versoes))}')
+        else:
+            click.echo(f'{nome}: já atualizado')
+
+
+@db_cli.command('current')
+def db_current():
+    """Mostra a versão de schema do banco principal."""
+    with db.engine.connect() as conn:
+        atual = versao_atual(conn)
+    ultima = MIGRACOES[-1][0] if MIGRACOES else 0
+    click.echo(f'versão atual: {atual} (última disponível: {ultima})')
+
+
+@db_cli.command('history')
+def db_history():
+    """Lista as migrações disponíveis."""
+    for versao, descricao, _ in MIGRACOES:
+        click.echo(f'{versao:>4}  {descricao}')
+
+
+def init_app(app):
+    app.cli.add_command(db_cli)
@@ -0,0 +1,37 @@
+from datetime import datetime
+
+from app import db
+
+
+class AuditLog(db.Model):
+    """Evento de auditoria de uma escrita da API (gravado em lote por app/auditoria.py).
+
+    Campos:
+      - user_id / user_name / enviroment: quem fez e em qual ambiente (da sessão)
+      - entidade / entidade_id: o que foi alterado (ex.: "entrega", "42")
+      - acao: nome da operação (ex.: "criar", "retirar", "pagar")
+      - antes / depois: estado em JSON (NULL na criação / remoção)
+      - criado_em: momento da escrita (não o da gravação do lote)
+    """
+
+    __tablename__ = 'audit_log'
+
+    id = db.Column(db.Integer, primary_key=True)
+    criado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    enviroment = db.Column(db.String(100), nullable=True)
+    user_id = db.Column(db.Integer, nullable=True)
+    user_name = db.Column(db.String(100), nullable=True)
+    entidade = db.Column(db.String(50), nullable=False)
+    entidade_id = db.Column(db.String(100), nullable=True)
+    acao = db.Column(db.String(50), nullable=False)
+    antes = db.Column(db.Text, nullable=True)
+    depois = db.Column(db.Text, nullable=True)
+
+    __table_args__ = (
+        # Consulta paginada do ambiente (mais recentes primeiro, por id)
+        db.Index('ix_audit_log_env_id', 'enviroment', 'id'),
+        # Histórico de uma entidade específica
+        db.Index('ix_audit_log_env_entidade', 'enviroment', 'entidade', 'entidade_id'),
+        # Log único no banco principal, mesmo com sharding por ambiente
+        {'info': {'global': True}},
+    )
@@ -3,6 +3,11 @@ from app import db
 
 class Color(db.Model):
 	__tablename__ = "cores"
+	# Uma linha por variável de cada tema do ambiente: permite gravar os temas
+	# com upsert (INSERT ... ON CONFLICT) em vez de apagar e recriar
+	__table_args__ = (
+		db.Index('ix_cores_env_tema_variavel', 'enviroment', 'tema', 'nome_variavel', unique=True),
+	)
 
 	id = db.Column(db.Integer, primary_key=True)
 
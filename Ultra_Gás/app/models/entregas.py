@@ -1,9 +1,11 @@
 from app import db
-from datetime import date
+from datetime import date, datetime
 
+from sqlalchemy.orm import declared_attr
 
-class Entrega(db.Model):
-    """Modelo para representar entregas pendentes/histórico.
+
+class EntregaCamposMixin:
+    """Colunas comuns a Entrega (tabela quente) e EntregaArquivo (tabela fria).
 
     Campos:
       - id
@@ -12,8 +14,6 @@ class Entrega(db.Model):
       - produto (string resumida, ex.: "agua:2, p45:1")
     """
 
-    __tablename__ = 'entregas'
-
     id = db.Column(db.Integer, primary_key=True)
     endereco = db.Column(db.String(255), nullable=False)
     destinatario = db.Column(db.String(120), nullable=False)
@@ -21,6 +21,7 @@ class Entrega(db.Model):
     # método de pagamento permitido: 'pix', 'a_prazo', 'cartao', 'dinheiro'
     metodo_pagamento = db.Column(db.String(32), nullable=True)
     # novos campos
+    # nome do entregador (exibição); a ligação com o usuário é feita por encarregado_id
     encarregado = db.Column(db.String(120), nullable=True, default='', server_default='')  # inicia vazio
     entregue = db.Column(db.Boolean, nullable=False, default=False, server_default='0')     # inicia False
     pago = db.Column(db.Boolean, nullable=False, default=False, server_default='0')          # inicia False
@@ -29,12 +30,12 @@ class Entrega(db.Model):
     # data em que o pedido foi criado (ISO yyyy-mm-dd)
     data = db.Column(db.String(10), nullable=True, default=lambda: date.today().isoformat())
     enviroment = db.Column(db.String(100), nullable=False, index=True)
-    
-    # Constraint simples para garantir que, quando informado, o método esteja entre os permitidos.
-    # Observe: se mudar os valores permitidos, atualize também esta expressão.
-    __table_args__ = (
-      db.CheckConstraint("metodo_pagamento IN ('pix','a_prazo','cartao','dinheiro') OR metodo_pagamento IS NULL", name='ck_entrega_metodo_pagamento'),
-    )
+
+    @declared_attr
+    def encarregado_id(cls):
+        # users é global (banco principal): com sharding a FK é só lógica, pois o
+        # shard do ambiente não tem a tabela users (o SQLite não a verifica)
+        return db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
 
     def to_dict(self):
         return {
@@ -44,8 +45,113 @@ class Entrega(db.Model):
             'produto': self.produto,
             'metodo_pagamento': self.metodo_pagamento,
             'encarregado': self.encarregado,
+            'encarregado_id': self.encarregado_id,
             'entregue': self.entregue,
             'pago': self.pago,
             'preco': self.preco,
             'data': self.data
         }
+
+
+# Campos devolvidos por to_dict, na mesma ordem (usado nas consultas que unem as duas tabelas)
+ENTREGA_CAMPOS = ['id', 'endereco', 'destinatario', 'produto', 'metodo_pagamento',
+                  'encarregado', 'encarregado_id', 'entregue', 'pago', 'preco', 'data']
+
+
+class Entrega(EntregaCamposMixin, db.Model):
+    """Modelo para representar entregas pendentes/histórico.
+
+    Tabela "quente": contém os pedidos em aberto e o histórico recente. Pedidos
+    entregues e pagos antigos são movidos para EntregaArquivo pelo job de
+    arquivamento (app/arquivamento.py).
+    """
+
+    __tablename__ = 'entregas'
+
+    # Controle de concorrência otimista: todo UPDATE do ORM inclui
+    # "WHERE versao = <lida>" e incrementa a versão; se outra requisição
+    # alterou a linha antes, o commit levanta StaleDataError (-> HTTP 409).
+    versao = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    __mapper_args__ = {'version_id_col': versao}
+
+    # Constraint simples para garantir que, quando informado, o método esteja entre os permitidos.
+    # Observe: se mudar os valores permitidos, atualize também esta expressão.
+    __table_args__ = (
+      db.CheckConstraint("metodo_pagamento IN ('pix','a_prazo','cartao','dinheiro') OR metodo_pagamento IS NULL", name='ck_entrega_metodo_pagamento'),
+      # entregas de um entregador (entrega atual, cards, carga por entregador)
+      db.Index('ix_entregas_env_encarregado_entregue', 'enviroment', 'encarregado_id', 'entregue'),
+      # contas a receber (relatório de aging): não pagas por método e data
+      db.Index('ix_entregas_env_pago_metodo_data', 'enviroment', 'pago', 'metodo_pagamento', 'data'),
+      # o arquivo guarda os ids das entregas movidas: no SQLite, sem AUTOINCREMENT,
+      # arquivar os maiores ids faria o próximo INSERT reaproveitá-los (ver migração 9)
+      {'sqlite_autoincrement': True},
+    )
+
+    def to_dict(self):
+        # a versão só existe na tabela quente; o cliente a devolve nas ações (retry contract)
+        dados = super().to_dict()
+        dados['versao'] = self.versao
+        return dados
+
+
+class EntregaArquivo(EntregaCamposMixin, db.Model):
+    """Entregas finalizadas (entregue e pago) arquivadas fora da tabela quente.
+
+    Mantém o mesmo id da Entrega original. Só é lida por histórico e relatórios.
+    """
+
+    __tablename__ = 'entregas_arquivo'
+
+    arquivado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_entregas_arquivo_env_data', 'enviroment', 'data'),
+        db.Index('ix_entregas_arquivo_env_encarregado_entregue', 'enviroment', 'encarregado_id', 'entregue'),
+    )
+
+
+def uniao_com_arquivo(campos, filtro):
+    """Subquery UNION ALL de Entrega e EntregaArquivo com as mesmas colunas e filtros.
+
+    `campos` é uma lista de nomes de coluna e `filtro` uma função que recebe o
+    modelo e devolve a lista de condições, por exemplo:
+
+        sub = uniao_com_arquivo(['metodo_pagamento'], lambda m: [m.enviroment == env])
+        db.session.query(sub.c.metodo_pagamento, func.count()).group_by(sub.c.metodo_pagamento)
+    """
+    partes = [
+        db.select(*[getattr(modelo, c) for c in campos]).where(*filtro(modelo))
+        for modelo in (Entrega, EntregaArquivo)
+    ]
+    return db.union_all(*partes).subquery()
+
+
+def parse_produtos(produto_str):
+    """Converte a string de produtos em um dicionário de quantidades.
+
+    Exemplo de entrada: "agua:2, p45:1" -> {"agua": 2, "p45": 1}
+    Ignora partes vazias e quantidades inválidas (<=0).
+    """
+    result = {}
+    if not produto_str:
+        return result
+    for part in produto_str.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if ':' not in part:
+            continue
+        tipo, qtd_str = part.split(':', 1)
+        tipo = (tipo or '').strip().lower()
+        qtd_str = (qtd_str or '').strip()
+        if not tipo or not qtd_str:
+            continue
+        try:
+            qtd = int(qtd_str)
+        except ValueError:
+            continue
+        if qtd <= 0:
+            continue
+        # acumula se houver repetição do mesmo tipo
+        result[tipo] = result.get(tipo, 0) + qtd
+    return result
@@ -1,40 +1,200 @@
 from app import db
-from sqlalchemy import CheckConstraint
+from sqlalchemy import CheckConstraint, func
 
-# Capacidade padrão do estoque (número máximo de itens somados entre todas as categorias).
-# Este valor é usado para calcular porcentagens e documentar o limite aplicado pela constraint.
-# Atenção: a CheckConstraint da tabela usa um literal (250). Se você alterar esta constante,
-# deverá também atualizar a constraint na definição da tabela (e aplicar migração ou recriar a tabela)
-# para que o banco de dados passe a validar o novo limite.
+# Capacidade padrão de um depósito (número máximo de itens somados entre todos os produtos).
+# Usada apenas como valor inicial de Deposito.capacidade; a capacidade efetiva de cada
+# depósito fica gravada na tabela `depositos` e pode ser alterada sem migração.
 DEFAULT_CAPACITY = 250
 
+# Catálogo inicial de produtos (codigo, descricao), inserido pela migração 2 (app/migrations.py).
+# A ordem da lista define a ordem de exibição no gráfico pie. Novos SKUs podem ser
+# inseridos direto na tabela `produtos`.
+PRODUTOS_PADRAO = [
+    ('p45', 'Botijão P45'),
+    ('p20', 'Botijão P20'),
+    ('p13', 'Botijão P13'),
+    ('p8', 'Botijão P8'),
+    ('p5', 'Botijão P5'),
+    ('agua', 'Galão de água'),
+]
 
-class Estoque(db.Model):
-    __tablename__ = 'estoque'
+
+class Produto(db.Model):
+    """Metadados de produto (SKU) que pode ser estocado.
+
+    Campos:
+      - codigo: chave curta usada na string de produtos da Entrega (ex.: "p45")
+      - descricao: nome amigável
+      - ordem: ordem de exibição
+    """
+
+    __tablename__ = 'produtos'
+
+    id = db.Column(db.Integer, primary_key=True)
+    codigo = db.Column(db.String(30), nullable=False, unique=True)
+    descricao = db.Column(db.String(120), nullable=True)
+    ordem = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+
+class Deposito(db.Model):
+    """Depósito físico de um ambiente, com sua capacidade máxima.
+
+    Um ambiente (enviroment) pode ter vários depósitos; o de menor id é usado
+    como depósito padrão quando nenhum outro é informado.
+    """
+
+    __tablename__ = 'depositos'
 
     id = db.Column(db.Integer, primary_key=True)
-    p45 = db.Column(db.Integer, nullable=False, default=0)
-    p20 = db.Column(db.Integer, nullable=False, default=0)
-    p13 = db.Column(db.Integer, nullable=False, default=0)
-    p8 = db.Column(db.Integer, nullable=False, default=0)
-    p5 = db.Column(db.Integer, nullable=False, default=0)
-    agua = db.Column(db.Integer, nullable=False, default=0)
+    nome = db.Column(db.String(120), nullable=False, default='Principal')
+    capacidade = db.Column(db.Integer, nullable=False, default=DEFAULT_CAPACITY)
     enviroment = db.Column(db.String(100), nullable=False, index=True)
 
-    # Constraint de banco que garante que a soma de todos os campos do estoque
-    # não ultrapasse a capacidade máxima (atualmente 250).
-    # Nota: a expressão da constraint precisa ser alterada manualmente se modificar
-    # DEFAULT_CAPACITY (veja comentário acima).
     __table_args__ = (
-        CheckConstraint('p45 + p20 + p13 + p8 + p5 + agua <= 250', name='ck_estoque_total_max'),
+        CheckConstraint('capacidade > 0', name='ck_deposito_capacidade_positiva'),
+    )
+
+    @classmethod
+    def padrao_do_ambiente(cls, env):
+        """Retorna o depósito padrão do ambiente (menor id) ou None."""
+        return cls.query.filter_by(enviroment=env).order_by(cls.id).first()
+
+    def itens_por_codigo(self, codigos):
+        """Busca, em uma única query, os itens deste depósito para os códigos informados.
+
+        Retorna {codigo: EstoqueItem | None} apenas para produtos cadastrados;
+        códigos desconhecidos ficam de fora. O item é None quando o produto existe
+        mas ainda não há linha de saldo neste depósito.
+        """
+        codigos = list(codigos)
+        if not codigos:
+            return {}
+        rows = (
+            db.session.query(Produto.codigo, EstoqueItem)
+            .outerjoin(
+                EstoqueItem,
+                (EstoqueItem.produto_id == Produto.id) & (EstoqueItem.deposito_id == self.id),
+            )
+            .filter(Produto.codigo.in_(codigos))
+            .all()
+        )
+        return {codigo: item for codigo, item in rows}
+
+    def total(self):
+        """Soma dos itens estocados neste depósito."""
+        return int(
+            db.session.query(func.coalesce(func.sum(EstoqueItem.quantidade), 0))
+            .filter(EstoqueItem.deposito_id == self.id)
+            .scalar() or 0
+        )
+
+    def definir_saldos(self, quantidades):
+        """Grava o saldo de cada produto ({codigo: qtd}) respeitando a capacidade.
+
+        Lança ValueError se a soma final ultrapassar a capacidade do depósito
+        ou se algum código não estiver cadastrado. Não faz commit.
+        """
+        atuais = self.itens_por_codigo(quantidades.keys())
+        desconhecidos = set(quantidades) - set(atuais)
+        if desconhecidos:
+            raise ValueError(f'Produtos não cadastrados: {", ".join(sorted(desconhecidos))}')
+
+        total = self.total()
+        for codigo, qtd in quantidades.items():
+            item = atuais[codigo]
+            total += int(qtd) - (item.quantidade if item else 0)
+        if total > self.capacidade:
+            raise ValueError(f'Capacidade do depósito excedida: {total} / {self.capacidade}')
+
+        produtos = {p.codigo: p.id for p in Produto.query.filter(Produto.codigo.in_(list(quantidades))).all()}
+        for codigo, qtd in quantidades.items():
+            item = atuais[codigo]
+            if item is None:
+                db.session.add(EstoqueItem(deposito_id=self.id, produto_id=produtos[codigo], quantidade=int(qtd)))
+            else:
+                item.quantidade = int(qtd)
+
+
+class EstoqueItem(db.Model):
+    """Saldo de um produto em um depósito (formato longo: depósito x produto)."""
+
+    __tablename__ = 'estoque_itens'
+
+    id = db.Column(db.Integer, primary_key=True)
+    deposito_id = db.Column(db.Integer, db.ForeignKey('depositos.id'), nullable=False)
+    produto_id = db.Column(db.Integer, db.ForeignKey('produtos.id'), nullable=False)
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+    # Controle de concorrência otimista (baixas simultâneas do mesmo produto)
+    versao = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    __mapper_args__ = {'version_id_col': versao}
+
+    __table_args__ = (
+        # Índice único que atende a busca por (depósito, produto) na baixa de estoque
+        db.UniqueConstraint('deposito_id', 'produto_id', name='uq_estoque_item_deposito_produto'),
+        CheckConstraint('quantidade >= 0', name='ck_estoque_item_quantidade_nao_negativa'),
     )
 
+
+class Estoque:
+    """Visão agregada (somente leitura) do estoque de um ambiente.
+
+    Substitui a antiga linha larga `estoque` (uma coluna por produto). Os valores
+    são calculados a partir de `estoque_itens` somando todos os depósitos do
+    ambiente, ou apenas um deles se `deposito_id` for informado.
+    """
+
+    def __init__(self, quantidades, capacidade):
+        self.quantidades = quantidades
+        self.capacidade = capacidade
+
+    @classmethod
+    def do_ambiente(cls, env, deposito_id=None):
+        """Monta a visão do estoque do ambiente com duas queries agregadas.
+
+        Retorna None se o ambiente não tiver nenhum depósito configurado.
+        """
+        depositos = db.session.query(func.sum(Deposito.capacidade), func.count(Deposito.id)) \
+            .filter(Deposito.enviroment == env)
+        if deposito_id is not None:
+            depositos = depositos.filter(Deposito.id == deposito_id)
+        capacidade, n_depositos = depositos.one()
+        if not n_depositos:
+            return None
+
+        saldo = func.coalesce(func.sum(EstoqueItem.quantidade), 0)
+        rows = (
+            db.session.query(Produto.codigo, saldo)
+            .join(EstoqueItem, EstoqueItem.produto_id == Produto.id)
+            .join(Deposito, Deposito.id == EstoqueItem.deposito_id)
+            .filter(Deposito.enviroment == env)
+        )
+        if deposito_id is not None:
+            rows = rows.filter(Deposito.id == deposito_id)
+        rows = rows.group_by(Produto.id, Produto.codigo, Produto.ordem).order_by(Produto.ordem, Produto.id).all()
+
+        return cls({codigo: int(qtd or 0) for codigo, qtd in rows}, int(capacidade or 0))
+
+    @staticmethod
+    def percent_do_ambiente(env):
+        """Percentual ocupado do estoque do ambiente (como percent()) em uma única query."""
+        capacidade = db.select(func.coalesce(func.sum(Deposito.capacidade), 0)) \
+            .where(Deposito.enviroment == env).scalar_subquery()
+        total = db.select(func.coalesce(func.sum(EstoqueItem.quantidade), 0)) \
+            .join(Deposito, Deposito.id == EstoqueItem.deposito_id) \
+            .where(Deposito.enviroment == env).scalar_subquery()
+        capacidade, total = db.session.execute(db.select(capacidade, total)).one()
+        if not capacidade or capacidade <= 0:
+            return 0
+        return round((int(total) / int(capacidade)) * 100)
+
     def total(self):
         """Retorna a soma de todos os itens do estoque."""
-        return int((self.p45 or 0) + (self.p20 or 0) + (self.p13 or 0) + (self.p8 or 0) + (self.p5 or 0) + (self.agua or 0))
+        return int(sum(self.quantidades.values()))
 
-    def percent(self, capacity: int = DEFAULT_CAPACITY):
+    def percent(self, capacity=None):
         """Retorna o percentual ocupado do estoque (arredondado)."""
+        if capacity is None:
+            capacity = self.capacidade
         if capacity <= 0:
             return 0
         total = self.total()
@@ -42,11 +202,5 @@ class Estoque(db.Model):
 
     def to_pie(self):
         """Retorna um dicionário adequado para alimentar o gráfico pie."""
-        return {
-            'p45': int(self.p45 or 0),
-            'p20': int(self.p20 or 0),
-            'p13': int(self.p13 or 0),
-            'p8': int(self.p8 or 0),
-            'p5': int(self.p5 or 0),
-            'agua': int(self.agua or 0),
-        }
+        return dict(self.quantidades)
+
@@ -0,0 +1,51 @@
+from datetime import datetime
+
+from app import db
+
+
+class Job(db.Model):
+    """Tarefa em segundo plano persistida na fila durável (tabela jobs).
+
+    Campos:
+      - nome: nome da tarefa registrada com @tarefa (ex.: "jobs.limpar")
+      - payload: argumentos da tarefa em JSON
+      - status: 'pendente', 'executando', 'concluido' ou 'falhou'
+      - tentativas / max_tentativas: controle de retry
+      - executar_em: quando a tarefa pode rodar (agendamento e backoff de retry)
+    """
+
+    __tablename__ = 'jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    nome = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}', server_default='{}')
+    status = db.Column(db.String(20), nullable=False, default='pendente', server_default='pendente')
+    tentativas = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    max_tentativas = db.Column(db.Integer, nullable=False, default=3, server_default='3')
+    executar_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    erro = db.Column(db.Text, nullable=True)
+    enviroment = db.Column(db.String(100), nullable=True)
+    criado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    atualizado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.CheckConstraint("status IN ('pendente','executando','concluido','falhou')", name='ck_job_status'),
+        # Índice usado pelo worker para buscar as próximas tarefas prontas
+        db.Index('ix_jobs_status_executar_em', 'status', 'executar_em'),
+        # Fila única no banco principal, mesmo com sharding por ambiente
+        {'info': {'global': True}},
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'nome': self.nome,
+            'payload': self.payload,
+            'status': self.status,
+            'tentativas': self.tentativas,
+            'max_tentativas': self.max_tentativas,
+            'executar_em': self.executar_em.isoformat() if self.executar_em else None,
+            'erro': self.erro,
+            'enviroment': self.enviroment,
+            'criado_em': self.criado_em.isoformat() if self.criado_em else None,
+        }
@@ -0,0 +1,28 @@
+from app import db
+
+
+class Preco(db.Model):
+    """Preço unitário de um produto em um ambiente (catálogo de preços).
+
+    Campos:
+      - produto: código do produto (mesmo usado na string de produtos da Entrega, ex.: "p45")
+      - valor: preço unitário em reais inteiros (mesmo formato de Entrega.preco)
+    """
+
+    __tablename__ = 'precos'
+
+    id = db.Column(db.Integer, primary_key=True)
+    produto = db.Column(db.String(30), nullable=False)
+    valor = db.Column(db.Integer, nullable=False)
+    enviroment = db.Column(db.String(100), nullable=False, index=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('enviroment', 'produto', name='uq_preco_env_produto'),
+        db.CheckConstraint('valor >= 0', name='ck_preco_valor_nao_negativo'),
+    )
+
+    def to_dict(self):
+        return {
+            'produto': self.produto,
+            'valor': self.valor,
+        }
@@ -3,6 +3,9 @@ from app import db
 
 class User(db.Model):
     __tablename__ = 'users'
+    # Tabela global: fica sempre no banco principal, mesmo com sharding por ambiente
+    # (o login precisa encontrar o usuário antes de saber o ambiente).
+    __table_args__ = {'info': {'global': True}}
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False)  # nova coluna para nome
@@ -0,0 +1,138 @@
+"""Catálogo de preços por ambiente, guardado no cache do app (app/cache.py).
+
+O preço dos pedidos é calculado no servidor a partir da tabela `precos`
+(um preço unitário por produto e ambiente). A tabela de cada ambiente é
+carregada uma vez e guardada no cache compartilhado, com a tag do ambiente;
+qualquer edição pelo PUT /api/precos chama `invalidar(env)`, o que vale
+para todos os workers quando o backend é compartilhado.
+
+Depois de uma mudança de preço, os pedidos em aberto (não entregues e não
+pagos) são reprecificados pela tarefa `precos.recalcular` ou pelo comando
+`flask precos recalcular`, que gravam só os pedidos cujo valor mudou, em um
+único UPDATE em lote (executemany) por bloco de pedidos lidos.
+"""
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from app import db
+from app.cache import invalidar_ambiente, invalidar_tag, memoizar, tag_ambiente
+from app.jobs import tarefa
+from app.sharding import para_cada_ambiente, usar_shard
+
+# Preços usados quando o ambiente ainda não tem catálogo próprio
+PRECOS_PADRAO = {
+    'p45': 400,
+    'p20': 200,
+    'p13': 130,
+    'p8': 100,
+    'p5': 90,
+    'agua': 10,
+}
+
+
+def _carregar_tabela(env):
+    from app.models.precos import Preco
+
+    rows = db.session.query(Preco.produto, Preco.valor).filter(Preco.enviroment == env).all()
+    return {produto: valor for produto, valor in rows} if rows else dict(PRECOS_PADRAO)
+
+
+def tabela_de_precos(env):
+    """Retorna {produto: valor} do ambiente (do cache, ou carregando do banco)."""
+    return memoizar(f'precos:{env}', lambda: _carregar_tabela(env), tags=[tag_ambiente(env), 'precos'])
+
+
+def invalidar(env=None):
+    """Descarta a tabela em cache do ambiente (ou de todos, se env for None).
+
+    Invalida a tag do ambiente inteira: cards e totais pendentes dependem dos preços.
+    """
+    if env is None:
+        invalidar_tag('precos')
+    else:
+        invalidar_ambiente(env)
+
+
+def calcular_total(itens, tabela):
+    """Calcula o total de um pedido ({produto: quantidade}) em O(itens).
+
+    Retorna (total, produtos_sem_preco).
+    """
+    total = 0
+    sem_preco = []
+    for produto, qtd in itens.items():
+        valor = tabela.get(produto)
+        if valor is None:
+            sem_preco.append(produto)
+            continue
+        total += valor * qtd
+    return total, sem_preco
+
+
+def recalcular_abertos(env, lote=1000):
+    """Reprecifica os pedidos em aberto do ambiente. Retorna quantos tiveram o preço alterado.
+
+    Lê (id, produto, preco) em blocos com yield_per e grava cada bloco com um
+    único UPDATE em lote por chave primária, sem round-trip por pedido. O UPDATE
+    incrementa `versao`, então ações enviadas com a versão antiga recebem 409.
+    """
+    from app.models.entregas import Entrega, parse_produtos
+
+    tabela = tabela_de_precos(env)
+    stmt = db.select(Entrega.id, Entrega.produto, Entrega.preco).where(
+        Entrega.enviroment == env,
+        Entrega.entregue.is_(False),
+        Entrega.pago.is_(False)
+    ).execution_options(yield_per=lote)
+
+    alteracoes = []
+    for entrega_id, produto, preco in db.session.execute(stmt):
+        total, _ = calcular_total(parse_produtos(produto), tabela)
+        if str(total) != (preco or ''):
+            alteracoes.append({'b_id': entrega_id, 'b_preco': str(total)})
+
+    tabela_entregas = Entrega.__table__
+    stmt = (
+        db.update(tabela_entregas)
+        .where(tabela_entregas.c.id == db.bindparam('b_id'))
+        .values(preco=db.bindparam('b_preco'), versao=tabela_entregas.c.versao + 1)
+    )
+    for i in range(0, len(alteracoes), lote):
+        db.session.execute(stmt, alteracoes[i:i + lote])
+    db.session.commit()
+    return len(alteracoes)
+
+
+@tarefa('precos.recalcular')
+def tarefa_recalcular(env):
+    """Tarefa da fila: reprecifica os pedidos em aberto após mudança no catálogo."""
+    invalidar(env)
+    recalcular_abertos(env, lote=current_app.config.get('PRECOS_LOTE', 1000))
+    # os totais pendentes mudaram depois do cálculo acima
+    invalidar_ambiente(env)
+
+
+precos_cli = AppGroup('precos', help='Catálogo de preços por ambiente.')
+
+
+@precos_cli.command('recalcular')
+@click.option('--env', 'envs', multiple=True, help='Ambiente a reprecificar (padrão: todos).')
+def precos_recalcular(envs):
+    """Reprecifica os pedidos em aberto com o catálogo atual."""
+    lote = current_app.config.get('PRECOS_LOTE', 1000)
+    if envs:
+        for env in envs:
+            with usar_shard(env):
+                click.echo(f'{env}: {recalcular_abertos(env, lote)} pedido(s) reprecificado(s)')
+        return
+    from app.sharding import ambientes_conhecidos
+    for atual in para_cada_ambiente():
+        for env in ([atual] if atual else ambientes_conhecidos()):
+            click.echo(f'{env}: {recalcular_abertos(env, lote)} pedido(s) reprecificado(s)')
+
+
+def init_app(app):
+    from app.models import precos as _modelos  # noqa: F401  (registra a tabela precos)
+
+    app.cli.add_command(precos_cli)
@@ -0,0 +1,273 @@
+"""Previsão de ruptura de estoque: dias até acabar e sugestão de reposição por produto.
+
+Consumo diário: quantidades dos pedidos (string `produto` das entregas) somadas
+por dia de criação (`data`) nos últimos PREVISAO_JANELA_DIAS dias, lendo a
+tabela quente e o arquivo. A taxa de consumo de cada série (ambiente x produto)
+é uma média exponencial (PREVISAO_ALPHA), calculada para todas as séries de uma
+vez: com NumPy é um único produto matriz x vetor; sem NumPy (dependência
+opcional) o mesmo cálculo é feito em Python puro.
+
+O saldo considerado é o do estoque menos o reservado pelos pedidos ainda não
+retirados. `dias_ate_acabar` = disponível / taxa; a sugestão de reposição
+cobre PREVISAO_PRAZO_REPOSICAO + PREVISAO_COBERTURA_DIAS dias de consumo.
+Com consumo tão baixo que o estoque passaria de PREVISAO_HORIZONTE_DIAS dias
+(ex.: uma única venda no começo da janela), não há ruptura prevista.
+
+Incremental: o consumo diário de cada ambiente fica no cache do app
+(app/cache.py) com o maior id de entrega já contado; cada atualização lê só os
+pedidos com id maior. A previsão do ambiente é guardada com a tag do ambiente,
+então um pedido novo ou uma retirada (escritas) invalidam a previsão e a
+próxima consulta recalcula a partir do consumo já acumulado. A tarefa
+`previsao.atualizar` (a cada PREVISAO_INTERVALO segundos, ou
+`flask previsao atualizar`) recalcula todos os ambientes em um lote.
+"""
+import math
+from datetime import date, datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from app import db
+from app.cache import cache_atual, memoizar, tag_ambiente
+from app.jobs import agendar, tarefa
+from app.sharding import para_cada_ambiente
+
+try:  # numpy é opcional
+    import numpy as np
+except ImportError:  # pragma: no cover - depende do ambiente
+    np = None
+
+
+def _config(nome, padrao):
+    return current_app.config.get(nome, padrao)
+
+
+# ---------------------------------------------------------------------------
+# Consumo diário (estado incremental por ambiente)
+# ---------------------------------------------------------------------------
+
+def _somar(dias, data, produto_str):
+    from app.models.entregas import parse_produtos
+
+    if not data:
+        return
+    do_dia = dias.setdefault(data, {})
+    for produto, qtd in parse_produtos(produto_str).items():
+        do_dia[produto] = do_dia.get(produto, 0) + qtd
+
+
+def _reconstruir(env, inicio):
+    """Lê a janela inteira do ambiente (quando não há estado em cache)."""
+    from app.models.entregas import Entrega, uniao_com_arquivo
+
+    # o limite de id é lido antes: pedidos criados durante a leitura ficam para a próxima atualização
+    ultimo_id = db.session.query(db.func.max(Entrega.id)).filter(Entrega.enviroment == env).scalar() or 0
+    janela = uniao_com_arquivo(['data', 'produto'], lambda m: [
+        m.enviroment == env,
+        m.data >= inicio,
+        m.id <= ultimo_id
+    ])
+    dias = {}
+    for data, produto in db.session.execute(db.select(janela.c.data, janela.c.produto)):
+        _somar(dias, data, produto)
+    return {'ultimo_id': ultimo_id, 'dias': dias}
+
+
+def atualizar_consumo(env, hoje=None):
+    """Atualiza e retorna o consumo diário do ambiente, lendo só os pedidos novos."""
+    from app.models.entregas import Entrega
+
+    hoje = hoje or date.today()
+    inicio = (hoje - timedelta(days=_config('PREVISAO_JANELA_DIAS', 28) - 1)).isoformat()
+    chave = f'previsao:consumo:{env}'
+    cache = cache_atual()
+    estado = cache.get(chave) if cache is not None else None
+
+    if estado is None:
+        estado = _reconstruir(env, inicio)
+    else:
+        # cópia: com o backend em memória o estado guardado é o próprio objeto do cache
+        estado = {'ultimo_id': estado['ultimo_id'], 'dias': {d: dict(v) for d, v in estado['dias'].items()}}
+        novos = db.session.query(Entrega.id, Entrega.data, Entrega.produto).filter(
+            Entrega.id > estado['ultimo_id'],
+            Entrega.enviroment == env
+        ).all()
+        for entrega_id, data, produto in novos:
+            _somar(estado['dias'], data, produto)
+            estado['ultimo_id'] = max(estado['ultimo_id'], entrega_id)
+
+    # descarta os dias que saíram da janela
+    estado['dias'] = {d: v for d, v in estado['dias'].items() if d >= inicio}
+    if cache is not None:
+        cache.set(chave, estado, ttl=_config('PREVISAO_ESTADO_TTL', 7 * 24 * 60 * 60))
+    return estado
+
+
+def _reservado(env):
+    """Quantidades dos pedidos ainda não retirados (o estoque só baixa na retirada)."""
+    from app.models.entregas import Entrega, parse_produtos
+
+    reservado = {}
+    pendentes = db.session.query(Entrega.produto).filter(
+        Entrega.enviroment == env,
+        Entrega.encarregado_id.is_(None),
+        Entrega.entregue.is_(False),
+        Entrega.encarregado == ''
+    )
+    for (produto_str,) in pendentes:
+        for produto, qtd in parse_produtos(produto_str).items():
+            reservado[produto] = reservado.get(produto, 0) + qtd
+    return reservado
+
+
+# ---------------------------------------------------------------------------
+# Cálculo em lote
+# ---------------------------------------------------------------------------
+
+def taxas_de_consumo(series, alpha):
+    """Média exponencial de cada série (lista de listas, dia mais antigo primeiro).
+
+    Todas as séries têm o mesmo comprimento; retorna a taxa diária de cada uma.
+    O peso do dia k (de T) é (1 - alpha) ** (T - 1 - k), normalizado.
+    """
+    if not series:
+        return []
+    dias = len(series[0])
+    if np is not None:
+        pesos = (1 - alpha) ** np.arange(dias - 1, -1, -1, dtype=float)
+        return (np.asarray(series, dtype=float) @ pesos / pesos.sum()).tolist()
+    pesos = [(1 - alpha) ** (dias - 1 - k) for k in range(dias)]
+    soma = sum(pesos)
+    return [sum(x * p for x, p in zip(serie, pesos)) / soma for serie in series]
+
+
+def prever(ambientes, hoje=None):
+    """Calcula a previsão de vários ambientes em um lote.
+
+    `ambientes`: {env: {'consumo': estado, 'saldos': {produto: qtd},
+    'reservado': {produto: qtd}, 'capacidade': n}}. Retorna {env: payload}.
+    """
+    hoje = hoje or date.today()
+    janela = _config('PREVISAO_JANELA_DIAS', 28)
+    alpha = _config('PREVISAO_ALPHA', 0.3)
+    prazo = _config('PREVISAO_PRAZO_REPOSICAO', 3)
+    cobertura = _config('PREVISAO_COBERTURA_DIAS', 14)
+    horizonte = _config('PREVISAO_HORIZONTE_DIAS', 365)
+    datas = [(hoje - timedelta(days=janela - 1 - i)).isoformat() for i in range(janela)]
+
+    # uma linha por (ambiente, produto), uma coluna por dia da janela
+    chaves, series = [], []
+    for env, dados in ambientes.items():
+        dias = dados['consumo']['dias']
+        produtos = list(dados['saldos'])
+        produtos += sorted({p for v in dias.values() for p in v} - set(produtos))
+        for produto in produtos:
+            chaves.append((env, produto))
+            series.append([dias.get(d, {}).get(produto, 0) for d in datas])
+    taxas = taxas_de_consumo(series, alpha)
+
+    resultado = {env: [] for env in ambientes}
+    for (env, produto), taxa in zip(chaves, taxas):
+        dados = ambientes[env]
+        saldo = dados['saldos'].get(produto, 0)
+        reservado = dados['reservado'].get(produto, 0)
+        disponivel = saldo - reservado
+        if taxa > 0:
+            dias_ate_acabar = max(disponivel, 0) / taxa
+            sugestao = max(0, math.ceil(taxa * (prazo + cobertura)) - disponivel)
+            # além do horizonte a data nem caberia em um date (taxa ~ 1e-5/dia)
+            if dias_ate_acabar > horizonte:
+                dias_ate_acabar = None
+        else:
+            dias_ate_acabar = None
+            sugestao = max(0, -disponivel)
+        if disponivel <= 0 and (taxa > 0 or reservado > 0):
+            status = 'ruptura'
+        elif dias_ate_acabar is not None and dias_ate_acabar <= prazo:
+            status = 'repor'
+        else:
+            status = 'ok'
+        resultado[env].append({
+            'produto': produto,
+            'saldo': saldo,
+            'reservado': reservado,
+            'consumo_diario': round(taxa, 2),
+            'dias_ate_acabar': round(dias_ate_acabar, 1) if dias_ate_acabar is not None else None,
+            'ruptura_prevista': (hoje + timedelta(days=math.floor(dias_ate_acabar))).isoformat()
+            if dias_ate_acabar is not None else None,
+            'sugestao_reposicao': sugestao,
+            'status': status,
+        })
+
+    gerado_em = datetime.utcnow().isoformat(timespec='seconds')
+    return {
+        env: {
+            'gerado_em': gerado_em,
+            'metodo': 'numpy' if np is not None else 'python',
+            'janela_dias': janela,
+            'capacidade_livre': max(0, ambientes[env]['capacidade'] - sum(ambientes[env]['saldos'].values())),
+            'produtos': produtos,
+        }
+        for env, produtos in resultado.items()
+    }
+
+
+def _entrada(env, hoje):
+    """Consumo atualizado + saldos + reservado do ambiente (None se não há depósito)."""
+    from app.models.estoque import Estoque
+
+    estoque = Estoque.do_ambiente(env)
+    if not estoque:
+        return None
+    return {
+        'consumo': atualizar_consumo(env, hoje),
+        'saldos': estoque.to_pie(),
+        'reservado': _reservado(env),
+        'capacidade': estoque.capacidade,
+    }
+
+
+def previsao_do_ambiente(env):
+    """Payload de /api/estoque/previsao (do cache, ou recalculado de forma incremental)."""
+    hoje = date.today()
+
+    def calcular():
+        entrada = _entrada(env, hoje)
+        return prever({env: entrada}, hoje)[env] if entrada else None
+
+    return memoizar(f'previsao:{env}:{hoje.isoformat()}', calcular, tags=[tag_ambiente(env)])
+
+
+@tarefa('previsao.atualizar')
+def atualizar_previsoes():
+    """Recalcula a previsão de todos os ambientes em um lote e guarda no cache."""
+    from app.sharding import ambientes_conhecidos
+
+    hoje = date.today()
+    cache = cache_atual()
+    ambientes = {}
+    for atual in para_cada_ambiente():
+        for env in ([atual] if atual else ambientes_conhecidos()):
+            entrada = _entrada(env, hoje)
+            if entrada:
+                ambientes[env] = entrada
+    previsoes = prever(ambientes, hoje)
+    if cache is not None:
+        for env, payload in previsoes.items():
+            cache.set(f'previsao:{env}:{hoje.isoformat()}', payload, tags=[tag_ambiente(env)])
+    return len(previsoes)
+
+
+previsao_cli = AppGroup('previsao', help='Previsão de ruptura de estoque.')
+
+
+@previsao_cli.command('atualizar')
+def previsao_atualizar():
+    """Recalcula a previsão de todos os ambientes."""
+    click.echo(f'{atualizar_previsoes()} ambiente(s) atualizado(s) ({"numpy" if np is not None else "python"})')
+
+
+def init_app(app):
+    app.cli.add_command(previsao_cli)
+    agendar('previsao.atualizar', a_cada=app.config.get('PREVISAO_INTERVALO', 60 * 60))
@@ -0,0 +1,320 @@
+"""Gerador de dados sintéticos em volume (`flask seed`) para testes de desempenho.
+
+O init_db.py cria um único ambiente, objeto a objeto pelo ORM. Este comando
+gera N ambientes completos com inserts em lote do SQLAlchemy Core
+(executemany, LOTE linhas por vez), tudo em uma transação por banco (o
+principal e, com sharding, o de cada ambiente). A mesma --seed gera
+sempre os mesmos dados.
+
+Por ambiente ("<prefixo> 001", "<prefixo> 002", ... pulando os nomes já
+usados):
+  - usuários: um admin e --entregadores entregadores (senha --senha, com um
+    único hash reaproveitado);
+  - depósitos (--depositos) com saldo de cada produto do catálogo;
+  - clientes (--clientes), que são os endereços das entregas;
+  - entregas (--entregas) espalhadas entre --inicio e --fim, com menos
+    movimento no fim de semana e status coerentes com a idade do pedido:
+    os de hoje se dividem entre pendentes, em rota e entregues; os mais
+    antigos estão entregues, e as vendas a prazo vão sendo pagas com o
+    tempo. Entregas entregues e pagas mais velhas que ARQUIVO_DIAS já vão
+    para entregas_arquivo, como faria o arquivamento.
+
+Os ids são atribuídos aqui (a partir do maior id existente), então não rode
+o seed com o app recebendo escritas no mesmo banco. Para cargas grandes,
+--recriar-indices remove os índices de entregas e entregas_arquivo antes de
+inserir e os recria no fim, dentro da mesma transação (criar o índice de uma
+vez sai bem mais barato que mantê-lo linha a linha).
+"""
+import random
+import time
+from contextlib import ExitStack
+from datetime import date, datetime, timedelta
+from operator import itemgetter
+
+import click
+import sqlalchemy as sa
+from flask import current_app
+from flask.cli import with_appcontext
+from werkzeug.security import generate_password_hash
+
+from app import db
+
+NOMES = ['Ana', 'Bruno', 'Carla', 'Diego', 'Elisa', 'Fábio', 'Gabriela', 'Heitor', 'Isabela', 'João',
+         'Larissa', 'Marcos', 'Natália', 'Otávio', 'Paula', 'Rafael', 'Sofia', 'Thiago', 'Vanessa', 'Wagner']
+SOBRENOMES = ['Almeida', 'Barbosa', 'Costa', 'Dias', 'Ferreira', 'Gomes', 'Lima', 'Martins', 'Oliveira',
+              'Pereira', 'Ribeiro', 'Rocha', 'Santos', 'Silva', 'Souza']
+RUAS = ['Rua das Flores', 'Rua XV de Novembro', 'Avenida Brasil', 'Rua São José', 'Rua Sete de Setembro',
+        'Avenida Getúlio Vargas', 'Rua Tiradentes', 'Rua Dom Pedro II', 'Travessa do Comércio', 'Rua da Paz']
+
+# (código, peso na escolha do item, quantidade máxima por pedido)
+MIX_PRODUTOS = [('p13', 60, 2), ('agua', 20, 5), ('p45', 8, 1), ('p20', 7, 1), ('p8', 3, 2), ('p5', 2, 2)]
+MIX_PAGAMENTO = [('pix', 35), ('dinheiro', 30), ('cartao', 20), ('a_prazo', 15)]
+# movimento relativo por dia da semana (segunda = 0)
+PESO_DIA_SEMANA = [1.0, 1.0, 1.0, 1.0, 1.1, 0.8, 0.5]
+
+
+# colunas das entregas geradas, na ordem das tuplas de _gerar_entregas
+COLUNAS_ENTREGA = ('id', 'endereco', 'destinatario', 'produto', 'metodo_pagamento', 'encarregado',
+                   'encarregado_id', 'entregue', 'pago', 'preco', 'data', 'enviroment')
+# carrinhos (produto, preço, método) sorteados uma vez e reaproveitados pelas entregas
+CARRINHOS = 4096
+
+
+def _slug(env):
+    return ''.join(c if c.isalnum() else '-' for c in env.lower()).strip('-')
+
+
+def _proximo_id(conn, *tabelas):
+    return max(conn.execute(sa.select(sa.func.max(t.c.id))).scalar() or 0 for t in tabelas) + 1
+
+
+def _valor_banco(conn, coluna, valor):
+    """`valor` já convertido pelo tipo da coluna (ex.: DateTime no SQLite vira texto)."""
+    processador = coluna.type.dialect_impl(conn.dialect).bind_processor(conn.dialect)
+    return processador(valor) if processador else valor
+
+
+def _inserir(conn, tabela, colunas, linhas, contagem):
+    """INSERT em lote (executemany) de tuplas na ordem de `colunas`.
+
+    A instrução é compilada pelo Core uma vez e vai direto ao driver, sem o
+    processamento de parâmetros linha a linha do Connection.execute, que é o
+    que mais custa em milhões de linhas. Os valores precisam estar no formato
+    do driver (ver _valor_banco).
+    """
+    if not linhas:
+        return
+    compilado = sa.insert(tabela).compile(dialect=conn.dialect, column_keys=list(colunas))
+    if conn.dialect.positional:
+        ordem = [colunas.index(c) for c in compilado.positiontup]
+        if ordem != list(range(len(colunas))):
+            linhas = list(map(itemgetter(*ordem), linhas))
+    else:
+        linhas = [dict(zip(colunas, linha)) for linha in linhas]
+    conn.exec_driver_sql(str(compilado), linhas)
+    contagem[tabela.name] = contagem.get(tabela.name, 0) + len(linhas)
+
+
+def _ambientes_novos(prefixo, quantidade):
+    from app.sharding import ambientes_conhecidos
+
+    usados = set(ambientes_conhecidos())
+    nomes, n = [], 0
+    while len(nomes) < quantidade:
+        n += 1
+        nome = f'{prefixo} {n:03d}'
+        if nome not in usados:
+            nomes.append(nome)
+    return nomes
+
+
+def _carrinhos(rng):
+    """Pedidos-modelo (produto, preço, método de pagamento) seguindo MIX_PRODUTOS e MIX_PAGAMENTO."""
+    from app.precos import PRECOS_PADRAO
+
+    produtos = [p for p, _, _ in MIX_PRODUTOS]
+    pesos_produtos = [peso for _, peso, _ in MIX_PRODUTOS]
+    maximos = {p: m for p, _, m in MIX_PRODUTOS}
+    metodos = [m for m, _ in MIX_PAGAMENTO]
+    pesos_metodos = [peso for _, peso in MIX_PAGAMENTO]
+    carrinhos = []
+    for _ in range(CARRINHOS):
+        itens = {}
+        for produto in rng.choices(produtos, weights=pesos_produtos, k=1 if rng.random() < 0.85 else 2):
+            itens[produto] = itens.get(produto, 0) + rng.randint(1, maximos[produto])
+        carrinhos.append((
+            ', '.join(f'{p}:{q}' for p, q in itens.items()),
+            str(sum(PRECOS_PADRAO[p] * q for p, q in itens.items())),
+            rng.choices(metodos, weights=pesos_metodos)[0],
+        ))
+    return carrinhos
+
+
+def _gerar_entregas(rng, env, n, datas, pesos, clientes, entregadores, hoje, dias_arquivo):
+    """Gera as entregas do ambiente em ordem de data: yield (arquivar, tupla de COLUNAS_ENTREGA sem o id).
+
+    Status pela idade do pedido: os de hoje se dividem entre pendentes (sem
+    entregador), em rota e entregues; de ontem ainda sobram alguns em rota; os
+    demais estão entregues e pagos, menos parte das vendas a prazo, que vão
+    sendo pagas com o tempo.
+    """
+    carrinhos = _carrinhos(rng)
+    nomes = [f'{n} {s}' for n in NOMES for s in SOBRENOMES]
+    aleatorio = rng.random
+    por_data = {}
+    for data in sorted(rng.choices(datas, weights=pesos, k=n)):
+        if data not in por_data:
+            idade = (hoje - data).days
+            por_data[data] = (data.isoformat(), idade, min(0.97, 0.1 + idade / 45), idade > dias_arquivo)
+        iso, idade, chance_prazo, antiga = por_data[data]
+        produto, preco, metodo = carrinhos[int(aleatorio() * CARRINHOS)]
+        r = aleatorio()
+        if idade <= 0 and r < 0.5:
+            entregue = pago = False
+            atribuida = r >= 0.25
+        elif idade == 1 and r < 0.03:
+            entregue = pago = False
+            atribuida = True
+        else:
+            entregue = atribuida = True
+            pago = aleatorio() < (chance_prazo if metodo == 'a_prazo' else 0.99)
+        entregador_id, entregador_nome = entregadores[int(aleatorio() * len(entregadores))] if atribuida else (None, '')
+        yield entregue and pago and antiga, (
+            clientes[int(aleatorio() * len(clientes))], nomes[int(aleatorio() * len(nomes))], produto, metodo,
+            entregador_nome, entregador_id, entregue, pago, preco, iso, env,
+        )
+
+
+def semear(ambientes=1, clientes=200, entregas=10000, entregadores=5, depositos=1,
+           inicio=None, fim=None, seed=42, prefixo='Seed', senha='seed123', lote=50000,
+           recriar_indices=False):
+    """Gera os dados (ver docstring do módulo). Retorna (ambientes, {tabela: linhas})."""
+    from app.models.clientes import Cliente
+    from app.models.entregas import Entrega, EntregaArquivo
+    from app.models.estoque import DEFAULT_CAPACITY, Deposito, EstoqueItem, Produto
+    from app.models.users import User
+    from app.sharding import provisionar_shard
+
+    rng = random.Random(seed)
+    hoje = date.today()
+    fim = fim or hoje
+    inicio = inicio or fim - timedelta(days=179)
+    if inicio > fim:
+        raise ValueError('inicio deve ser anterior a fim')
+    datas = [inicio + timedelta(days=i) for i in range((fim - inicio).days + 1)]
+    pesos = [PESO_DIA_SEMANA[d.weekday()] for d in datas]
+    dias_arquivo = current_app.config.get('ARQUIVO_DIAS', 90)
+
+    nomes = _ambientes_novos(prefixo, ambientes)
+    router = current_app.extensions.get('shards')
+    sharding = router is not None and router.habilitado
+    hash_senha = generate_password_hash(senha)
+    contagem = {}
+
+    with ExitStack() as pilha:
+        # uma transação por banco, confirmadas juntas no fim
+        conexoes = {}
+
+        def conexao(engine):
+            if engine not in conexoes:
+                conexoes[engine] = pilha.enter_context(engine.begin())
+            return conexoes[engine]
+
+        principal = conexao(db.engine)
+        proximo_usuario = _proximo_id(principal, User.__table__)
+        proximos = {}   # engine -> {'entrega': id, 'deposito': id}
+
+        for env in nomes:
+            if sharding:
+                provisionar_shard(env)
+            engine = router.engine_para(env) if sharding else db.engine
+            conn = conexao(engine)
+            if engine not in proximos:
+                proximos[engine] = {
+                    'entrega': _proximo_id(conn, Entrega.__table__, EntregaArquivo.__table__),
+                    'deposito': _proximo_id(conn, Deposito.__table__),
+                }
+                if recriar_indices:
+                    for tabela in (Entrega.__table__, EntregaArquivo.__table__):
+                        for indice in tabela.indexes:
+                            indice.drop(conn, checkfirst=True)
+            ids = proximos[engine]
+            slug = _slug(env)
+
+            # usuários (banco principal): o admin e os entregadores
+            usuarios = [(proximo_usuario, f'Admin {env}', f'admin@{slug}.seed', 'admin')]
+            for i in range(1, entregadores + 1):
+                usuarios.append((proximo_usuario + i, f'{rng.choice(NOMES)} {rng.choice(SOBRENOMES)} {i}',
+                                 f'entregador{i}@{slug}.seed', 'user'))
+            proximo_usuario += len(usuarios)
+            _inserir(principal, User.__table__, ('id', 'name', 'email', 'user_type', 'password', 'enviroment', 'tema'),
+                     [u + (hash_senha, env, 'root') for u in usuarios], contagem)
+            equipe = [(u[0], u[1]) for u in usuarios[1:]] or [(usuarios[0][0], usuarios[0][1])]
+
+            # depósitos e saldos
+            produtos = conn.execute(sa.select(Produto.id)).scalars().all()
+            novos_depositos, itens = [], []
+            for d in range(depositos):
+                deposito_id = ids['deposito']
+                ids['deposito'] += 1
+                novos_depositos.append((deposito_id, 'Principal' if d == 0 else f'Depósito {d + 1}', DEFAULT_CAPACITY, env))
+                ocupacao = int(DEFAULT_CAPACITY * rng.uniform(0.4, 0.9))
+                for produto_id in produtos:
+                    itens.append((deposito_id, produto_id, ocupacao // max(1, len(produtos)), 1))
+            _inserir(conn, Deposito.__table__, ('id', 'nome', 'capacidade', 'enviroment'), novos_depositos, contagem)
+            _inserir(conn, EstoqueItem.__table__, ('deposito_id', 'produto_id', 'quantidade', 'versao'), itens, contagem)
+
+            # clientes
+            enderecos = [f'{rng.choice(RUAS)}, {rng.randint(1, 2000)}' for _ in range(max(1, clientes))]
+            for i in range(0, len(enderecos), lote):
+                _inserir(conn, Cliente.__table__, ('endereco', 'enviroment'),
+                         [(e, env) for e in enderecos[i:i + lote]], contagem)
+
+            # entregas (quentes e arquivadas), em lotes
+            arquivado_em = _valor_banco(conn, EntregaArquivo.__table__.c.arquivado_em, datetime.utcnow())
+            quentes, arquivadas = [], []
+            for arquivar, linha in _gerar_entregas(rng, env, entregas, datas, pesos, enderecos, equipe,
+                                                   hoje, dias_arquivo):
+                if arquivar:
+                    arquivadas.append((ids['entrega'],) + linha + (arquivado_em,))
+                    if len(arquivadas) >= lote:
+                        _inserir(conn, EntregaArquivo.__table__, COLUNAS_ENTREGA + ('arquivado_em',), arquivadas, contagem)
+                        arquivadas = []
+                else:
+                    quentes.append((ids['entrega'],) + linha + (1,))
+                    if len(quentes) >= lote:
+                        _inserir(conn, Entrega.__table__, COLUNAS_ENTREGA + ('versao',), quentes, contagem)
+                        quentes = []
+                ids['entrega'] += 1
+            _inserir(conn, Entrega.__table__, COLUNAS_ENTREGA + ('versao',), quentes, contagem)
+            _inserir(conn, EntregaArquivo.__table__, COLUNAS_ENTREGA + ('arquivado_em',), arquivadas, contagem)
+
+        if recriar_indices:
+            for engine in proximos:
+                for tabela in (Entrega.__table__, EntregaArquivo.__table__):
+                    for indice in tabela.indexes:
+                        indice.create(conexoes[engine])
+
+    # as escritas não passaram pelos requests: limpa o cache de leituras
+    cache = current_app.extensions.get('cache')
+    if cache is not None:
+        cache.clear()
+    return nomes, contagem
+
+
+@click.command('seed')
+@click.option('--ambientes', default=1, show_default=True, help='Ambientes a criar.')
+@click.option('--clientes', default=200, show_default=True, help='Clientes por ambiente.')
+@click.option('--entregas', default=10000, show_default=True, help='Entregas por ambiente.')
+@click.option('--entregadores', default=5, show_default=True, help='Entregadores por ambiente (além do admin).')
+@click.option('--depositos', default=1, show_default=True, help='Depósitos por ambiente.')
+@click.option('--inicio', type=click.DateTime(formats=['%Y-%m-%d']), help='Data do pedido mais antigo (padrão: fim - 179 dias).')
+@click.option('--fim', type=click.DateTime(formats=['%Y-%m-%d']), help='Data do pedido mais recente (padrão: hoje).')
+@click.option('--seed', default=42, show_default=True, help='Semente do gerador aleatório.')
+@click.option('--prefixo', default='Seed', show_default=True, help='Prefixo do nome dos ambientes.')
+@click.option('--senha', default='seed123', show_default=True, help='Senha de todos os usuários gerados.')
+@click.option('--lote', default=50000, show_default=True, help='Linhas por executemany.')
+@click.option('--recriar-indices', is_flag=True, help='Remove os índices de entregas durante a carga e os recria no fim.')
+@with_appcontext
+def seed_cmd(ambientes, clientes, entregas, entregadores, depositos, inicio, fim, seed, prefixo, senha, lote, recriar_indices):
+    """Gera ambientes sintéticos em volume para testes de desempenho."""
+    t0 = time.perf_counter()
+    try:
+        nomes, contagem = semear(
+            ambientes=ambientes, clientes=clientes, entregas=entregas, entregadores=entregadores,
+            depositos=depositos, inicio=inicio.date() if inicio else None, fim=fim.date() if fim else None,
+            seed=seed, prefixo=prefixo, senha=senha, lote=lote, recriar_indices=recriar_indices,
+        )
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    segundos = time.perf_counter() - t0
+    total = sum(contagem.values())
+    for tabela, linhas in sorted(contagem.items()):
+        click.echo(f'{tabela:<18} {linhas:>10}')
+    click.echo(f'{total} linhas em {segundos:.1f}s ({total / segundos:,.0f} linhas/s); '
+               f'ambientes: {nomes[0]}{" .. " + nomes[-1] if len(nomes) > 1 else ""}')
+    click.echo(f'login: admin@{_slug(nomes[0])}.seed / {senha}')
+
+
+def init_app(app):
+    app.cli.add_command(seed_cmd)
@@ -0,0 +1,57 @@
+"""Geração de hashes de senha em paralelo (cadastro em lote de usuários).
+
+generate_password_hash é propositalmente lento (dezenas de ms de CPU por
+senha): o lote é dividido entre os processos de um pool (SENHAS_PROCESSOS;
+0 = um por CPU), fora das threads que atendem requests. O pool é criado na primeira
+vez que for preciso, em cada worker, com o método 'spawn' (o worker tem
+threads, e fork com threads não é seguro), e reaproveitado pelos próximos
+lotes. Lotes pequenos, ou SENHAS_PROCESSOS = 1, usam o processo atual.
+
+Com 'spawn' os processos do pool importam o script principal: scripts que
+usam o app devem ter a guarda `if __name__ == '__main__'` (serve.py e run.py têm).
+"""
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import current_app
+from werkzeug.security import generate_password_hash
+
+# abaixo disso o custo de despachar para o pool não compensa
+_MINIMO_PARA_POOL = 4
+
+_pool = None
+_pool_pid = None
+_lock = threading.Lock()
+
+
+def _processos():
+    n = current_app.config.get('SENHAS_PROCESSOS', 0)
+    return n if n and n > 0 else (os.cpu_count() or 1)
+
+
+def _obter_pool(processos):
+    global _pool, _pool_pid
+    with _lock:
+        # um pool herdado do processo pai (fork) não pode ser usado
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(max_workers=processos, mp_context=multiprocessing.get_context('spawn'))
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def gerar_hashes(senhas):
+    """Lista de hashes (mesma ordem de `senhas`), no formato de generate_password_hash."""
+    processos = _processos()
+    if processos <= 1 or len(senhas) < _MINIMO_PARA_POOL:
+        return [generate_password_hash(s) for s in senhas]
+    pool = _obter_pool(processos)
+    return list(pool.map(generate_password_hash, senhas, chunksize=max(1, len(senhas) // (processos * 4))))
+
+
+@atexit.register
+def _encerrar_pool():
+    if _pool is not None and _pool_pid == os.getpid():
+        _pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,176 @@
+"""Roteamento de banco por ambiente (um arquivo SQLite por enviroment).
+
+Com SHARDING_ENABLED = True, cada ambiente ganha seu próprio banco (URI em
+SHARD_DATABASE_URI, com "{shard}" substituído pelo nome normalizado do
+ambiente). Assim a escrita de um depósito movimentado não bloqueia os
+outros, já que o SQLite só permite um escritor por arquivo.
+
+Regras de roteamento (RoutingSession.get_bind):
+  - tabelas marcadas como globais (`__table_args__ = {'info': {'global': True}}`,
+    ex.: users e jobs) ficam sempre no banco principal (SQLALCHEMY_DATABASE_URI),
+    pois o login precisa achar o usuário antes de saber o ambiente;
+  - qualquer outra tabela vai para o shard do ambiente atual: o definido por
+    `usar_shard(env)` (jobs, scripts) ou, em um request, session['enviroment'];
+  - sem ambiente atual, ou com o sharding desligado, tudo vai para o banco principal.
+
+Os engines são criados sob demanda (na primeira query do ambiente), cada um
+com seu pool de conexões, e reaproveitados pelo resto da vida do processo.
+"""
+import os
+import re
+import threading
+import unicodedata
+from contextlib import contextmanager
+
+import sqlalchemy as sa
+from flask import current_app, g, has_app_context, has_request_context, session
+from flask_sqlalchemy.session import Session as _FlaskSession
+from sqlalchemy.sql.util import find_tables
+
+
+def nome_shard(env):
+    """Normaliza o nome do ambiente para uso em nome de arquivo ("Ambiente de Teste" -> "ambiente_de_teste")."""
+    texto = unicodedata.normalize('NFKD', env or '').encode('ascii', 'ignore').decode('ascii')
+    texto = re.sub(r'[^a-zA-Z0-9]+', '_', texto).strip('_').lower()
+    return texto or 'padrao'
+
+
+def ambiente_atual():
+    """Ambiente usado para rotear as queries neste contexto (ou None)."""
+    if has_app_context() and g.get('shard_env'):
+        return g.shard_env
+    if has_request_context():
+        return session.get('enviroment')
+    return None
+
+
+@contextmanager
+def usar_shard(env):
+    """Força o roteamento para o shard de `env` dentro do bloco (requer app context).
+
+    Ao trocar de ambiente a sessão atual é encerrada, para que nenhuma conexão
+    (e transação) do ambiente anterior seja reaproveitada.
+    """
+    from app import db
+
+    anterior = g.get('shard_env')
+    if anterior != env:
+        db.session.remove()
+    g.shard_env = env
+    try:
+        yield
+    finally:
+        if anterior != env:
+            db.session.remove()
+        g.shard_env = anterior
+
+
+def _tabela_global(tabela):
+    return bool(getattr(tabela, 'info', {}).get('global'))
+
+
+class ShardRouter:
+    """Cria e guarda um engine por ambiente."""
+
+    def __init__(self, app):
+        self.habilitado = app.config.get('SHARDING_ENABLED', False)
+        self.uri_modelo = app.config.get('SHARD_DATABASE_URI', 'sqlite:///shards/{shard}.db')
+        self.engine_options = app.config.get('SHARD_ENGINE_OPTIONS', {})
+        self.instance_path = app.instance_path
+        self._engines = {}
+        self._lock = threading.Lock()
+
+    def _uri(self, env):
+        uri = self.uri_modelo.format(shard=nome_shard(env))
+        url = sa.engine.make_url(uri)
+        # Mesmo tratamento do Flask-SQLAlchemy: caminho SQLite relativo fica em instance/
+        if url.drivername.startswith('sqlite') and url.database and url.database != ':memory:' \
+                and not os.path.isabs(url.database):
+            caminho = os.path.join(self.instance_path, url.database)
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            url = url.set(database=caminho)
+        return url
+
+    def engine_para(self, env):
+        """Retorna (criando se preciso) o engine do shard de `env`."""
+        chave = nome_shard(env)
+        engine = self._engines.get(chave)
+        if engine is not None:
+            return engine
+        with self._lock:
+            engine = self._engines.get(chave)
+            if engine is None:
+                engine = sa.create_engine(self._uri(env), **self.engine_options)
+                self._engines[chave] = engine
+        return engine
+
+    def engines(self):
+        return dict(self._engines)
+
+    def dispose_all(self):
+        """Fecha os pools de todos os shards (ex.: após fork de um worker)."""
+        with self._lock:
+            for engine in self._engines.values():
+                engine.dispose(close=False)
+
+
+class RoutingSession(_FlaskSession):
+    """Sessão do Flask-SQLAlchemy que envia as tabelas de ambiente para o shard atual."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is not None:
+            return bind
+
+        router = current_app.extensions.get('shards') if has_app_context() else None
+        env = ambiente_atual() if router is not None and router.habilitado else None
+        if env:
+            tabelas = []
+            if mapper is not None:
+                tabelas.append(sa.inspect(mapper).local_table)
+            if clause is not None:
+                tabelas.extend(find_tables(clause, include_crud=True, include_joins=True))
+            if any(not _tabela_global(t) for t in tabelas if isinstance(t, sa.Table)):
+                return router.engine_para(env)
+
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def ambientes_conhecidos():
+    """Lista os ambientes cadastrados (a partir de users, no banco principal)."""
+    from app import db
+    from app.models.users import User
+
+    return [r[0] for r in db.session.query(User.enviroment).distinct().all() if r[0]]
+
+
+def para_cada_ambiente():
+    """Itera sobre os ambientes, já roteados para o shard de cada um.
+
+    Com o sharding desligado produz apenas None (banco principal), para que
+    tarefas de manutenção rodem uma única vez sobre o banco compartilhado.
+    """
+    router = current_app.extensions.get('shards')
+    if router is None or not router.habilitado:
+        yield None
+        return
+    for env in ambientes_conhecidos():
+        with usar_shard(env):
+            yield env
+
+
+def provisionar_shard(env):
+    """Cria/atualiza o schema do banco de `env` aplicando as migrações pendentes."""
+    from app import db
+    from app.migrations import upgrade
+
+    router = current_app.extensions['shards']
+    if not router.habilitado:
+        upgrade(db.engine, principal=True)
+        return db.engine
+    engine = router.engine_para(env)
+    upgrade(engine, principal=False)
+    return engine
+
+
+def init_app(app):
+    app.extensions['shards'] = ShardRouter(app)
@@ -4,7 +4,7 @@ document.addEventListener('DOMContentLoaded', function () {
 
     list.innerHTML = 'Carregando...';
 
-    fetch('/dashboard/clientes')
+    fetchInicial('clientes', '/dashboard/clientes')
         .then(function (res) {
             if (!res.ok) throw new Error('Resposta de rede não OK');
             return res.json();
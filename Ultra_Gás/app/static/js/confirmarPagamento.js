@@ -50,7 +50,7 @@ document.addEventListener('DOMContentLoaded', () => {
             btnPagar.className = 'small-btn';
             btnPagar.textContent = 'Marcar Pago';
 
-            btnPagar.addEventListener('click', () => marcarPago(item.id, card));
+            btnPagar.addEventListener('click', () => marcarPago(item.id, card, item.versao));
 
             body.appendChild(h2);
             body.appendChild(pEndereco);
@@ -69,7 +69,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
     function fetchPendentes() {
         container.innerHTML = 'Carregando...';
-        fetch('/dashboard/pagamentos-pendentes')
+        fetchInicial('pagamentos_pendentes', '/dashboard/pagamentos-pendentes')
             .then(r => r.json())
             .then(render)
             .catch(err => {
@@ -78,11 +78,21 @@ document.addEventListener('DOMContentLoaded', () => {
             });
     }
 
-    function marcarPago(id, cardEl) {
+    function marcarPago(id, cardEl, versao) {
         if (!id) return;
-        fetch(`/api/entregas/${id}/pagar`, { method: 'POST' })
+        fetch(`/api/entregas/${id}/pagar`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ versao: versao })
+        })
             .then(r => r.json())
             .then(resp => {
+                if (resp.conflito) {
+                    // entrega alterada por outra requisição: recarrega a lista com o estado atual
+                    alert(resp.error);
+                    fetchPendentes();
+                    return;
+                }
                 if (resp.ok) {
                     cardEl.classList.add('pago');
                     setTimeout(fetchPendentes, 400);
@@ -1,3 +1,30 @@
+/* -------------------------
+   Dados iniciais embutidos pelo servidor (/dashboard/bootstrap)
+   ------------------------- */
+// show_dashboard embute no HTML os dados da primeira pintura. Cada chave é
+// usada uma única vez; as chamadas seguintes (polling, atualizações) vão à API.
+let _dadosBootstrap = null;
+
+function fetchInicial(chave, url) {
+    if (_dadosBootstrap === null) {
+        const el = document.getElementById('dashboard-bootstrap');
+        try {
+            _dadosBootstrap = el ? JSON.parse(el.textContent) : {};
+        } catch (e) {
+            _dadosBootstrap = {};
+        }
+    }
+    if (Object.prototype.hasOwnProperty.call(_dadosBootstrap, chave)) {
+        const dados = _dadosBootstrap[chave];
+        delete _dadosBootstrap[chave];
+        return Promise.resolve(new Response(JSON.stringify(dados), {
+            status: 200,
+            headers: { 'Content-Type': 'application/json' }
+        }));
+    }
+    return fetch(url);
+}
+
 //* *** Sidebar *** */
 
 const body = document.querySelector("body"),
@@ -91,7 +118,7 @@ function initEstoque() {
 
     // Retorna a Promise para permitir que o poller aguarde conclusão e evite sobreposição
     console.log('[initEstoque] iniciando fetch /api/estoque');
-    return fetch('/api/estoque')
+    return fetchInicial('estoque', '/api/estoque')
         .then(resp => {
             if (!resp.ok) throw new Error('No API');
             return resp.json();
@@ -195,7 +222,7 @@ function initFinanceiro() {
     // Tenta buscar dados do endpoint /api/financeiro; se falhar usa mock local
     // Retorna a Promise para permitir que o poller aguarde conclusão e evite sobreposição
     console.log('[initFinanceiro] iniciando fetch /api/financeiro');
-    return fetch('/api/financeiro')
+    return fetchInicial('financeiro', '/api/financeiro')
         .then(resp => {
             if (!resp.ok) throw new Error('API não disponível');
             return resp.json();
@@ -279,7 +306,7 @@ function renderFinanceiroChart(data, canvas, legendEl) {
    ------------------------- */
 function fetchAndApplyDashboardCards() {
     console.log('[cards] buscando /dashboard/cards');
-    return fetch('/dashboard/cards')
+    return fetchInicial('cards', '/dashboard/cards')
         .then(resp => {
             if (!resp.ok) throw new Error('API /dashboard/cards indisponível');
             return resp.json();
@@ -329,7 +356,7 @@ function fetchAndApplyDashboardCards() {
 
 function fetchAndApplyEstoqueCards() {
     console.log('[cards] buscando /dashboard/estoque-cards');
-    return fetch('/dashboard/estoque-cards')
+    return fetchInicial('estoque_cards', '/dashboard/estoque-cards')
         .then(resp => {
             if (!resp.ok) throw new Error('API /dashboard/estoque-cards indisponível');
             return resp.json();
@@ -50,7 +50,7 @@ document.addEventListener('DOMContentLoaded', () => {
             btnProblema.textContent = 'Problema';
 
             // Eventos
-            btnConfirm.addEventListener('click', () => confirmarEntrega(item.id, card));
+            btnConfirm.addEventListener('click', () => confirmarEntrega(item.id, card, item.versao));
             btnDetalhes.addEventListener('click', () => mostrarDetalhes(item));
             btnProblema.addEventListener('click', () => alert('Funcionalidade de problema ainda não definida.'));
 
@@ -70,7 +70,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
     function fetchEntregas() {
         container.innerHTML = 'Carregando...';
-        fetch('/dashboard/entrega-atual')
+        fetchInicial('entrega_atual', '/dashboard/entrega-atual')
             .then(r => r.json())
             .then(render)
             .catch(err => {
@@ -82,11 +82,21 @@ document.addEventListener('DOMContentLoaded', () => {
     // Atualiza quando evento global disparado após retirar nova entrega
     document.addEventListener('entrega-atual-atualizar', () => fetchEntregas());
 
-    function confirmarEntrega(id, cardEl) {
+    function confirmarEntrega(id, cardEl, versao) {
         if (!id) return;
-        fetch(`/api/entregas/${id}/confirm`, { method: 'POST' })
+        fetch(`/api/entregas/${id}/confirm`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ versao: versao })
+        })
             .then(r => r.json())
             .then(resp => {
+                if (resp.conflito) {
+                    // entrega alterada por outra requisição: recarrega a lista com o estado atual
+                    alert(resp.error);
+                    fetchEntregas();
+                    return;
+                }
                 if (resp.ok) {
                     cardEl.classList.add('entregue');
                     setTimeout(() => {
@@ -14,7 +14,7 @@ document.addEventListener('DOMContentLoaded', function () {
 
     container.innerHTML = 'Carregando...';
 
-    fetch('/dashboard/entregas-pendentes')
+    fetchInicial('entregas_pendentes', '/dashboard/entregas-pendentes')
         .then(function (res) {
             if (!res.ok) throw new Error('Resposta de rede não OK');
             return res.json();
@@ -114,10 +114,24 @@ document.addEventListener('DOMContentLoaded', function () {
                         return;
                     }
                     btnRetirar.disabled = true;
-                    fetch(`/api/entregas/${item.id}/retirar`, { method: 'POST' })
+                    // envia a versão exibida: se a entrega mudou nesse meio tempo o servidor responde 409
+                    fetch(`/api/entregas/${item.id}/retirar`, {
+                        method: 'POST',
+                        headers: { 'Content-Type': 'application/json' },
+                        body: JSON.stringify({ versao: item.versao })
+                    })
                         .then(r => r.json().then(j => ({ ok: r.ok, status: r.status, data: j })))
                         .then(resp => {
+                            if (resp.status === 409 && resp.data.conflito === 'ja_atribuida') {
+                                card.remove();
+                                mostrarMensagem('Esta entrega já foi retirada por outro entregador.');
+                                return;
+                            }
                             if (!resp.ok) {
+                                // conflito de versão: o próximo clique tenta de novo com a versão atual
+                                if (resp.status === 409 && resp.data.versao_atual) {
+                                    item.versao = resp.data.versao_atual;
+                                }
                                 btnRetirar.disabled = false;
                                 mostrarMensagem(`Falha: ${resp.data.error || 'Erro ao retirar.'}`);
                                 return;
@@ -4,7 +4,7 @@ document.addEventListener('DOMContentLoaded', function () {
 
     container.innerHTML = 'Carregando...';
 
-    fetch('/dashboard/historico-entregas')
+    fetchInicial('historico', '/dashboard/historico-entregas')
         .then(function (res) {
             if (!res.ok) throw new Error('Resposta de rede não OK');
             return res.json();
@@ -9,6 +9,24 @@
         agua: 0,
     };
 
+    // catálogo de preços do ambiente (GET /api/precos); só serve para a prévia
+    // do total — o valor gravado é sempre calculado pelo servidor
+    let precosUnit = {};
+
+    async function loadPrecos() {
+        try {
+            const res = await fetch('/api/precos');
+            if (!res.ok) return;
+            const data = await res.json().catch(() => null);
+            if (data && data.precos) {
+                precosUnit = data.precos;
+                updateTotalDisplay();
+            }
+        } catch (err) {
+            console.debug('Não foi possível carregar a tabela de preços', err);
+        }
+    }
+
     function updateQtyDisplay(key) {
         const el = document.getElementById(`qty-${key}`);
         if (el) el.textContent = String(state[key] ?? 0);
@@ -51,11 +69,10 @@
     }
 
     function calcularTotalAtual() {
-        const PRECO_UNIT = { p45: 400, p20: 200, p13: 130, p8: 100, p5: 90, agua: 10 };
         let total = 0;
         Object.entries(state).forEach(([nome, quantidade]) => {
-            if (quantidade > 0 && PRECO_UNIT[nome] != null) {
-                total += PRECO_UNIT[nome] * quantidade;
+            if (quantidade > 0 && precosUnit[nome] != null) {
+                total += precosUnit[nome] * quantidade;
             }
         });
         return total;
@@ -138,18 +155,8 @@
             const produtoStr = produtosToString(produtos);
             const metodo = pagamentos[0];
 
-            // tabela de preços unitários
-            const PRECO_UNIT = { p45: 400, p20: 200, p13: 130, p8: 100, p5: 90, agua: 10 };
-            let total = 0;
-            produtos.forEach(p => {
-                if (PRECO_UNIT[p.nome] != null) {
-                    total += PRECO_UNIT[p.nome] * p.quantidade;
-                }
-            });
-            // envia como string simples (ex.: "1130") ou poderia formatar BRL
-            const precoStr = String(total);
-
-            const payload = { endereco, destinatario: cliente, produto: produtoStr, metodo_pagamento: metodo, preco: precoStr };
+            // sem preço: o servidor calcula o total pelo catálogo do ambiente
+            const payload = { endereco, destinatario: cliente, produto: produtoStr, metodo_pagamento: metodo };
             console.log('[pedido] payload pronto para envio', payload);
 
             try {
@@ -161,7 +168,10 @@
 
                 const body = await res.json().catch(() => ({}));
                 if (res.ok) {
-                    showPedidoModal('Pedido registrado com sucesso.', 'Sucesso', 'success', true);
+                    // mostra o total gravado pelo servidor, não a prévia da tela
+                    const preco = body?.entrega?.preco;
+                    const totalMsg = preco && Number.isFinite(Number(preco)) ? ` Total: ${formatBRL(Number(preco))}.` : '';
+                    showPedidoModal(`Pedido registrado com sucesso.${totalMsg}`, 'Sucesso', 'success', true);
                     // resetar quantidades e campos
                     Object.keys(state).forEach(k => { state[k] = 0; updateQtyDisplay(k); });
                     document.getElementById('enderecoInput').value = '';
@@ -185,6 +195,7 @@
 
     window.addEventListener('DOMContentLoaded', () => {
         loadEnderecoSuggestions();
+        loadPrecos();
         bindProductCards();
         Object.keys(state).forEach(updateQtyDisplay);
         updateTotalDisplay();
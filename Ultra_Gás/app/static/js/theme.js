@@ -15,16 +15,21 @@ function mudarTema(tema) {
     aplicarTemaDinamico();
 }
 
+// Usa os dados embutidos no HTML quando disponíveis (ver fetchInicial em dashboardDynamic.js)
+function _fetchTema(chave, url) {
+    return typeof fetchInicial === 'function' ? fetchInicial(chave, url) : fetch(url);
+}
+
 async function aplicarTemaDinamico() {
     try {
-        const respTemas = await fetch('/api/themes');
+        const respTemas = await _fetchTema('temas', '/api/themes');
         if (!respTemas.ok) return;
         const temas = await respTemas.json();
 
         // Busca o tema atual do usuário a partir da API
         let temaUsuario = 'root';
         try {
-            const respTemaUser = await fetch('/api/current-theme');
+            const respTemaUser = await _fetchTema('tema', '/api/current-theme');
             if (respTemaUser.ok) {
                 const data = await respTemaUser.json();
                 if (data && data.tema) {
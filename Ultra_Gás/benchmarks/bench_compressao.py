@@ -0,0 +1,103 @@
+"""Benchmark da compressão de respostas JSON (app/compressao.py).
+
+Para listas de entregas no formato de /dashboard/historico-entregas com
+tamanhos crescentes, mede os bytes trafegados e o custo de CPU por resposta
+de cada encoding/nível, e o overhead do after_request completo dentro do
+Flask (resposta comprimida x sem Accept-Encoding).
+
+Uso (a partir da pasta Ultra_Gás):
+    python benchmarks/bench_compressao.py --linhas 10 100 1000 10000 --repeticoes 50
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from app.compressao import brotli, comprimir  # noqa: E402
+
+
+def gerar_entregas(n, seed=42):
+    rnd = random.Random(seed)
+    nomes = ['Ana Souza', 'Bruno Lima', 'Carla Dias', 'Diego Rocha', 'Elisa Melo']
+    ruas = ['Rua das Flores', 'Av. Brasil', 'Rua XV de Novembro', 'Rua do Comércio']
+    produtos = ['p13', 'p45', 'agua', 'p20']
+    return [
+        {
+            'id': i,
+            'cliente': rnd.choice(nomes),
+            'endereco': f'{rnd.choice(ruas)}, {rnd.randint(1, 2000)}',
+            'produto': ', '.join(f'{rnd.choice(produtos)} x{rnd.randint(1, 3)}' for _ in range(rnd.randint(1, 3))),
+            'metodo_pagamento': rnd.choice(['pix', 'dinheiro', 'cartao']),
+            'preco': str(rnd.randint(10, 1200)),
+            'data': f'2024-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}',
+            'entregue': True,
+            'pago': rnd.random() < 0.8,
+            'encarregado': rnd.choice(nomes),
+            'enviroment': 'Ambiente de Teste',
+        }
+        for i in range(n)
+    ]
+
+
+def _medir(func, repeticoes):
+    t0 = time.perf_counter()
+    for _ in range(repeticoes):
+        resultado = func()
+    return (time.perf_counter() - t0) / repeticoes, resultado
+
+
+def bench_codecs(linhas, repeticoes):
+    variantes = [('gzip', n) for n in (1, 6, 9)]
+    if brotli is not None:
+        variantes += [('br', q) for q in (1, 4, 11)]
+
+    print(f'{"linhas":>7} {"original":>10} {"encoding":>9} {"nível":>5} {"bytes":>10} {"razão":>6} {"CPU/resp":>10}')
+    for n in linhas:
+        dados = json.dumps(gerar_entregas(n)).encode('utf-8')
+        for encoding, nivel in variantes:
+            tempo, saida = _medir(
+                lambda: comprimir(dados, encoding, nivel=nivel, qualidade_br=nivel), repeticoes
+            )
+            print(f'{n:>7} {len(dados):>10} {encoding:>9} {nivel:>5} {len(saida):>10} '
+                  f'{len(dados) / len(saida):>6.1f} {tempo * 1000:>8.3f}ms')
+    if brotli is None:
+        print('(pacote brotli não instalado: apenas gzip medido)')
+
+
+def bench_flask(linhas, repeticoes):
+    from flask import jsonify
+    from app import create_app
+
+    app = create_app({'JOBS_IN_PROCESS': False})
+    payloads = {n: gerar_entregas(n) for n in linhas}
+
+    @app.route('/_bench/<int:n>')
+    def _bench(n):
+        return jsonify(payloads[n])
+
+    cliente = app.test_client()
+    print(f'\n{"linhas":>7} {"sem compressão":>16} {"com compressão":>16} {"bytes":>18}')
+    for n in linhas:
+        t_plain, r_plain = _medir(lambda: cliente.get(f'/_bench/{n}'), repeticoes)
+        t_gzip, r_gzip = _medir(lambda: cliente.get(f'/_bench/{n}', headers={'Accept-Encoding': 'gzip, br'}), repeticoes)
+        print(f'{n:>7} {t_plain * 1000:>14.3f}ms {t_gzip * 1000:>14.3f}ms '
+              f'{len(r_plain.data):>8} -> {len(r_gzip.data):<8} ({r_gzip.headers.get("Content-Encoding", "-")})')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--linhas', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    parser.add_argument('--repeticoes', type=int, default=50)
+    args = parser.parse_args()
+
+    bench_codecs(args.linhas, args.repeticoes)
+    bench_flask(args.linhas, args.repeticoes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Benchmark da entrada de pedidos com e sem group commit.
+
+Dispara POST /api/pedidos em paralelo (várias threads, cada uma com seu
+test client e sessão) contra um banco SQLite temporário em arquivo e mostra
+pedidos por segundo, latência e erros (incluindo "database is locked").
+
+Uso (a partir da pasta Ultra_Gás):
+    python benchmarks/bench_group_commit.py --threads 16 --pedidos 200
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db  # noqa: E402
+
+ENV = 'Ambiente Benchmark'
+PEDIDO = {'endereco': 'Rua Benchmark, 1', 'destinatario': 'Cliente', 'produto': 'p13:1, agua:2', 'metodo_pagamento': 'pix'}
+
+
+def rodar(group_commit, threads, pedidos, pasta):
+    caminho = os.path.join(pasta, f'bench_{"gc" if group_commit else "normal"}.db')
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{caminho}',
+        'GROUP_COMMIT_ENABLED': group_commit,
+        'JOBS_IN_PROCESS': False,
+        'RATE_LIMIT_ENABLED': False,
+    })
+    with app.app_context():
+        db.create_all()
+
+    latencias = []
+    erros = {'lock': 0, 'outros': 0}
+    trava = threading.Lock()
+    inicio_geral = threading.Barrier(threads + 1)
+
+    def trabalhador():
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+            sess['user_type'] = 'admin'
+            sess['enviroment'] = ENV
+        locais = []
+        inicio_geral.wait()
+        for _ in range(pedidos):
+            t0 = time.perf_counter()
+            resp = client.post('/api/pedidos', json=PEDIDO)
+            locais.append(time.perf_counter() - t0)
+            if resp.status_code != 201:
+                detalhe = (resp.get_json(silent=True) or {}).get('detail', '')
+                with trava:
+                    erros['lock' if 'locked' in detalhe else 'outros'] += 1
+        with trava:
+            latencias.extend(locais)
+
+    ts = [threading.Thread(target=trabalhador) for _ in range(threads)]
+    for t in ts:
+        t.start()
+    inicio_geral.wait()
+    t0 = time.perf_counter()
+    for t in ts:
+        t.join()
+    duracao = time.perf_counter() - t0
+    # grava a auditoria pendente antes de main() apagar o banco temporário
+    auditoria = app.extensions.get('auditoria')
+    if auditoria is not None:
+        auditoria.flush()
+
+    total = threads * pedidos
+    latencias.sort()
+    writer = app.extensions.get('group_commit')
+    print(f'{"group commit" if group_commit else "commit por pedido":<18} '
+          f'{total / duracao:8.1f} pedidos/s  '
+          f'p50={statistics.median(latencias) * 1000:6.1f}ms  '
+          f'p99={latencias[int(len(latencias) * 0.99) - 1] * 1000:6.1f}ms  '
+          f'locked={erros["lock"]} outros_erros={erros["outros"]}'
+          + (f'  lotes={writer.lotes} ({writer.linhas / max(writer.lotes, 1):.1f} pedidos/lote)' if writer else ''))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--pedidos', type=int, default=100, help='pedidos por thread')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        print(f'{args.threads} threads x {args.pedidos} pedidos')
+        rodar(False, args.threads, args.pedidos, pasta)
+        rodar(True, args.threads, args.pedidos, pasta)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Benchmark do tempo de inicialização do create_app().
+
+Mede:
+  - partida a frio: processo Python novo que importa `app` e chama create_app()
+    (o que um worker paga ao subir);
+  - partida a quente: create_app() repetido no mesmo processo;
+  - quantas instruções SQL o create_app() executa (deve ser zero: DDL e seed
+    ficam com `flask db upgrade` / init_db.py).
+
+Uso (a partir da pasta Ultra_Gás):
+    python benchmarks/bench_startup.py --frio 10 --quente 200
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+_SCRIPT_FRIO = (
+    'import time; t0 = time.perf_counter(); '
+    'from app import create_app; create_app(); '
+    'print(time.perf_counter() - t0)'
+)
+
+
+def partida_a_frio(n):
+    tempos = []
+    for _ in range(n):
+        saida = subprocess.run([sys.executable, '-c', _SCRIPT_FRIO], cwd=RAIZ, capture_output=True, text=True, check=True)
+        tempos.append(float(saida.stdout.strip().splitlines()[-1]))
+    return tempos
+
+
+def partida_a_quente(n):
+    from app import create_app
+
+    create_app()  # garante módulos importados
+    tempos = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        create_app()
+        tempos.append(time.perf_counter() - t0)
+    return tempos
+
+
+def instrucoes_sql_no_create_app():
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    from app import create_app
+
+    contagem = []
+
+    def contar(conn, cursor, statement, *args):
+        contagem.append(statement)
+
+    event.listen(Engine, 'before_cursor_execute', contar)
+    try:
+        create_app()
+    finally:
+        event.remove(Engine, 'before_cursor_execute', contar)
+    return len(contagem)
+
+
+def _resumo(nome, tempos):
+    tempos = sorted(tempos)
+    print(f'{nome:<22} n={len(tempos):<4} mediana={statistics.median(tempos) * 1000:8.2f}ms  '
+          f'min={tempos[0] * 1000:8.2f}ms  max={tempos[-1] * 1000:8.2f}ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frio', type=int, default=10, help='processos novos')
+    parser.add_argument('--quente', type=int, default=200, help='repetições no mesmo processo')
+    args = parser.parse_args()
+
+    _resumo('create_app() a frio', partida_a_frio(args.frio))
+    _resumo('create_app() a quente', partida_a_quente(args.quente))
+    print(f'instruções SQL durante create_app(): {instrucoes_sql_no_create_app()}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,332 @@
+"""Teste de carga que simula um turno de depósito contra um servidor rodando.
+
+Cada usuário virtual é uma thread com sua própria sessão (cookie) e conexão
+keep-alive, fazendo login pelo formulário de /login como um navegador:
+
+  - admin:       polling do dashboard (cards, estoque-cards, /api/estoque, /api/financeiro);
+  - entregador:  lista pendentes -> retirar -> confirm -> pagar;
+  - atendente:   POST /api/pedidos (central de pedidos);
+  - tema:        usuário de ambiente alterando o tema de vez em quando
+                 (/api/themes/custom + /api/themes/apply-to-env).
+
+Ao final mostra o throughput total e, por rota, requests/s, percentis de
+latência, respostas 4xx (recusas de negócio, ex.: estoque insuficiente),
+respostas 429 do limitador (RATE_LIMIT_*), erros (5xx e falhas de conexão) e
+quantos deles foram "database is locked".
+
+Os usuários virtuais de um mesmo papel entram com a mesma credencial e por isso
+dividem o balde do limitador; para medir só a aplicação, suba o servidor com
+RATE_LIMIT_ENABLED = False (as 429 aparecem na coluna própria, fora de "4xx").
+
+Uso (a partir da pasta Ultra_Gás, com o servidor no ar e init_db.py aplicado):
+    python serve.py --workers 4 --threads 8 &
+    python benchmarks/carga_turno.py --url http://127.0.0.1:8000 --duracao 60 \\
+        --admins 2 --entregadores 8 --atendentes 3 --temas 1
+
+As credenciais padrão são as de init_db.py; use --admin/--entregador/--ambiente
+(email:senha) para outro banco. --json grava o relatório em arquivo.
+"""
+import argparse
+import http.client
+import json
+import random
+import statistics
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlencode, urlsplit
+
+PRODUTOS = ['p13', 'p13', 'p13', 'p20', 'p45', 'agua', 'agua']
+METODOS = ['pix', 'dinheiro', 'cartao', 'a_prazo']
+TEMAS = ['turno_claro', 'turno_escuro']
+
+
+class Metricas:
+    """Acumula latências e resultados por rota (thread-safe)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencias = defaultdict(list)
+        self.status = defaultdict(lambda: defaultdict(int))
+        self.locks = defaultdict(int)
+        self.motivos = defaultdict(lambda: defaultdict(int))
+
+    def registrar(self, rota, segundos, status, lock=False, motivo=None):
+        with self._lock:
+            self.latencias[rota].append(segundos)
+            self.status[rota][status] += 1
+            if lock:
+                self.locks[rota] += 1
+            if motivo:
+                self.motivos[rota][motivo] += 1
+
+
+class Cliente:
+    """Conexão HTTP keep-alive com cookie de sessão, medindo cada request."""
+
+    def __init__(self, url, metricas, timeout=30):
+        partes = urlsplit(url)
+        self.host = partes.hostname
+        self.porta = partes.port or 80
+        self.timeout = timeout
+        self.metricas = metricas
+        self.cookies = {}
+        self._conn = None
+
+    def _conexao(self):
+        if self._conn is None:
+            self._conn = http.client.HTTPConnection(self.host, self.porta, timeout=self.timeout)
+        return self._conn
+
+    def request(self, metodo, caminho, rota=None, json_body=None, form=None):
+        """Faz o request e retorna (status, corpo_json_ou_None). Status 0 = falha de conexão."""
+        rota = rota or f'{metodo} {caminho}'
+        headers = {'Accept-Encoding': 'identity'}
+        corpo = None
+        if json_body is not None:
+            corpo = json.dumps(json_body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        elif form is not None:
+            corpo = urlencode(form).encode('utf-8')
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+
+        t0 = time.perf_counter()
+        try:
+            conn = self._conexao()
+            conn.request(metodo, caminho, body=corpo, headers=headers)
+            resp = conn.getresponse()
+            dados = resp.read()
+            status = resp.status
+            for cookie in resp.headers.get_all('Set-Cookie') or []:
+                nome, _, resto = cookie.partition('=')
+                self.cookies[nome.strip()] = resto.split(';', 1)[0]
+            if resp.getheader('Connection', '').lower() == 'close':
+                self.fechar()
+        except (OSError, http.client.HTTPException):
+            self.fechar()
+            self.metricas.registrar(rota, time.perf_counter() - t0, 0)
+            return 0, None
+        duracao = time.perf_counter() - t0
+
+        try:
+            payload = json.loads(dados) if dados and resp.getheader('Content-Type', '').startswith('application/json') else None
+        except ValueError:
+            payload = None
+        travado = status >= 500 and b'database is locked' in dados
+        motivo = None
+        if status >= 400 and isinstance(payload, dict) and payload.get('error'):
+            # agrupa mensagens como "Estoque insuficiente para p13. Disponível: 0, ..."
+            motivo = str(payload['error']).split('.')[0][:60]
+        self.metricas.registrar(rota, duracao, status, lock=travado, motivo=motivo)
+        return status, payload
+
+    def login(self, email, senha):
+        status, _ = self.request('POST', '/login', rota='POST /login', form={'email': email, 'password': senha})
+        if status != 302 or 'session' not in self.cookies:
+            raise RuntimeError(f'login falhou para {email} (status {status})')
+
+    def fechar(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+# ---------------------------------------------------------------------------
+# Cenários (um por papel)
+# ---------------------------------------------------------------------------
+
+def _pausa(rnd, media, fim):
+    """Tempo de "pensar" exponencial em torno de `media` segundos, sem passar do fim."""
+    if media > 0:
+        time.sleep(max(0.0, min(rnd.expovariate(1 / media), fim - time.monotonic())))
+
+
+def cenario_admin(cliente, rnd, fim, opcoes):
+    while time.monotonic() < fim:
+        cliente.request('GET', '/dashboard/cards')
+        cliente.request('GET', '/dashboard/estoque-cards')
+        cliente.request('GET', '/api/estoque')
+        cliente.request('GET', '/api/financeiro')
+        _pausa(rnd, opcoes.intervalo_admin, fim)
+
+
+def cenario_entregador(cliente, rnd, fim, opcoes):
+    while time.monotonic() < fim:
+        status, pendentes = cliente.request('GET', '/dashboard/entregas-pendentes')
+        if status != 200 or not pendentes:
+            _pausa(rnd, opcoes.pensar, fim)
+            continue
+        entrega = rnd.choice(pendentes[:20])
+        eid = entrega.get('id')
+        status, _ = cliente.request('POST', f'/api/entregas/{eid}/retirar', rota='POST /api/entregas/:id/retirar')
+        if status != 200:
+            _pausa(rnd, opcoes.pensar, fim)
+            continue
+        _pausa(rnd, opcoes.pensar, fim)
+        cliente.request('POST', f'/api/entregas/{eid}/confirm', rota='POST /api/entregas/:id/confirm')
+        cliente.request('POST', f'/api/entregas/{eid}/pagar', rota='POST /api/entregas/:id/pagar')
+        _pausa(rnd, opcoes.pensar, fim)
+
+
+def cenario_atendente(cliente, rnd, fim, opcoes):
+    n = 0
+    while time.monotonic() < fim:
+        n += 1
+        itens = {}
+        for _ in range(rnd.randint(1, 3)):
+            produto = rnd.choice(PRODUTOS)
+            itens[produto] = itens.get(produto, 0) + 1
+        cliente.request('POST', '/api/pedidos', json_body={
+            'endereco': f'Rua da Carga, {rnd.randint(1, 999)}',
+            'destinatario': f'Cliente {n}',
+            'produto': ', '.join(f'{p}:{q}' for p, q in itens.items()),
+            'metodo_pagamento': rnd.choice(METODOS),
+        })
+        _pausa(rnd, opcoes.pensar, fim)
+
+
+def cenario_tema(cliente, rnd, fim, opcoes):
+    while time.monotonic() < fim:
+        tema = rnd.choice(TEMAS)
+        cores = {
+            'cor-fundo': f'#{rnd.randint(0, 0xFFFFFF):06x}',
+            'cor-texto': f'#{rnd.randint(0, 0xFFFFFF):06x}',
+            'cor-primaria': f'#{rnd.randint(0, 0xFFFFFF):06x}',
+        }
+        cliente.request('POST', '/api/themes/custom', json_body={'tema': tema, 'cores': cores})
+        cliente.request('POST', '/api/themes/apply-to-env', json_body={'tema': tema})
+        _pausa(rnd, opcoes.intervalo_tema, fim)
+
+
+# ---------------------------------------------------------------------------
+# Execução e relatório
+# ---------------------------------------------------------------------------
+
+def _percentil(ordenados, p):
+    if not ordenados:
+        return 0.0
+    k = min(len(ordenados) - 1, max(0, int(round(p / 100 * len(ordenados))) - 1))
+    return ordenados[k]
+
+
+def relatorio(metricas, duracao):
+    linhas = []
+    total = sum(len(v) for v in metricas.latencias.values())
+    for rota in sorted(metricas.latencias):
+        lat = sorted(metricas.latencias[rota])
+        status = metricas.status[rota]
+        erros = sum(n for s, n in status.items() if s == 0 or s >= 500)
+        linhas.append({
+            'rota': rota,
+            'requests': len(lat),
+            'rps': len(lat) / duracao,
+            'p50_ms': statistics.median(lat) * 1000,
+            'p90_ms': _percentil(lat, 90) * 1000,
+            'p95_ms': _percentil(lat, 95) * 1000,
+            'p99_ms': _percentil(lat, 99) * 1000,
+            'max_ms': lat[-1] * 1000,
+            'recusas_4xx': sum(n for s, n in status.items() if 400 <= s < 500 and s != 429),
+            'limitadas_429': status.get(429, 0),
+            'erros': erros,
+            'taxa_erro': erros / len(lat),
+            'locked': metricas.locks[rota],
+            'status': dict(status),
+            'motivos': dict(metricas.motivos[rota]),
+        })
+    return {
+        'duracao_s': duracao,
+        'requests': total,
+        'throughput_rps': total / duracao if duracao else 0.0,
+        'erros': sum(r['erros'] for r in linhas),
+        'limitadas_429': sum(r['limitadas_429'] for r in linhas),
+        'locked': sum(r['locked'] for r in linhas),
+        'rotas': linhas,
+    }
+
+
+def imprimir(rel):
+    print(f'\n{rel["requests"]} requests em {rel["duracao_s"]:.1f}s = {rel["throughput_rps"]:.1f} req/s   '
+          f'erros={rel["erros"]}  429={rel["limitadas_429"]}  database is locked={rel["locked"]}\n')
+    print(f'{"rota":<36} {"n":>6} {"req/s":>7} {"p50":>7} {"p90":>7} {"p95":>7} {"p99":>7} {"max":>7} '
+          f'{"4xx":>5} {"429":>5} {"erros":>5} {"%err":>6} {"locked":>6}')
+    for r in rel['rotas']:
+        print(f'{r["rota"]:<36} {r["requests"]:>6} {r["rps"]:>7.1f} {r["p50_ms"]:>7.1f} {r["p90_ms"]:>7.1f} '
+              f'{r["p95_ms"]:>7.1f} {r["p99_ms"]:>7.1f} {r["max_ms"]:>7.1f} {r["recusas_4xx"]:>5} '
+              f'{r["limitadas_429"]:>5} {r["erros"]:>5} {r["taxa_erro"] * 100:>5.1f}% {r["locked"]:>6}')
+    print('(latências em ms)')
+
+    motivos = [(r['rota'], m, n) for r in rel['rotas'] for m, n in r['motivos'].items()]
+    if motivos:
+        print('\nmotivos das respostas 4xx/5xx:')
+        for rota, motivo, n in sorted(motivos, key=lambda x: -x[2]):
+            print(f'  {n:>6}  {rota:<36} {motivo}')
+
+
+def _credencial(texto):
+    email, _, senha = texto.partition(':')
+    return email, senha
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--duracao', type=float, default=60, help='segundos de carga')
+    parser.add_argument('--admins', type=int, default=2)
+    parser.add_argument('--entregadores', type=int, default=6)
+    parser.add_argument('--atendentes', type=int, default=2)
+    parser.add_argument('--temas', type=int, default=1, help='usuários de ambiente trocando tema')
+    parser.add_argument('--pensar', type=float, default=0.5, help='tempo médio entre ações (s)')
+    parser.add_argument('--intervalo-admin', type=float, default=2.0, help='intervalo médio do polling do admin (s)')
+    parser.add_argument('--intervalo-tema', type=float, default=10.0, help='intervalo médio entre trocas de tema (s)')
+    parser.add_argument('--admin', type=_credencial, default='admin@example.com:admin123')
+    parser.add_argument('--entregador', type=_credencial, default='user@example.com:user123')
+    parser.add_argument('--ambiente', type=_credencial, default='ambienteuser@example.com:ambienteuser123')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--json', dest='arquivo_json', help='grava o relatório neste arquivo')
+    opcoes = parser.parse_args()
+
+    metricas = Metricas()
+    semente = random.Random(opcoes.seed)
+    papeis = (
+        [(cenario_admin, opcoes.admin)] * opcoes.admins
+        + [(cenario_entregador, opcoes.entregador)] * opcoes.entregadores
+        + [(cenario_atendente, opcoes.admin)] * opcoes.atendentes
+        + [(cenario_tema, opcoes.ambiente)] * opcoes.temas
+    )
+
+    clientes = []
+    for cenario, (email, senha) in papeis:
+        cliente = Cliente(opcoes.url, metricas)
+        cliente.login(email, senha)
+        clientes.append((cenario, cliente, random.Random(semente.random())))
+
+    # os logins não entram no relatório da carga
+    metricas.latencias.pop('POST /login', None)
+    metricas.status.pop('POST /login', None)
+
+    print(f'{len(clientes)} usuários virtuais contra {opcoes.url} por {opcoes.duracao:.0f}s...')
+    inicio = time.monotonic()
+    fim = inicio + opcoes.duracao
+    threads = [
+        threading.Thread(target=cenario, args=(cliente, rnd, fim, opcoes), daemon=True)
+        for cenario, cliente, rnd in clientes
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    duracao = time.monotonic() - inicio
+    for _, cliente, _ in clientes:
+        cliente.fechar()
+
+    rel = relatorio(metricas, duracao)
+    imprimir(rel)
+    if opcoes.arquivo_json:
+        with open(opcoes.arquivo_json, 'w', encoding='utf-8') as f:
+            json.dump(rel, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
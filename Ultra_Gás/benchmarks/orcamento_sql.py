@@ -0,0 +1,183 @@
+"""Orçamento de instruções SQL por rota (usado pela suíte de testes e como script).
+
+Cada rota de ORCAMENTOS declara quantas instruções SQL um request pode
+executar (ex.: /dashboard/cards <= 2). As instruções são contadas com o
+evento before_cursor_execute do SQLAlchemy em qualquer Engine (banco
+principal e shards), só as da thread do request; as rotas são chamadas com o
+test client do Flask, logado com os usuários de init_db.py, sobre um banco
+temporário. O cache de leituras fica desligado (CACHE_BACKEND = 'nenhum')
+para medir o caminho sem cache.
+
+Um `.count()` novo nos cards ou um N+1 em uma lista estoura o orçamento, e a
+falha mostra as instruções executadas (as repetidas agrupadas, que é a cara
+de um N+1). Ao otimizar uma rota, baixe o limite dela aqui.
+
+Os orçamentos rodam com o resto da suíte (tests/test_orcamento_sql.py, um
+teste por rota; as fixtures `app_orcamento`, `cliente_sql` e `contador_sql`
+ficam em tests/conftest.py):
+    python -m pytest                                 # na pasta Ultra_Gás ou na raiz do repositório
+    python benchmarks/orcamento_sql.py               # o mesmo relatório, sem pytest
+"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from collections import Counter
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+# perfil -> (email, senha) dos usuários de init_db.py
+PERFIS = {
+    'admin': ('admin@example.com', 'admin123'),
+    'entregador': ('user@example.com', 'user123'),
+}
+
+# (perfil, método, rota, limite de instruções, corpo JSON). Os limites são as
+# contagens sem cache: qualquer instrução a mais é regressão.
+ORCAMENTOS = [
+    ('admin', 'GET', '/dashboard/', 14, None),
+    ('admin', 'GET', '/dashboard/bootstrap', 12, None),
+    ('admin', 'GET', '/dashboard/cards', 2, None),
+    ('admin', 'GET', '/dashboard/estoque-cards', 3, None),
+    ('admin', 'GET', '/dashboard/entregas-pendentes', 1, None),
+    ('admin', 'GET', '/dashboard/historico-entregas', 1, None),
+    ('admin', 'GET', '/dashboard/clientes', 1, None),
+    ('admin', 'GET', '/dashboard/pagamentos-pendentes', 1, None),
+    ('entregador', 'GET', '/dashboard/entrega-atual', 1, None),
+    ('admin', 'GET', '/api/estoque', 2, None),
+    ('admin', 'GET', '/api/estoque/previsao', 5, None),
+    ('admin', 'GET', '/api/financeiro', 1, None),
+    ('admin', 'GET', '/api/financeiro/aging', 1, None),
+    ('admin', 'GET', '/api/precos', 1, None),
+    ('admin', 'GET', '/api/entregadores/carga', 2, None),
+    ('admin', 'GET', '/api/themes', 1, None),
+    ('admin', 'GET', '/api/themes/list-names', 1, None),
+    ('admin', 'GET', '/api/current-theme', 1, None),
+    ('admin', 'GET', '/api/auditoria', 1, None),
+    ('admin', 'POST', '/api/pedidos', 3, {'endereco': 'Rua do Orçamento, 1', 'destinatario': 'Cliente', 'produto': 'p13:1'}),
+]
+
+
+class ContadorSQL:
+    """Context manager que guarda as instruções SQL executadas pela thread atual."""
+
+    def __init__(self):
+        self.instrucoes = []
+        self._thread = None
+        # a mesma função precisa ser usada em listen e remove
+        self._ouvinte = self._antes_de_executar
+
+    def _antes_de_executar(self, conn, cursor, statement, parameters, context, executemany):
+        # threads de fundo (auditoria, jobs) não entram na conta do request
+        if threading.get_ident() == self._thread:
+            self.instrucoes.append(statement)
+
+    def __enter__(self):
+        self.instrucoes = []
+        self._thread = threading.get_ident()
+        event.listen(Engine, 'before_cursor_execute', self._ouvinte)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(Engine, 'before_cursor_execute', self._ouvinte)
+        return False
+
+    def __len__(self):
+        return len(self.instrucoes)
+
+    def relatorio(self):
+        """Instruções executadas; as repetidas aparecem uma vez com o nº de execuções."""
+        linhas = []
+        for instrucao, vezes in Counter(' '.join(i.split()) for i in self.instrucoes).items():
+            linhas.append(f'  {vezes}x {instrucao}' if vezes > 1 else f'  {instrucao}')
+        return '\n'.join(linhas)
+
+
+def criar_app(pasta):
+    """App com banco temporário em `pasta`, schema migrado e dados de init_db.py."""
+    from app import create_app
+    from createdb import create_database
+    from init_db import init_test_users
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(pasta, "app.db")}',
+        'SHARD_DATABASE_URI': f'sqlite:///{os.path.join(pasta, "shards", "{shard}.db")}',
+        'CACHE_BACKEND': 'nenhum',
+        'JOBS_IN_PROCESS': False,
+        'RATE_LIMIT_ENABLED': False,
+    })
+    create_database(app=app)
+    init_test_users(app)
+    return app
+
+
+def clientes_por_perfil(app):
+    """Retorna uma função perfil -> test client logado (um cliente por perfil)."""
+    clientes = {}
+
+    def cliente(perfil):
+        if perfil not in clientes:
+            email, senha = PERFIS[perfil]
+            c = app.test_client()
+            resp = c.post('/login', data={'email': email, 'password': senha})
+            assert resp.status_code in (200, 302), f'login de {perfil} falhou ({resp.status_code})'
+            clientes[perfil] = c
+        return clientes[perfil]
+
+    return cliente
+
+
+def medir(cliente, metodo, rota, corpo=None):
+    """Executa o request e retorna (resposta, ContadorSQL)."""
+    with ContadorSQL() as contador:
+        resp = cliente.open(rota, method=metodo, json=corpo)
+        resp.get_data()  # consome respostas em stream dentro da contagem
+    return resp, contador
+
+
+def verificar_orcamento(cliente, metodo, rota, limite, corpo=None):
+    """Mede a rota e retorna uma mensagem de falha (str) ou None se está no orçamento."""
+    resp, contador = medir(cliente, metodo, rota, corpo)
+    if resp.status_code >= 400:
+        return f'{metodo} {rota} respondeu {resp.status_code}: {resp.get_data(as_text=True)[:200]}'
+    if len(contador) > limite:
+        return (f'{metodo} {rota} executou {len(contador)} instruções SQL (orçamento: {limite}):\n'
+                f'{contador.relatorio()}')
+    return None
+
+
+def id_orcamento(orcamento):
+    perfil, metodo, rota, limite, _ = orcamento
+    return f'{metodo} {rota} [{perfil}] <= {limite}'
+
+
+def main():
+    pasta = tempfile.mkdtemp(prefix='orcamento_sql_')
+    app = None
+    try:
+        app = criar_app(pasta)
+        cliente = clientes_por_perfil(app)
+        falhas = 0
+        for perfil, metodo, rota, limite, corpo in ORCAMENTOS:
+            resp, contador = medir(cliente(perfil), metodo, rota, corpo)
+            ok = resp.status_code < 400 and len(contador) <= limite
+            falhas += not ok
+            print(f'{"ok   " if ok else "FALHA"} {len(contador):>3}/{limite:<3} {metodo:<5} {rota} [{perfil}] {resp.status_code}')
+            if not ok:
+                print(contador.relatorio())
+        return 1 if falhas else 0
+    finally:
+        # grava a auditoria pendente antes de apagar o banco temporário
+        auditoria = app.extensions.get('auditoria') if app is not None else None
+        if auditoria is not None:
+            auditoria.flush()
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
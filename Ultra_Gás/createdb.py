@@ -1,13 +1,27 @@
-from app import create_app, db
+from app import create_app
+from app.migrations import upgrade_todos
 
 
-def create_database():
-    """Cria todas as tabelas do banco de dados dentro do app context."""
-    app = create_app()
+def create_database(shards=None, app=None):
+    """Cria/atualiza o schema aplicando as migrações pendentes (equivale a `flask db upgrade`).
+
+    Com SHARDING_ENABLED também provisiona o banco de cada ambiente: os
+    informados em `shards` ou, se nenhum for informado, todos os ambientes
+    já cadastrados em users.
+    """
+    app = app or create_app()
     with app.app_context():
-        db.create_all()
+        for nome, versoes in upgrade_todos(shards):
+            if versoes:
+                print(f'Banco {nome}: migrações aplicadas {versoes}')
         print('Banco criado (ou já existente)')
 
 
 if __name__ == '__main__':
-    create_database()
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Cria o banco principal e, com sharding, os bancos por ambiente.')
+    parser.add_argument('--shard', action='append', metavar='AMBIENTE',
+                        help='Ambiente a provisionar (pode repetir). Padrão: todos os ambientes cadastrados.')
+    args = parser.parse_args()
+    create_database(args.shard)
@@ -1,22 +1,27 @@
 from app import create_app, db
 from app.models.users import User
-from app.models.estoque import Estoque
+from app.models.estoque import Deposito
 from app.models.clientes import Cliente
-from app.models.entregas import Entrega
+from app.models.entregas import Entrega, parse_produtos
+from app.models.precos import Preco
 from app.models.color import Color
+from app.precos import PRECOS_PADRAO, calcular_total, tabela_de_precos
+from app.migrations import upgrade
+from app.sharding import provisionar_shard, usar_shard
 from werkzeug.security import generate_password_hash
 
 
-def init_test_users():
+def init_test_users(app=None):
     """Garante que as tabelas existam e cria usuários de teste se não existirem.
 
     Também popula a tabela de cores (Color) com valores baseados
     nas variáveis definidas em static/themeVar.css para facilitar
     testes de tema dinâmico.
     """
-    app = create_app()
+    app = app or create_app()
     with app.app_context():
-        db.create_all()
+        # o schema é responsabilidade das migrações (idempotente; nada a fazer se atualizado)
+        upgrade(db.engine)
 
         if not User.query.filter_by(email='admin@example.com').first():
             admin = User(
@@ -48,160 +53,163 @@ def init_test_users():
         else:
             print('Usuários já existem')
 
-        # Cria um registro de estoque para testes se não existir
-        if not Estoque.query.first():
-            sample = Estoque(
-                p45=40,
-                p20=20,
-                p13=13,
-                p8=8,
-                p5=5,
-                agua=15
-            )
-            db.session.add(sample)
-            db.session.commit()
-            print('Estoque de teste criado (soma <= 250)')
-        else:
-            print('Registro de estoque já existe')
-
-
-        # Cria alguns clientes de teste se não existirem
-        if not Cliente.query.first():
-            clientes_amostra = [
-                Cliente(endereco='Rua das Flores, 123'),
-                Cliente(endereco='Avenida Brasil, 1575'),
-                Cliente(endereco='Rua dos Pinheiros, 900'),
-                Cliente(endereco='Alameda Santos, 300'),
-                Cliente(endereco='Travessa das Palmeiras, 12')
-            ]
-            db.session.add_all(clientes_amostra)
-            db.session.commit()
-            print('Clientes de teste criados')
-        else:
-            print('Clientes já existem')
-
-        # Função de cálculo de preço para entregas
-        precos_unit = {
-            'p45': 400,
-            'p20': 200,
-            'p13': 130,
-            'p8': 100,
-            'p5': 90,
-            'agua': 10
-        }
-
-        def calcular_preco(produto_str: str) -> str:
-            if not produto_str:
-                return '0'
-            total = 0
-            for par in [p.strip() for p in produto_str.split(',') if p.strip()]:
-                if ':' in par:
-                    nome, qtd = par.split(':', 1)
-                    try:
-                        quantidade = int(qtd.strip())
-                    except ValueError:
-                        quantidade = 0
-                    total += precos_unit.get(nome.strip().lower(), 0) * quantidade
-            return str(total)
-
-        # Cria algumas entregas de teste (inclui preco) se não existirem
-        if not Entrega.query.first():
-            dados_entregas = [
-                # Pendentes (sem encarregado)
-                ('Avenida Paulista, 1000','Maria','p20:1','pix','',False,False),
-                ('Rua das Acácias, 45','Pedro','p13:2','cartao','',False,False),
-                ('Praça Central, 10','Ana','p5:1, agua:1','dinheiro','',False,False),
-                ('Rua do Sol, 220','João','p45:1','a_prazo','',False,False),
-                ('Rua São João, 340','Fernanda','agua:2, p45:1','dinheiro','',False,False),
-                # Atribuídas ao usuário de teste (Entrega Atual)
-                ('Rua Alfa, 10','Cliente X','p20:1, agua:1','pix','Usuário de Teste',False,False),
-                ('Rua Beta, 22','Cliente Y','p45:1','dinheiro','Usuário de Teste',False,False),
-                ('Rua Gama, 33','Cliente Z','p13:2','cartao','Usuário de Teste',False,False),
-                ('Rua Delta, 44','Cliente W','p5:1, p8:1','a_prazo','Usuário de Teste',False,False),
-                # Em progresso (tem encarregado mas ainda não entregue/pago)
-                ('Avenida Brasil, 1575','Clara','p20:2','pix','Equipe A',False,False),
-                ('Rua das Flores, 88','Ricardo','p8:1','dinheiro','Equipe B',False,False),
-                # Histórico (entregue e pago)
-                ('Travessa das Palmeiras, 12','Beatriz','p13:1','cartao','Equipe A',True,True),
-                ('Avenida Independência, 501','Lucas','p5:3','pix','Equipe C',True,True),
-                ('Praça das Nações, 7','Eduardo','p20:1','cartao','Equipe B',True,True)
-            ]
-            entregas_objs = [
-                Entrega(
-                    endereco=e[0], destinatario=e[1], produto=e[2], metodo_pagamento=e[3],
-                    encarregado=e[4], entregue=e[5], pago=e[6], preco=calcular_preco(e[2])
-                ) for e in dados_entregas
-            ]
-            db.session.add_all(entregas_objs)
-            db.session.commit()
-            print('Entregas de teste criadas com campo preco')
-        else:
-            print('Entregas já existem')
-
-        # Popula tabela de cores para o ambiente de teste ("Ambiente de Teste"),
-        # se ainda não houver registros. Assim, qualquer usuário com
-        # enviroment == "Ambiente de Teste" usará essas cores.
-        if not Color.query.first():
-            cores_seed = [
-                # Tema padrão (root)
-            Color(nome_variavel='cor-fundo', valor_padrao='#ffffff', tema='root', descricao='Cor de fundo principal', enviroment='Ambiente de Teste'),
-            Color(nome_variavel='cor-texto', valor_padrao='#000000', tema='root', descricao='Cor de texto padrão', enviroment='Ambiente de Teste'),
-            Color(nome_variavel='cor-botao-texto', valor_padrao='#000000', tema='root', descricao='Texto dos botões', enviroment='Ambiente de Teste'),
-            Color(nome_variavel='cor-primaria', valor_padrao='#bbbbbb', tema='root', descricao='Cor primária / destaque', enviroment='Ambiente de Teste'),
-            Color(nome_variavel='cor-secundaria', valor_padrao='#ffffff', tema='root', descricao='Cor secundária / cartões', enviroment='Ambiente de Teste'),
-            Color(nome_variavel='cor-botao', valor_padrao='#bbbbbb', tema='root', descricao='Cor dos botões padrão', enviroment='Ambiente de Teste'),
-
-            # Variáveis de transição globais do root
-            Color(nome_variavel='tran-02', valor_padrao='all 0.2s ease', tema='root', descricao='Transição padrão 0.2s', enviroment='Ambiente de Teste'),
-            Color(nome_variavel='tran-03', valor_padrao='all 0.3s ease', tema='root', descricao='Transição padrão 0.3s', enviroment='Ambiente de Teste'),
-            Color(nome_variavel='tran-04', valor_padrao='all 0.4s ease', tema='root', descricao='Transição padrão 0.4s', enviroment='Ambiente de Teste'),
-            Color(nome_variavel='tran-05', valor_padrao='all 0.5s ease', tema='root', descricao='Transição padrão 0.5s', enviroment='Ambiente de Teste'),
-
-                # Tema rosa
-                Color(nome_variavel='cor-fundo', valor_padrao='#ffcbcd', tema='rosa', enviroment='Ambiente de Teste'),
-                Color(nome_variavel='cor-texto', valor_padrao='#000000', tema='rosa', enviroment='Ambiente de Teste'),
-                Color(nome_variavel='cor-botao-texto', valor_padrao='#000000', tema='rosa', enviroment='Ambiente de Teste'),
-                Color(nome_variavel='cor-primaria', valor_padrao='#ff7a90', tema='rosa', enviroment='Ambiente de Teste'),
-                Color(nome_variavel='cor-secundaria', valor_padrao='#fae4e5', tema='rosa', enviroment='Ambiente de Teste'),
-                Color(nome_variavel='cor-botao', valor_padrao='#ff7a7a', tema='rosa', enviroment='Ambiente de Teste'),
-
-                # Tema azul
-                Color(nome_variavel='cor-fundo', valor_padrao='#dae9ff', tema='azul', enviroment='Ambiente de Teste'),
-                Color(nome_variavel='cor-texto', valor_padrao='#000000', tema='azul', enviroment='Ambiente de Teste'),
-                Color(nome_variavel='cor-botao-texto', valor_padrao='#000000', tema='azul', enviroment='Ambiente de Teste'),
-                Color(nome_variavel='cor-primaria', valor_padrao='#99b3cc', tema='azul', enviroment='Ambiente de Teste'),
-                Color(nome_variavel='cor-secundaria', valor_padrao='#f4f8ff', tema='azul', enviroment='Ambiente de Teste'),
-                Color(nome_variavel='cor-botao', valor_padrao='#6699ff', tema='azul', enviroment='Ambiente de Teste'),
-
-                # Tema cinza
-                Color(nome_variavel='cor-fundo', valor_padrao='#ebebeb', tema='cinza', enviroment='Ambiente de Teste'),
-                Color(nome_variavel='cor-texto', valor_padrao='#000000', tema='cinza', enviroment='Ambiente de Teste'),
-                Color(nome_variavel='cor-botao-texto', valor_padrao='#000000', tema='cinza', enviroment='Ambiente de Teste'),
-                Color(nome_variavel='cor-primaria', valor_padrao='#bbbbbb', tema='cinza', enviroment='Ambiente de Teste'),
-                Color(nome_variavel='cor-secundaria', valor_padrao='#ffffff', tema='cinza', enviroment='Ambiente de Teste'),
-                Color(nome_variavel='cor-botao', valor_padrao='#888888', tema='cinza', enviroment='Ambiente de Teste'),
-
-                # Tema verde
-                Color(nome_variavel='cor-fundo', valor_padrao='#d2ffcf', tema='verde', enviroment='Ambiente de Teste'),
-                Color(nome_variavel='cor-texto', valor_padrao='#000000', tema='verde', enviroment='Ambiente de Teste'),
-                Color(nome_variavel='cor-botao-texto', valor_padrao='#000000', tema='verde', enviroment='Ambiente de Teste'),
-                Color(nome_variavel='cor-primaria', valor_padrao='#6ac86f', tema='verde', enviroment='Ambiente de Teste'),
-                Color(nome_variavel='cor-secundaria', valor_padrao='#e7ffe5', tema='verde', enviroment='Ambiente de Teste'),
-                Color(nome_variavel='cor-botao', valor_padrao='#34c639', tema='verde', enviroment='Ambiente de Teste'),
-
-                # Tema preto
-                Color(nome_variavel='cor-fundo', valor_padrao='#1b1b1b', tema='preto', enviroment='Ambiente de Teste'),
-                Color(nome_variavel='cor-texto', valor_padrao='#ffffff', tema='preto', enviroment='Ambiente de Teste'),
-                Color(nome_variavel='cor-botao-texto', valor_padrao='#ffffff', tema='preto', enviroment='Ambiente de Teste'),
-                Color(nome_variavel='cor-primaria', valor_padrao='#4b4b4b', tema='preto', enviroment='Ambiente de Teste'),
-                Color(nome_variavel='cor-secundaria', valor_padrao='#bbbbbb', tema='preto', enviroment='Ambiente de Teste'),
-                Color(nome_variavel='cor-botao', valor_padrao='#333333', tema='preto', enviroment='Ambiente de Teste'),
-            ]
-            db.session.add_all(cores_seed)
-            db.session.commit()
-            print('Cores de tema populadas na tabela cores (Color)')
-        else:
-            print('Tabela de cores já possui registros')
+        # Dados do ambiente de teste: com SHARDING_ENABLED ficam no banco do próprio ambiente
+        provisionar_shard('Ambiente de Teste')
+        with usar_shard('Ambiente de Teste'):
+            _popular_ambiente_teste()
+
+
+def _popular_ambiente_teste():
+    """Popula estoque, clientes, entregas e cores do "Ambiente de Teste" (idempotente)."""
+    # Cria o depósito padrão do ambiente de teste com saldos iniciais se não existir
+    # (o catálogo de produtos é criado pela migração 2)
+    if not Deposito.padrao_do_ambiente('Ambiente de Teste'):
+        deposito = Deposito(nome='Principal', enviroment='Ambiente de Teste')
+        db.session.add(deposito)
+        db.session.flush()
+        deposito.definir_saldos({'p45': 40, 'p20': 20, 'p13': 13, 'p8': 8, 'p5': 5, 'agua': 15})
+        db.session.commit()
+        print('Depósito e estoque de teste criados (soma <= capacidade)')
+    else:
+        print('Registro de estoque já existe')
+
+
+    # Cria alguns clientes de teste se não existirem
+    if not Cliente.query.first():
+        clientes_amostra = [
+            Cliente(endereco='Rua das Flores, 123', enviroment='Ambiente de Teste'),
+            Cliente(endereco='Avenida Brasil, 1575', enviroment='Ambiente de Teste'),
+            Cliente(endereco='Rua dos Pinheiros, 900', enviroment='Ambiente de Teste'),
+            Cliente(endereco='Alameda Santos, 300', enviroment='Ambiente de Teste'),
+            Cliente(endereco='Travessa das Palmeiras, 12', enviroment='Ambiente de Teste')
+        ]
+        db.session.add_all(clientes_amostra)
+        db.session.commit()
+        print('Clientes de teste criados')
+    else:
+        print('Clientes já existem')
+
+    # Catálogo de preços do ambiente de teste (usa os preços padrão)
+    if not Preco.query.filter_by(enviroment='Ambiente de Teste').first():
+        db.session.add_all([
+            Preco(produto=produto, valor=valor, enviroment='Ambiente de Teste')
+            for produto, valor in PRECOS_PADRAO.items()
+        ])
+        db.session.commit()
+        print('Catálogo de preços de teste criado')
+    else:
+        print('Catálogo de preços já existe')
+
+    tabela = tabela_de_precos('Ambiente de Teste')
+
+    def calcular_preco(produto_str: str) -> str:
+        total, _ = calcular_total(parse_produtos(produto_str), tabela)
+        return str(total)
+
+    # Cria algumas entregas de teste (inclui preco) se não existirem
+    if not Entrega.query.first():
+        dados_entregas = [
+            # Pendentes (sem encarregado)
+            ('Avenida Paulista, 1000','Maria','p20:1','pix','',False,False),
+            ('Rua das Acácias, 45','Pedro','p13:2','cartao','',False,False),
+            ('Praça Central, 10','Ana','p5:1, agua:1','dinheiro','',False,False),
+            ('Rua do Sol, 220','João','p45:1','a_prazo','',False,False),
+            ('Rua São João, 340','Fernanda','agua:2, p45:1','dinheiro','',False,False),
+            # Atribuídas ao usuário de teste (Entrega Atual)
+            ('Rua Alfa, 10','Cliente X','p20:1, agua:1','pix','Usuário de Teste',False,False),
+            ('Rua Beta, 22','Cliente Y','p45:1','dinheiro','Usuário de Teste',False,False),
+            ('Rua Gama, 33','Cliente Z','p13:2','cartao','Usuário de Teste',False,False),
+            ('Rua Delta, 44','Cliente W','p5:1, p8:1','a_prazo','Usuário de Teste',False,False),
+            # Em progresso (tem encarregado mas ainda não entregue/pago)
+            ('Avenida Brasil, 1575','Clara','p20:2','pix','Equipe A',False,False),
+            ('Rua das Flores, 88','Ricardo','p8:1','dinheiro','Equipe B',False,False),
+            # Histórico (entregue e pago)
+            ('Travessa das Palmeiras, 12','Beatriz','p13:1','cartao','Equipe A',True,True),
+            ('Avenida Independência, 501','Lucas','p5:3','pix','Equipe C',True,True),
+            ('Praça das Nações, 7','Eduardo','p20:1','cartao','Equipe B',True,True)
+        ]
+        # encarregado_id dos nomes que são usuários do ambiente (equipes ficam sem id)
+        ids_por_nome = dict(
+            db.session.query(User.name, User.id).filter(User.enviroment == 'Ambiente de Teste').all()
+        )
+        entregas_objs = [
+            Entrega(
+                endereco=e[0], destinatario=e[1], produto=e[2], metodo_pagamento=e[3],
+                encarregado=e[4], encarregado_id=ids_por_nome.get(e[4]), entregue=e[5], pago=e[6],
+                preco=calcular_preco(e[2]), enviroment='Ambiente de Teste'
+            ) for e in dados_entregas
+        ]
+        db.session.add_all(entregas_objs)
+        db.session.commit()
+        print('Entregas de teste criadas com campo preco')
+    else:
+        print('Entregas já existem')
+
+    # Popula tabela de cores para o ambiente de teste ("Ambiente de Teste"),
+    # se ainda não houver registros. Assim, qualquer usuário com
+    # enviroment == "Ambiente de Teste" usará essas cores.
+    if not Color.query.first():
+        cores_seed = [
+            # Tema padrão (root)
+        Color(nome_variavel='cor-fundo', valor_padrao='#ffffff', tema='root', descricao='Cor de fundo principal', enviroment='Ambiente de Teste'),
+        Color(nome_variavel='cor-texto', valor_padrao='#000000', tema='root', descricao='Cor de texto padrão', enviroment='Ambiente de Teste'),
+        Color(nome_variavel='cor-botao-texto', valor_padrao='#000000', tema='root', descricao='Texto dos botões', enviroment='Ambiente de Teste'),
+        Color(nome_variavel='cor-primaria', valor_padrao='#bbbbbb', tema='root', descricao='Cor primária / destaque', enviroment='Ambiente de Teste'),
+        Color(nome_variavel='cor-secundaria', valor_padrao='#ffffff', tema='root', descricao='Cor secundária / cartões', enviroment='Ambiente de Teste'),
+        Color(nome_variavel='cor-botao', valor_padrao='#bbbbbb', tema='root', descricao='Cor dos botões padrão', enviroment='Ambiente de Teste'),
+
+        # Variáveis de transição globais do root
+        Color(nome_variavel='tran-02', valor_padrao='all 0.2s ease', tema='root', descricao='Transição padrão 0.2s', enviroment='Ambiente de Teste'),
+        Color(nome_variavel='tran-03', valor_padrao='all 0.3s ease', tema='root', descricao='Transição padrão 0.3s', enviroment='Ambiente de Teste'),
+        Color(nome_variavel='tran-04', valor_padrao='all 0.4s ease', tema='root', descricao='Transição padrão 0.4s', enviroment='Ambiente de Teste'),
+        Color(nome_variavel='tran-05', valor_padrao='all 0.5s ease', tema='root', descricao='Transição padrão 0.5s', enviroment='Ambiente de Teste'),
+
+            # Tema rosa
+            Color(nome_variavel='cor-fundo', valor_padrao='#ffcbcd', tema='rosa', enviroment='Ambiente de Teste'),
+            Color(nome_variavel='cor-texto', valor_padrao='#000000', tema='rosa', enviroment='Ambiente de Teste'),
+            Color(nome_variavel='cor-botao-texto', valor_padrao='#000000', tema='rosa', enviroment='Ambiente de Teste'),
+            Color(nome_variavel='cor-primaria', valor_padrao='#ff7a90', tema='rosa', enviroment='Ambiente de Teste'),
+            Color(nome_variavel='cor-secundaria', valor_padrao='#fae4e5', tema='rosa', enviroment='Ambiente de Teste'),
+            Color(nome_variavel='cor-botao', valor_padrao='#ff7a7a', tema='rosa', enviroment='Ambiente de Teste'),
+
+            # Tema azul
+            Color(nome_variavel='cor-fundo', valor_padrao='#dae9ff', tema='azul', enviroment='Ambiente de Teste'),
+            Color(nome_variavel='cor-texto', valor_padrao='#000000', tema='azul', enviroment='Ambiente de Teste'),
+            Color(nome_variavel='cor-botao-texto', valor_padrao='#000000', tema='azul', enviroment='Ambiente de Teste'),
+            Color(nome_variavel='cor-primaria', valor_padrao='#99b3cc', tema='azul', enviroment='Ambiente de Teste'),
+            Color(nome_variavel='cor-secundaria', valor_padrao='#f4f8ff', tema='azul', enviroment='Ambiente de Teste'),
+            Color(nome_variavel='cor-botao', valor_padrao='#6699ff', tema='azul', enviroment='Ambiente de Teste'),
+
+            # Tema cinza
+            Color(nome_variavel='cor-fundo', valor_padrao='#ebebeb', tema='cinza', enviroment='Ambiente de Teste'),
+            Color(nome_variavel='cor-texto', valor_padrao='#000000', tema='cinza', enviroment='Ambiente de Teste'),
+            Color(nome_variavel='cor-botao-texto', valor_padrao='#000000', tema='cinza', enviroment='Ambiente de Teste'),
+            Color(nome_variavel='cor-primaria', valor_padrao='#bbbbbb', tema='cinza', enviroment='Ambiente de Teste'),
+            Color(nome_variavel='cor-secundaria', valor_padrao='#ffffff', tema='cinza', enviroment='Ambiente de Teste'),
+            Color(nome_variavel='cor-botao', valor_padrao='#888888', tema='cinza', enviroment='Ambiente de Teste'),
+
+            # Tema verde
+            Color(nome_variavel='cor-fundo', valor_padrao='#d2ffcf', tema='verde', enviroment='Ambiente de Teste'),
+            Color(nome_variavel='cor-texto', valor_padrao='#000000', tema='verde', enviroment='Ambiente de Teste'),
+            Color(nome_variavel='cor-botao-texto', valor_padrao='#000000', tema='verde', enviroment='Ambiente de Teste'),
+            Color(nome_variavel='cor-primaria', valor_padrao='#6ac86f', tema='verde', enviroment='Ambiente de Teste'),
+            Color(nome_variavel='cor-secundaria', valor_padrao='#e7ffe5', tema='verde', enviroment='Ambiente de Teste'),
+            Color(nome_variavel='cor-botao', valor_padrao='#34c639', tema='verde', enviroment='Ambiente de Teste'),
+
+            # Tema preto
+            Color(nome_variavel='cor-fundo', valor_padrao='#1b1b1b', tema='preto', enviroment='Ambiente de Teste'),
+            Color(nome_variavel='cor-texto', valor_padrao='#ffffff', tema='preto', enviroment='Ambiente de Teste'),
+            Color(nome_variavel='cor-botao-texto', valor_padrao='#ffffff', tema='preto', enviroment='Ambiente de Teste'),
+            Color(nome_variavel='cor-primaria', valor_padrao='#4b4b4b', tema='preto', enviroment='Ambiente de Teste'),
+            Color(nome_variavel='cor-secundaria', valor_padrao='#bbbbbb', tema='preto', enviroment='Ambiente de Teste'),
+            Color(nome_variavel='cor-botao', valor_padrao='#333333', tema='preto', enviroment='Ambiente de Teste'),
+        ]
+        db.session.add_all(cores_seed)
+        db.session.commit()
+        print('Cores de tema populadas na tabela cores (Color)')
+    else:
+        print('Tabela de cores já possui registros')
+
 
 if __name__ == '__main__':
     init_test_users()
@@ -6,8 +6,11 @@ if __name__ == '__main__':
     from createdb import create_database
     from init_db import init_test_users
 
-    # Garantir DB e usuários de teste (funções idempotentes)
-    create_database()
-    init_test_users()
+    # Ambiente de desenvolvimento: aplica migrações pendentes e garante os
+    # usuários de teste reaproveitando a MESMA instância do app (funções
+    # idempotentes; com o schema atualizado é só uma consulta de versão).
+    create_database(app=app)
+    init_test_users(app)
 
+    # Servidor de desenvolvimento; em produção use `python serve.py` (vários workers)
     app.run(debug=True)
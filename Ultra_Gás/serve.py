@@ -0,0 +1,372 @@
+"""Servidor de produção: um master que faz pré-fork de N workers, cada um com M threads.
+
+`run.py` continua sendo o servidor de desenvolvimento (debug + reloader). Em
+produção use:
+
+    python serve.py --bind 0.0.0.0:8000 --workers 4 --threads 8
+
+Os valores padrão vêm de Config (SERVER_*); os argumentos de linha de comando
+têm precedência. O schema não é tocado aqui: rode `flask db upgrade` antes.
+
+Funcionamento:
+  - o master abre o socket e, com preload (padrão), importa e cria o app uma
+    única vez antes do fork, então os workers sobem já prontos e compartilham
+    as páginas de memória do código;
+  - logo após o fork cada worker chama `post_fork(app)`, que descarta os pools
+    de conexão herdados do master (banco principal e shards), para que nenhuma
+    conexão seja usada por dois processos;
+  - cada worker atende até `threads` requests em paralelo; quando todas as
+    threads estão ocupadas ele para de aceitar conexões e o kernel entrega as
+    novas a outro worker;
+  - com --max-requests o worker se encerra (graciosamente) após atender esse
+    número de requests (+ um jitter aleatório, para não reciclar todos juntos)
+    e o master sobe outro no lugar.
+
+Sinais aceitos pelo master:
+  - TERM / INT: desligamento gracioso (requests em andamento terminam, até
+    --graceful-timeout segundos; depois os workers restantes são mortos);
+  - HUP: reload gracioso. Os workers atuais terminam o que estão atendendo e o
+    master se re-executa (mesmo pid, mesmo socket), carregando o código e a
+    configuração novos. Conexões que chegam no meio ficam na fila do socket;
+  - TTIN / TTOU: aumenta / diminui o número de workers em 1.
+
+Em sistemas sem fork (Windows) roda um único processo com `threads` threads.
+
+Quem rodar atrás do gunicorn pode reaproveitar o hook no gunicorn.conf.py:
+
+    def post_fork(server, worker):
+        serve.post_fork(worker.wsgi)
+"""
+import argparse
+import logging
+import os
+import random
+import select
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+log = logging.getLogger('serve')
+
+# descritor do socket herdado após um reload (HUP)
+_ENV_FD = 'ULTRA_GAS_LISTEN_FD'
+
+
+def carregar_app():
+    from app import create_app
+
+    return create_app()
+
+
+def post_fork(app):
+    """Descarta os pools de conexão herdados do processo pai e inicia o aquecimento.
+
+    dispose(close=False) abandona as conexões do pool sem fechá-las (o socket
+    do banco continua pertencendo ao master); o worker abre as suas sob demanda.
+    Com WARMUP_ENABLED o worker aquece o cache em segundo plano (ver /pronto).
+    """
+    from app import aquecimento, db
+
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    shards = app.extensions.get('shards')
+    if shards is not None:
+        shards.dispose_all()
+    aquecimento.iniciar(app)
+
+
+# ---------------------------------------------------------------------------
+# Worker
+# ---------------------------------------------------------------------------
+
+class _Handler(WSGIRequestHandler):
+    # conexões keep-alive ociosas são fechadas após este tempo (segundos),
+    # para não prenderem uma thread nem atrasarem o desligamento
+    timeout = 5
+
+
+class ServidorWorker(BaseWSGIServer):
+    """Servidor WSGI com um pool fixo de threads e limite de requests."""
+
+    multithread = True
+
+    def __init__(self, host, port, app, threads=4, max_requests=0, fd=None):
+        super().__init__(host, port, self._contar(app), handler=_Handler, fd=fd)
+        self.threads = threads
+        self.max_requests = max_requests
+        self.atendidos = 0
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='http')
+        self._vagas = threading.BoundedSemaphore(threads)
+        self._contador_lock = threading.Lock()
+        self._encerrando = False
+
+    def _contar(self, app):
+        def wsgi(environ, start_response):
+            with self._contador_lock:
+                self.atendidos += 1
+                atingiu = self.max_requests and self.atendidos >= self.max_requests
+            if atingiu:
+                log.info('worker %s atingiu %s requests; reciclando', os.getpid(), self.atendidos)
+                self.encerrar()
+            return app(environ, start_response)
+        return wsgi
+
+    def process_request(self, request, client_address):
+        # bloqueia o accept enquanto todas as threads estiverem ocupadas
+        self._vagas.acquire()
+        self._pool.submit(self._atender, request, client_address)
+
+    def _atender(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._vagas.release()
+
+    def encerrar(self):
+        """Para de aceitar conexões (pode ser chamado de qualquer thread ou signal handler)."""
+        if not self._encerrando:
+            self._encerrando = True
+            threading.Thread(target=self.shutdown, daemon=True).start()
+
+    def rodar(self):
+        """Atende até encerrar() e espera os requests em andamento terminarem."""
+        try:
+            self.serve_forever(poll_interval=0.5)
+        finally:
+            self._pool.shutdown(wait=True)
+            self.server_close()
+
+
+def _host_porta(bind):
+    if bind.startswith('unix:'):
+        return 'unix://' + bind[len('unix:'):], 0
+    host, _, porta = bind.rpartition(':')
+    return (host or '0.0.0.0').strip('[]'), int(porta)
+
+
+def _rodar_worker(sock, bind, app, opcoes):
+    """Corpo do processo worker (após o fork). Nunca retorna."""
+    codigo = 0
+    try:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)  # até o servidor existir
+        signal.signal(signal.SIGINT, signal.SIG_IGN)   # Ctrl+C é tratado pelo master
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        signal.signal(signal.SIGTTIN, signal.SIG_DFL)
+        signal.signal(signal.SIGTTOU, signal.SIG_DFL)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.set_wakeup_fd(-1)
+        random.seed()
+
+        if app is None:
+            app = carregar_app()
+        post_fork(app)
+
+        max_requests = opcoes.max_requests
+        if max_requests and opcoes.max_requests_jitter:
+            max_requests += random.randint(0, opcoes.max_requests_jitter)
+
+        host, porta = _host_porta(bind)
+        servidor = ServidorWorker(host, porta, app, threads=opcoes.threads,
+                                  max_requests=max_requests, fd=sock.fileno())
+        signal.signal(signal.SIGTERM, lambda *_: servidor.encerrar())
+        log.info('worker %s pronto (%s threads)', os.getpid(), opcoes.threads)
+        servidor.rodar()
+
+        jobs = app.extensions.get('jobs')
+        if jobs is not None and jobs.ativo:
+            jobs.parar(aguardar=True)
+        # os._exit abaixo não roda o atexit: grava o que restou da auditoria
+        auditoria = app.extensions.get('auditoria')
+        if auditoria is not None:
+            auditoria.flush()
+    except Exception:
+        log.exception('worker %s falhou', os.getpid())
+        codigo = 1
+    finally:
+        logging.shutdown()
+        os._exit(codigo)
+
+
+# ---------------------------------------------------------------------------
+# Master
+# ---------------------------------------------------------------------------
+
+def _abrir_socket(bind, backlog):
+    herdado = os.environ.pop(_ENV_FD, None)
+    if herdado is not None:
+        sock = socket.socket(fileno=int(herdado))
+    elif bind.startswith('unix:'):
+        caminho = bind[len('unix:'):]
+        if os.path.exists(caminho):
+            os.unlink(caminho)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(caminho)
+        sock.listen(backlog)
+    else:
+        host, porta = _host_porta(bind)
+        familia = socket.AF_INET6 if ':' in host else socket.AF_INET
+        sock = socket.create_server((host, porta), family=familia, backlog=backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class Master:
+    """Mantém `workers` processos filhos vivos e trata os sinais de controle."""
+
+    SINAIS = ('SIGTERM', 'SIGINT', 'SIGHUP', 'SIGTTIN', 'SIGTTOU', 'SIGCHLD')
+
+    def __init__(self, opcoes):
+        self.opcoes = opcoes
+        self.num_workers = opcoes.workers
+        self.app = None
+        self.sock = None
+        self.workers = {}            # pid -> instante de criação
+        self._sinais = []
+        self._parando_ate = None
+
+    def _ao_receber_sinal(self, signum, _frame):
+        self._sinais.append(signum)
+
+    def _fork(self):
+        pid = os.fork()
+        if pid == 0:
+            _rodar_worker(self.sock, self.opcoes.bind, self.app, self.opcoes)
+        self.workers[pid] = time.monotonic()
+        log.info('worker %s iniciado', pid)
+
+    def _recolher(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            inicio = self.workers.pop(pid, None)
+            if inicio is not None:
+                codigo = os.waitstatus_to_exitcode(status)
+                log.info('worker %s saiu (código %s)', pid, codigo)
+                if codigo != 0 and self._parando_ate is None and time.monotonic() - inicio < 1:
+                    # evita loop de fork se o worker falha logo ao subir
+                    time.sleep(1)
+
+    def _sinalizar_todos(self, sinal):
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, sinal)
+            except ProcessLookupError:
+                self.workers.pop(pid, None)
+
+    def _tratar_sinais(self):
+        while self._sinais:
+            signum = self._sinais.pop(0)
+            if signum in (signal.SIGTERM, signal.SIGINT) and self._parando_ate is None:
+                log.info('desligando (aguardando até %ss)', self.opcoes.graceful_timeout)
+                self._parando_ate = time.monotonic() + self.opcoes.graceful_timeout
+                self._sinalizar_todos(signal.SIGTERM)
+            elif signum == signal.SIGHUP and self._parando_ate is None:
+                self._recarregar()
+            elif signum == signal.SIGTTIN:
+                self.num_workers += 1
+                log.info('workers: %s', self.num_workers)
+            elif signum == signal.SIGTTOU and self.num_workers > 1:
+                self.num_workers -= 1
+                log.info('workers: %s', self.num_workers)
+                mais_antigo = min(self.workers, key=self.workers.get, default=None)
+                if mais_antigo is not None:
+                    os.kill(mais_antigo, signal.SIGTERM)
+
+    def _recarregar(self):
+        """Encerra os workers graciosamente e re-executa o master mantendo o socket."""
+        log.info('reload: re-executando o master (pid %s)', os.getpid())
+        self._sinalizar_todos(signal.SIGTERM)
+        os.environ[_ENV_FD] = str(self.sock.fileno())
+        # os workers antigos continuam filhos deste pid e são recolhidos pelo novo master
+        os.execv(sys.executable, [sys.executable] + sys.argv)
+
+    def rodar(self):
+        self.sock = _abrir_socket(self.opcoes.bind, self.opcoes.backlog)
+        if self.opcoes.preload:
+            self.app = carregar_app()
+
+        leitura, escrita = os.pipe()
+        os.set_blocking(leitura, False)
+        os.set_blocking(escrita, False)
+        signal.set_wakeup_fd(escrita)
+        for nome in self.SINAIS:
+            signal.signal(getattr(signal, nome), self._ao_receber_sinal)
+
+        log.info('master %s escutando em %s (%s workers x %s threads, preload=%s)',
+                 os.getpid(), self.opcoes.bind, self.num_workers, self.opcoes.threads, self.opcoes.preload)
+        while True:
+            self._tratar_sinais()
+            self._recolher()
+            if self._parando_ate is not None:
+                if not self.workers:
+                    break
+                if time.monotonic() > self._parando_ate:
+                    log.warning('tempo esgotado; matando %s worker(s)', len(self.workers))
+                    self._sinalizar_todos(signal.SIGKILL)
+            else:
+                while len(self.workers) < self.num_workers:
+                    self._fork()
+            try:
+                select.select([leitura], [], [], 1.0)
+                os.read(leitura, 512)
+            except (BlockingIOError, InterruptedError):
+                pass
+        self.sock.close()
+        log.info('master encerrado')
+
+
+def _servidor_unico(opcoes):
+    """Fallback sem fork: um processo, `threads` threads."""
+    from app import aquecimento
+
+    app = carregar_app()
+    aquecimento.iniciar(app)
+    host, porta = _host_porta(opcoes.bind)
+    servidor = ServidorWorker(host, porta, app, threads=opcoes.threads)
+    log.warning('os.fork indisponível: rodando um único processo em %s', opcoes.bind)
+    try:
+        servidor.rodar()
+    except KeyboardInterrupt:
+        pass
+
+
+def main(argv=None):
+    from app.config import Config
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bind', default=getattr(Config, 'SERVER_BIND', '127.0.0.1:8000'),
+                        help='host:porta ou unix:/caminho/do.sock')
+    parser.add_argument('--workers', type=int, default=getattr(Config, 'SERVER_WORKERS', 2))
+    parser.add_argument('--threads', type=int, default=getattr(Config, 'SERVER_THREADS', 4))
+    parser.add_argument('--max-requests', type=int, default=getattr(Config, 'SERVER_MAX_REQUESTS', 0),
+                        help='recicla o worker após N requests (0 = nunca)')
+    parser.add_argument('--max-requests-jitter', type=int, default=getattr(Config, 'SERVER_MAX_REQUESTS_JITTER', 0))
+    parser.add_argument('--graceful-timeout', type=float, default=getattr(Config, 'SERVER_GRACEFUL_TIMEOUT', 30))
+    parser.add_argument('--backlog', type=int, default=getattr(Config, 'SERVER_BACKLOG', 2048))
+    parser.add_argument('--preload', action=argparse.BooleanOptionalAction,
+                        default=getattr(Config, 'SERVER_PRELOAD', True),
+                        help='cria o app no master antes do fork (padrão: sim)')
+    opcoes = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='[%(asctime)s] [%(process)d] %(levelname)s %(message)s')
+    if not hasattr(os, 'fork'):
+        _servidor_unico(opcoes)
+        return
+    Master(opcoes).rodar()
+
+
+if __name__ == '__main__':
+    main()
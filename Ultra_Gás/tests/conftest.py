@@ -0,0 +1,60 @@
+"""Fixtures da suíte de testes (rode `python -m pytest` na pasta Ultra_Gás ou na raiz do repositório).
+
+Cada app de teste usa um banco SQLite temporário com o schema migrado; o cache
+de leituras fica desligado e a fila de tarefas não sobe threads.
+"""
+import os
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+from benchmarks.orcamento_sql import ContadorSQL, clientes_por_perfil, criar_app  # noqa: E402
+
+
+def _gravar_auditoria(app):
+    # grava os eventos pendentes enquanto o banco temporário ainda existe
+    auditoria = app.extensions.get('auditoria')
+    if auditoria is not None:
+        auditoria.flush()
+
+
+@pytest.fixture
+def app_vazio(tmp_path):
+    """App com banco novo (só o schema, sem os dados de init_db.py)."""
+    from app import create_app
+    from createdb import create_database
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "app.db"}',
+        'CACHE_BACKEND': 'nenhum',
+        'JOBS_IN_PROCESS': False,
+        'RATE_LIMIT_ENABLED': False,
+        'AUDIT_ENABLED': False,
+    })
+    create_database(app=app)
+    return app
+
+
+@pytest.fixture(scope='session')
+def app_orcamento(tmp_path_factory):
+    """App com os dados de init_db.py, compartilhado pelos testes de orçamento SQL."""
+    app = criar_app(str(tmp_path_factory.mktemp('orcamento_sql')))
+    yield app
+    _gravar_auditoria(app)
+
+
+@pytest.fixture(scope='session')
+def cliente_sql(app_orcamento):
+    """Função perfil ('admin' ou 'entregador') -> test client logado."""
+    return clientes_por_perfil(app_orcamento)
+
+
+@pytest.fixture
+def contador_sql():
+    """Conta as instruções SQL executadas pela thread do teste."""
+    with ContadorSQL() as contador:
+        yield contador
@@ -0,0 +1,41 @@
+"""Arquivamento: ids de entregas arquivadas não podem ser reaproveitados.
+
+Três entregas antigas, entregues e pagas, são arquivadas; a próxima entrega
+criada precisa receber um id maior que os arquivados, e o arquivamento seguinte
+precisa movê-la sem UNIQUE em entregas_arquivo.id. A união das duas tabelas
+(histórico e exportação) não pode ter ids repetidos.
+"""
+from datetime import date, timedelta
+
+from app import db
+
+AMBIENTE = 'Ambiente Arquivo'
+
+
+def _nova_entrega(data):
+    from app.models.entregas import Entrega
+
+    entrega = Entrega(endereco='Rua do Arquivo, 1', destinatario='Cliente', produto='p13:1',
+                      metodo_pagamento='pix', entregue=True, pago=True, preco='130',
+                      data=data, enviroment=AMBIENTE)
+    db.session.add(entrega)
+    db.session.commit()
+    return entrega.id
+
+
+def test_arquivar_inserir_arquivar(app_vazio):
+    from app.arquivamento import arquivar_entregas
+    from app.models.entregas import uniao_com_arquivo
+
+    antiga = (date.today() - timedelta(days=app_vazio.config['ARQUIVO_DIAS'] + 30)).isoformat()
+    with app_vazio.app_context():
+        arquivados = [_nova_entrega(antiga) for _ in range(3)]
+        assert arquivar_entregas() == 3
+
+        nova = _nova_entrega(antiga)
+        assert nova > max(arquivados), f'id {nova} reaproveitado (arquivados: {arquivados})'
+        assert arquivar_entregas() == 1
+
+        sub = uniao_com_arquivo(['id'], lambda m: [m.enviroment == AMBIENTE])
+        ids = sorted(r[0] for r in db.session.query(sub.c.id).all())
+        assert ids == sorted(set(ids)) and len(ids) == 4, f'ids repetidos na união: {ids}'
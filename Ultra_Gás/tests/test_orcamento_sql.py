@@ -0,0 +1,16 @@
+"""Orçamento de instruções SQL por rota (ORCAMENTOS em benchmarks/orcamento_sql.py).
+
+A falha lista as instruções executadas, com as repetidas agrupadas (a cara de
+um N+1). Ao otimizar uma rota, baixe o limite dela em ORCAMENTOS.
+"""
+import pytest
+
+from benchmarks.orcamento_sql import ORCAMENTOS, id_orcamento, verificar_orcamento
+
+
+@pytest.mark.parametrize('orcamento', ORCAMENTOS, ids=id_orcamento)
+def test_orcamento_sql(orcamento, cliente_sql):
+    perfil, metodo, rota, limite, corpo = orcamento
+    falha = verificar_orcamento(cliente_sql(perfil), metodo, rota, limite, corpo)
+    if falha:
+        pytest.fail(falha, pytrace=False)
@@ -0,0 +1,29 @@
+"""Previsão de ruptura com histórico esparso (consumo diário quase zero)."""
+from datetime import date, timedelta
+
+from app.previsao import prever
+
+
+def _entrada(dias, saldos):
+    return {'consumo': {'dias': dias}, 'saldos': saldos, 'reservado': {}, 'capacidade': 250}
+
+
+def test_venda_unica_antiga_nao_preve_ruptura(app_vazio):
+    hoje = date(2026, 10, 19)
+    venda = (hoje - timedelta(days=27)).isoformat()
+    with app_vazio.app_context():
+        payload = prever({'Esparso': _entrada({venda: {'p13': 1}}, {'p13': 100})}, hoje)['Esparso']
+    p13 = next(p for p in payload['produtos'] if p['produto'] == 'p13')
+    assert p13['dias_ate_acabar'] is None
+    assert p13['ruptura_prevista'] is None
+    assert p13['status'] == 'ok'
+
+
+def test_consumo_regular_preve_ruptura(app_vazio):
+    hoje = date(2026, 10, 19)
+    dias = {(hoje - timedelta(days=i)).isoformat(): {'p13': 5} for i in range(28)}
+    with app_vazio.app_context():
+        payload = prever({'Regular': _entrada(dias, {'p13': 50})}, hoje)['Regular']
+    p13 = next(p for p in payload['produtos'] if p['produto'] == 'p13')
+    assert p13['dias_ate_acabar'] == 10.0
+    assert p13['ruptura_prevista'] == (hoje + timedelta(days=10)).isoformat()